@@ -0,0 +1,206 @@
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .config import config
+from .emotion import normalize_query
+from .model_factory import get_embeddings
+from .tools.bazi_params import extract_bazi_params
+from .tools.cache import LRUTTLCache, make_cache_key
+
+
+# 含第一人称或个人出生信息的问题依赖用户本人，不走缓存
+PERSONAL_RE = re.compile(r"我|俺|本人|咱")
+# 语义层的关键词约束：生肖、数字（年份）、所问方面（财运/感情/事业…）、时间（今天/明年…）不同的问题
+# 向量很接近（如“今年财运怎么样”与“今年感情怎么样”），但答案不能互用
+TOPIC_TERMS = (
+    "财运", "财富", "正财", "偏财", "投资", "感情", "爱情", "桃花", "姻缘", "婚姻", "结婚", "恋爱",
+    "事业", "工作", "职场", "升职", "学业", "考试", "健康", "身体", "子女", "家庭", "人际", "贵人",
+    "出行", "搬家", "装修",
+)
+TIME_TERMS = ("今天", "明天", "后天", "本周", "下周", "本月", "下个月", "今年", "明年", "去年", "上半年", "下半年")
+KEY_TERM_RE = re.compile("|".join(TOPIC_TERMS + TIME_TERMS) + r"|[鼠牛虎兔龙蛇马羊猴鸡狗猪]|\d+")
+
+
+PUNCT_RE = re.compile(r"[^\w]")
+
+
+def normalize_question(query: str) -> str:
+    """在 normalize_query 基础上再去掉标点，“2025年运势怎么样？”与“2025年运势怎么样”视为同一问题"""
+    return PUNCT_RE.sub("", normalize_query(query))
+
+
+def key_terms(normalized: str) -> frozenset:
+    return frozenset(KEY_TERM_RE.findall(normalized))
+
+
+@dataclass
+class CacheProbe:
+    """一次缓存查询的上下文（未命中时用于写回，避免重复生成查询向量）"""
+    key: str
+    mood: str
+    cacheable: bool
+    terms: frozenset = frozenset()
+    vector: object = None
+
+
+class AnswerCache:
+    """回答缓存：精确层（归一化问题 + 情绪）+ 语义层（问题向量余弦相似度），TTL + LRU 淘汰
+
+    只缓存不依赖个人信息的通用问题（如“2025年运势怎么样”），用到 ANSWER_CACHE_SKIP_TOOLS
+    中工具（八字、每日占卜等）或会话已有历史时生成的回答不写入缓存。
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None, similarity: float = None,
+                 skip_tools=None, embeddings=None):
+        self.maxsize = maxsize or config.ANSWER_CACHE_MAXSIZE
+        self.ttl = ttl or config.ANSWER_CACHE_TTL
+        self.similarity = config.ANSWER_CACHE_SIMILARITY if similarity is None else similarity
+        self.skip_tools = set(config.ANSWER_CACHE_SKIP_TOOLS if skip_tools is None else skip_tools)
+        self._embeddings = embeddings
+        self.answers = LRUTTLCache(maxsize=self.maxsize)
+        self._vectors = {}  # mood -> {key: (单位向量, 关键词, 过期时间)}
+        self._matrices = {}  # mood -> (keys, 向量矩阵, 关键词列表)，向量变化后重建
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+
+    def _record(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def is_generic(query: str) -> bool:
+        """问题是否与用户本人无关（无第一人称、无姓名/出生日期）"""
+        if PERSONAL_RE.search(query or ""):
+            return False
+        params, _ = extract_bazi_params(query)
+        return "name" not in params and "year" not in params
+
+    def _probe(self, query: str, mood: str) -> CacheProbe:
+        normalized = normalize_question(query)
+        key = make_cache_key("answer", [normalized, mood])
+        return CacheProbe(key=key, mood=mood, cacheable=self.is_generic(query), terms=key_terms(normalized))
+
+    def _semantic_lookup(self, probe: CacheProbe):
+        with self._lock:
+            entries = self._vectors.get(probe.mood)
+            if not entries:
+                return None
+            now = time.time()
+            expired = [key for key, entry in entries.items() if entry[2] < now]
+            for key in expired:
+                del entries[key]
+            if expired or probe.mood not in self._matrices:
+                keys = list(entries)
+                if not keys:
+                    self._matrices.pop(probe.mood, None)
+                    return None
+                self._matrices[probe.mood] = (keys, np.stack([entries[key][0] for key in keys]),
+                                              [entries[key][1] for key in keys])
+            keys, matrix, terms = self._matrices[probe.mood]
+        scores = matrix @ probe.vector
+        # 关键词（生肖、年份）不一致的候选不参与匹配
+        scores[np.array([t != probe.terms for t in terms])] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        return self.answers.get(keys[best])
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _finish_lookup(self, probe: CacheProbe):
+        answer = self.answers.get(probe.key)
+        if answer is not None:
+            self._record("exact_hits")
+            return answer
+        if probe.vector is not None:
+            answer = self._semantic_lookup(probe)
+            if answer is not None:
+                self._record("semantic_hits")
+                return answer
+        self._record("misses")
+        return None
+
+    def lookup(self, query: str, mood: str):
+        """查询缓存，返回 (回答或None, probe)"""
+        probe = self._probe(query, mood)
+        if not probe.cacheable:
+            self._record("bypassed")
+            return None, probe
+        if self.answers.get(probe.key) is None and self.similarity > 0:
+            try:
+                probe.vector = self._unit(self.embeddings.embed_query(normalize_question(query)))
+            except Exception as e:
+                print(f"⚠️ 回答缓存语义查询失败：{str(e)}")
+        return self._finish_lookup(probe), probe
+
+    async def alookup(self, query: str, mood: str):
+        """lookup 的异步版本（查询向量异步生成，超时则只查精确层）"""
+        probe = self._probe(query, mood)
+        if not probe.cacheable:
+            self._record("bypassed")
+            return None, probe
+        if self.answers.get(probe.key) is None and self.similarity > 0:
+            try:
+                vector = await asyncio.wait_for(self.embeddings.aembed_query(normalize_question(query)),
+                                                timeout=config.RETRIEVAL_EMBED_TIMEOUT)
+                probe.vector = self._unit(vector)
+            except Exception as e:
+                print(f"⚠️ 回答缓存语义查询失败：{str(e) or type(e).__name__}")
+        return self._finish_lookup(probe), probe
+
+    def store(self, probe: CacheProbe, answer: str, tools_used=(), has_history: bool = False) -> bool:
+        """写入缓存（个人问题、会话已有历史、用到禁止缓存的工具时跳过），返回是否写入"""
+        if not probe.cacheable or has_history or not answer or self.skip_tools & set(tools_used):
+            return False
+        self.answers.set(probe.key, answer, ttl=self.ttl)
+        if probe.vector is not None:
+            with self._lock:
+                entries = self._vectors.setdefault(probe.mood, {})
+                entries[probe.key] = (probe.vector, probe.terms, time.time() + self.ttl)
+                # 语义层与精确层同样受容量限制，超出时淘汰最早写入的条目
+                while len(entries) > self.maxsize:
+                    entries.pop(next(iter(entries)))
+                self._matrices.pop(probe.mood, None)
+        self._record("stores")
+        return True
+
+    def stats(self) -> dict:
+        """返回精确/语义命中、未命中、写入、跳过（个人问题）次数与命中率"""
+        with self._lock:
+            hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+            total = hits + self._stats["misses"]
+            return dict(self._stats, hit_rate=round(hits / total, 4) if total else 0.0)
+
+
+def tools_used(result) -> list:
+    """从Agent结果的中间步骤中取出调用过的工具名"""
+    steps = (result.get("intermediate_steps") or []) if isinstance(result, dict) else []
+    return [step[0].tool for step in steps if step and hasattr(step[0], "tool")]
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """获取进程内共享的回答缓存"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+    return _answer_cache
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+from .config import config
+
+
+# audio_uid 只允许字母数字、下划线和连字符（防止路径穿越）
+AUDIO_UID_RE = re.compile(r"^[\w\-]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+# 语音任务状态：排队中 / 合成中 / 已完成 / 失败 / 已过期（被取代或用户断开） / 队列已满被拒绝
+QUEUED, RUNNING, COMPLETE, FAILED, EXPIRED, REJECTED = "queued", "running", "complete", "failed", "expired", "rejected"
+FINAL_STATUSES = {COMPLETE, FAILED, EXPIRED, REJECTED}
+
+
+class AudioStatusBoard:
+    """语音就绪状态表：调度器与合成服务更新状态，等待方（SSE）在状态变化时被唤醒，不需要轮询
+
+    只保留最近 maxsize 个 audio_uid 的状态；不在表中的（如服务重启前合成的）从磁盘上的清单/文件推断。
+    只在应用事件循环内使用。
+    """
+
+    def __init__(self, voices_dir: str = None, maxsize: int = 1024):
+        self.voices_dir = voices_dir or config.VOICES_DIR
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._events = {}  # audio_uid -> asyncio.Event（下一次状态变化时触发）
+
+    def update(self, audio_uid: str, **fields):
+        state = self._states.get(audio_uid)
+        if state is None:
+            state = {"audio_uid": audio_uid, "status": QUEUED, "total": 0, "segments": [], "ready": [],
+                     "complete": False, "error": None}
+            self._states[audio_uid] = state
+        state.update(fields)
+        if state["complete"]:
+            state["status"] = COMPLETE
+        self._states.move_to_end(audio_uid)
+        while len(self._states) > self.maxsize:
+            self._states.popitem(last=False)
+        event = self._events.pop(audio_uid, None)
+        if event is not None:
+            event.set()
+
+    def _from_disk(self, audio_uid: str):
+        manifest_path = os.path.join(self.voices_dir, f"{audio_uid}.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            # 不在状态表中又未完成的清单，说明合成在服务重启时中断了
+            status = COMPLETE if manifest.get("complete") else FAILED
+            return dict(manifest, status=status, error=manifest.get("error") or (
+                None if status == COMPLETE else "语音合成已中断"))
+        if os.path.exists(os.path.join(self.voices_dir, f"{audio_uid}.mp3")):
+            return {"audio_uid": audio_uid, "status": COMPLETE, "total": 0, "segments": [], "ready": [],
+                    "complete": True, "error": None}
+        return None
+
+    def get(self, audio_uid: str):
+        """返回状态快照；未知的 audio_uid 返回 None"""
+        state = self._states.get(audio_uid)
+        if state is not None:
+            return dict(state, ready=list(state["ready"]), segments=list(state["segments"]))
+        return self._from_disk(audio_uid)
+
+    async def wait(self, audio_uid: str, timeout: float) -> bool:
+        """等待该语音的下一次状态变化，超时返回 False"""
+        event = self._events.setdefault(audio_uid, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+async def audio_events(board: AudioStatusBoard, audio_uid: str, timeout: float = None):
+    """语音就绪事件流：每段可播放时产出 segment，全部完成产出 complete，失败/过期产出 failed，等待超时产出 timeout"""
+    deadline = time.monotonic() + (timeout or config.TTS_EVENTS_TIMEOUT)
+    sent = set()
+    while True:
+        state = board.get(audio_uid)
+        if state is None:
+            yield {"type": "failed", "audio_uid": audio_uid, "message": "语音不存在"}
+            return
+        for i, ready in enumerate(state["ready"]):
+            if ready and i not in sent:
+                sent.add(i)
+                yield {"type": "segment", "audio_uid": audio_uid, "index": i, "total": state["total"],
+                       "url": f"/voices/{state['segments'][i][:-len('.mp3')]}"}
+        if state["status"] == COMPLETE:
+            yield {"type": "complete", "audio_uid": audio_uid, "url": f"/voices/{audio_uid}",
+                   "segments": state["total"]}
+            return
+        if state["status"] in FINAL_STATUSES:
+            yield {"type": "failed", "audio_uid": audio_uid, "status": state["status"],
+                   "message": state.get("error") or "语音未生成"}
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            yield {"type": "timeout", "audio_uid": audio_uid, "status": state["status"]}
+            return
+        await board.wait(audio_uid, remaining)
+
+
+def parse_range(header: str, size: int):
+    """解析单段 Range 头，返回 (start, end)；不满足时返回 None（多段范围不支持，按整文件返回）"""
+    match = RANGE_RE.match(header.strip().replace(" ", ""))
+    if match is None or not size:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        return None
+    return (start, end) if start <= end else None
+
+
+def _iter_file(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+@lru_cache(maxsize=4096)
+def _content_etag(path: str, device: int, inode: int, size: int) -> str:
+    """按文件内容生成 ETag（同一文件只计算一次）
+
+    语音文件硬链接自语音缓存，缓存命中时会刷新修改时间（LRU），因此校验值不能取自 mtime；
+    文件只会被整体替换（新 inode），不会原地修改，按 (路径, 设备, inode, 大小) 缓存摘要即可。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def audio_file_response(path: str, headers) -> Response:
+    """返回语音文件：支持 Range（拖动/断点续传）、ETag 协商缓存；文件生成后不再变化，可长期缓存"""
+    if not os.path.isfile(path):
+        return JSONResponse({"status": "error", "message": "语音不存在或尚未生成"}, status_code=404)
+    stat = os.stat(path)
+    etag = _content_etag(path, stat.st_dev, stat.st_ino, stat.st_size)
+    # 不返回 Last-Modified：修改时间随缓存命中变化，不能作为校验值
+    base_headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={config.AUDIO_CACHE_MAX_AGE}, immutable",
+    }
+    if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=base_headers)
+
+    range_header = headers.get("range")
+    if_range = headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        if RANGE_RE.match(range_header.strip().replace(" ", "")):
+            byte_range = parse_range(range_header, stat.st_size)
+            if byte_range is None:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{stat.st_size}"})
+            start, end = byte_range
+            return StreamingResponse(
+                _iter_file(path, start, end),
+                status_code=206,
+                media_type="audio/mpeg",
+                headers=dict(base_headers, **{"Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                                              "Content-Length": str(end - start + 1)}),
+            )
+    response = FileResponse(path, media_type="audio/mpeg", headers=base_headers, stat_result=stat)
+    del response.headers["last-modified"]  # FileResponse 默认按 mtime 补上
+    return response
+
+
+_audio_status_board = None
+_audio_status_board_lock = threading.Lock()
+
+
+def get_audio_status_board() -> AudioStatusBoard:
+    """获取进程内共享的语音就绪状态表"""
+    global _audio_status_board
+    if _audio_status_board is None:
+        with _audio_status_board_lock:
+            if _audio_status_board is None:
+                _audio_status_board = AudioStatusBoard()
+    return _audio_status_board
@@ -0,0 +1,54 @@
+from typing import List, Optional
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+
+
+def summary_message(record: Optional[dict]) -> Optional[SystemMessage]:
+    """把会话摘要记录（摘要 + 用户关键信息）转成放在历史最前面的系统消息"""
+    if not record or not (record.get("summary") or record.get("facts")):
+        return None
+    content = f"此前对话摘要：{record.get('summary') or '无'}"
+    facts = "；".join(f"{k}：{v}" for k, v in (record.get("facts") or {}).items() if v)
+    if facts:
+        content += f"\n用户关键信息：{facts}"
+    return SystemMessage(content=content)
+
+
+class LocalChatMessageHistory(ChatMessageHistory):
+    """Redis 不可用时的进程内会话历史（接口与 session_store.RedisSessionHistory 一致）"""
+
+    summary: Optional[dict] = None
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        # 返回副本，读取后追加的消息不影响调用方拿到的快照
+        return list(self.messages)
+
+    def clear(self) -> None:
+        self.messages = []
+        self.summary = None
+
+    def load(self):
+        """返回 (摘要记录, 消息列表)"""
+        return self.summary, list(self.messages)
+
+    async def aload(self):
+        return self.load()
+
+    def get_summary(self) -> Optional[dict]:
+        return self.summary
+
+    async def aget_summary(self) -> Optional[dict]:
+        return self.summary
+
+    def context_messages(self) -> List[BaseMessage]:
+        summary = summary_message(self.summary)
+        return ([summary] if summary else []) + list(self.messages)
+
+    async def acontext_messages(self) -> List[BaseMessage]:
+        return self.context_messages()
+
+    async def acompact(self, record: dict, keep: int, seen: int) -> None:
+        newer = max(len(self.messages) - seen, 0)
+        self.summary = record
+        self.messages = self.messages[-(keep + newer):] if keep + newer else []
@@ -11,15 +11,56 @@ class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # 必须在.env中配置
     OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.chatanywhere.tech/v1")  # 可自定义代理
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))  # 请求超时(秒)
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
     # 第三方API配置
     SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
     YUAN_MENG_JU_API_KEY = os.getenv("YUAN_MENG_JU_API_KEY")
 
+    # 缘份居API客户端配置（连接池、超时、重试）
+    YUANFENJU_BASE_URL = os.getenv("YUANFENJU_BASE_URL", "https://api.yuanfenju.com/index.php/v1")
+    YUANFENJU_POOL_SIZE = int(os.getenv("YUANFENJU_POOL_SIZE", "10"))
+    YUANFENJU_MAX_RETRIES = int(os.getenv("YUANFENJU_MAX_RETRIES", "2"))
+    YUANFENJU_BACKOFF = float(os.getenv("YUANFENJU_BACKOFF", "0.5"))  # 重试退避基数(秒)
+    YUANFENJU_TIMEOUT = float(os.getenv("YUANFENJU_TIMEOUT", "10"))  # 默认超时(秒)
+    YUANFENJU_TIMEOUTS = {  # 按接口单独设置超时(秒)
+        "Bazi/paipan": 10,
+        "Zhanbu/meiri": 5,
+        "Gongju/zhougong": 8,
+    }
+
+    # 工具结果缓存配置（memory：进程内LRU；redis：复用 REDIS_URL）
+    TOOL_CACHE_BACKEND = os.getenv("TOOL_CACHE_BACKEND", "memory").lower()
+    TOOL_CACHE_MAXSIZE = int(os.getenv("TOOL_CACHE_MAXSIZE", "2048"))
+    TOOL_CACHE_BAZI_TTL = int(os.getenv("TOOL_CACHE_BAZI_TTL", str(30 * 24 * 3600)))  # 八字排盘(秒)
+    TOOL_CACHE_JIE_MENG_TTL = int(os.getenv("TOOL_CACHE_JIE_MENG_TTL", str(30 * 24 * 3600)))  # 周公解梦(秒)
+
     # Azure TTS配置
     AZURE_TTS_KEY = os.getenv("AZURE_TTS_KEY")
     AZURE_TTS_REGION = os.getenv("AZURE_TTS_REGION", "eastus")
     TTS_API_URL = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/v1"
+    TTS_VOICE = os.getenv("TTS_VOICE", "zh-CN-XiaoxiaoMultilingualNeural")
+    TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "audio-16khz-32kbitrate-mono-mp3")
+    # 健康检查（发音人列表接口）地址与间隔秒数，请求超时秒数，长连接池大小
+    TTS_HEALTH_URL = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/voices/list"
+    TTS_HEALTH_INTERVAL = float(os.getenv("TTS_HEALTH_INTERVAL", "60"))
+    TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "20"))
+    TTS_POOL_SIZE = int(os.getenv("TTS_POOL_SIZE", "10"))
+    # 分句合成（按。！？；切分并发合成，首句完成即可播放）：是否开启、并发数、最短句长（更短的并入下一句）
+    TTS_CHUNKED = os.getenv("TTS_CHUNKED", "true").lower() == "true"
+    TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "3"))
+    TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", "8"))
+    # 上游限流（每秒请求数、突发上限；按 Azure 定价层设置，0为不限流）
+    TTS_RATE_LIMIT = float(os.getenv("TTS_RATE_LIMIT", "3"))
+    TTS_RATE_BURST = float(os.getenv("TTS_RATE_BURST", "5"))
+    # 语音任务调度（并行任务数、最大排队数、任务过期秒数：超时未开始的任务不再合成）
+    TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+    TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "100"))
+    TTS_JOB_TTL = float(os.getenv("TTS_JOB_TTL", "60"))
+    # 语音下发：就绪通知（SSE）最长等待秒数、语音文件的浏览器缓存秒数（文件生成后不再变化）
+    TTS_EVENTS_TIMEOUT = float(os.getenv("TTS_EVENTS_TIMEOUT", "60"))
+    AUDIO_CACHE_MAX_AGE = int(os.getenv("AUDIO_CACHE_MAX_AGE", str(24 * 3600)))
 
     # 代理配置：针对国际版 Azure，正确格式（键带 //）
     HTTP_PROXY = os.getenv("HTTP_PROXY", "").strip()  # 从.env加载 HTTP_PROXY
@@ -37,14 +78,67 @@ class Config:
         PROXIES = {}  # 无代理时为空字典，避免报错
     # 路径配置（以本文件上级目录为根）
     BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+    # 运行时生成的缓存与数据库统一放在 data/ 下（已加入 .gitignore）
+    DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "data"))
     VOICES_DIR = os.path.join(BASE_DIR, "voices")
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(DATA_DIR, "tts_cache"))  # 按内容寻址的共享语音文件
+    TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "512"))  # 语音缓存目录容量上限(MB)，超出按LRU淘汰，0为不限
     QDRANT_PATH = os.path.join(BASE_DIR, "local_qdrant")
+    # Qdrant服务端模式（设置 QDRANT_URL 后不再使用本地目录）；int8 量化仅服务端模式生效
+    QDRANT_URL = os.getenv("QDRANT_URL", "").strip()
+    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY") or None
+    QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()  # none / int8
+
+    # 向量缓存配置（键为 hash(模型, 文本)；内存LRU条数、磁盘SQLite最大条数）
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+    EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "2048"))
+    EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+
+    # 知识库入库配置（URL指纹库路径、抓取超时秒、分片长度与重叠）
+    INGEST_DB_PATH = os.getenv("INGEST_DB_PATH", os.path.join(DATA_DIR, "ingest.sqlite3"))
+    INGEST_FETCH_TIMEOUT = float(os.getenv("INGEST_FETCH_TIMEOUT", "20"))
+    INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+    INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "50"))
+    INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "8"))  # 批量入库并发抓取数
+    INGEST_SPLIT_WORKERS = int(os.getenv("INGEST_SPLIT_WORKERS", "2"))  # 分割进程数（<=1 时不用进程池）
+    INGEST_SPLIT_POOL_MIN_PAGES = int(os.getenv("INGEST_SPLIT_POOL_MIN_PAGES", "8"))  # 页面数达到该值才用进程池分割
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # 后台入库任务并行数
+
+    # 知识库检索配置（返回片段数、MMR候选数、MMR相关性权重、相似度下限、每个片段截取长度）
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+    RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+    RETRIEVAL_LAMBDA = float(os.getenv("RETRIEVAL_LAMBDA", "0.5"))
+    RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD")) if os.getenv("RETRIEVAL_SCORE_THRESHOLD") else None
+    RETRIEVAL_SNIPPET_LENGTH = int(os.getenv("RETRIEVAL_SNIPPET_LENGTH", "300"))
+    # 查询向量超时秒数、故障后仅用关键词检索的冷却秒数、倒数排名融合常数
+    RETRIEVAL_EMBED_TIMEOUT = float(os.getenv("RETRIEVAL_EMBED_TIMEOUT", "3"))
+    RETRIEVAL_EMBED_COOLDOWN = float(os.getenv("RETRIEVAL_EMBED_COOLDOWN", "30"))
+    RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
 
     # 应用配置
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))  # 共享连接池上限
+    SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))  # 会话历史过期时间(秒)，每轮对话续期
     SESSION_ID = "huangbanxian_chat_session"
     MAX_TOKEN_LIMIT = 1000
-    TTS_WAIT_TIMEOUT = 10  # 语音生成最大等待时间(秒)
+
+    # 会话历史滚动总结（消息数超过 TRIGGER 时，把较早的消息并入摘要，只保留最近 TAIL 条原始消息）
+    MEMORY_SUMMARY_TRIGGER = int(os.getenv("MEMORY_SUMMARY_TRIGGER", "12"))
+    MEMORY_TAIL_MESSAGES = int(os.getenv("MEMORY_TAIL_MESSAGES", "6"))
+    MEMORY_SUMMARY_MAX_CHARS = int(os.getenv("MEMORY_SUMMARY_MAX_CHARS", "300"))
+
+    # 回答缓存配置（通用问题按 归一化问题+情绪 缓存；语义相似度阈值为0时只做精确匹配）
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))  # 秒
+    ANSWER_CACHE_MAXSIZE = int(os.getenv("ANSWER_CACHE_MAXSIZE", "1024"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    # 用到这些工具生成的回答不缓存（逗号分隔）
+    ANSWER_CACHE_SKIP_TOOLS = [t.strip() for t in os.getenv(
+        "ANSWER_CACHE_SKIP_TOOLS", "bazi_cesuan,mei_ri_zhan_bu").split(",") if t.strip()]
+
+    # 情绪识别配置（默认本地规则识别，低置信度时可选用大模型兜底）
+    EMOTION_LLM_FALLBACK = os.getenv("EMOTION_LLM_FALLBACK", "false").lower() == "true"
+    EMOTION_MIN_CONFIDENCE = float(os.getenv("EMOTION_MIN_CONFIDENCE", "0.6"))
 
 # 创建配置实例
 config = Config()
@@ -52,3 +146,4 @@ config = Config()
 # 确保目录存在
 os.makedirs(config.VOICES_DIR, exist_ok=True)
 os.makedirs(config.QDRANT_PATH, exist_ok=True)
+os.makedirs(config.DATA_DIR, exist_ok=True)
@@ -0,0 +1,5 @@
+from contextvars import ContextVar
+
+
+# 当前请求的用户uid（由接口层设置，工具内部据此按用户区分缓存等）
+current_uid: ContextVar = ContextVar("current_uid", default=None)
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from .config import config
+from .tools.cache import LRUTTLCache
+
+
+def embedding_key(model: str, text: str) -> str:
+    """内容寻址的缓存键：hash(模型, 文本)"""
+    return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """向量磁盘存储（SQLite，向量以 float32 数组二进制保存），超过行数上限时淘汰最久未使用的条目"""
+
+    def __init__(self, path: str, max_rows: int = 200000):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings(accessed)")
+        self._conn.commit()
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys):
+        """批量读取，返回 {key: 向量列表}，命中的条目刷新访问时间"""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分批查询
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET accessed = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items):
+        """批量写入 [(key, 向量)]"""
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, model, array("f", vector).tobytes(), now) for key, vector in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._rows += self._conn.total_changes - before
+            if self._rows > self.max_rows:
+                self._evict(self._rows - self.max_rows)
+            self._conn.commit()
+
+    def _evict(self, count: int):
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY accessed LIMIT ?)", (count,)
+        )
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self):
+        return self._rows
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """带缓存的 embeddings 包装：进程内 LRU → SQLite 磁盘缓存 → 上游 embeddings 接口
+
+    入库与检索共用，重复的文档片段和热门查询（如“2025年运势”）不再重复调用接口。
+    """
+
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore, model: str = None,
+                 memory_size: int = 2048):
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.memory = LRUTTLCache(maxsize=memory_size)
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, memory_hits: int, disk_hits: int, misses: int):
+        with self._stats_lock:
+            self._stats["memory_hits"] += memory_hits
+            self._stats["disk_hits"] += disk_hits
+            self._stats["misses"] += misses
+
+    def _lookup(self, texts):
+        """查缓存，返回 (键列表, 已命中的 {key: 向量}, 待计算的 [(key, 文本)])"""
+        keys = [embedding_key(self.model, text) for text in texts]
+        found = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+        memory_hits = len(found)
+
+        pending = [key for key in dict.fromkeys(keys) if key not in found]
+        from_disk = self.store.get_many(pending)
+        for key, vector in from_disk.items():
+            self.memory.set(key, vector)
+        found.update(from_disk)
+
+        text_by_key = dict(zip(keys, texts))
+        missing = [(key, text_by_key[key]) for key in pending if key not in found]
+        self._record(memory_hits, len(from_disk), len(missing))
+        return keys, found, missing
+
+    def _remember(self, found, missing, vectors):
+        items = [(key, vector) for (key, _), vector in zip(missing, vectors)]
+        for key, vector in items:
+            self.memory.set(key, vector)
+            found[key] = vector
+        self.store.put_many(self.model, items)
+
+    def embed_documents(self, texts):
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            vectors = self.embeddings.embed_documents([text for _, text in missing])
+            self._remember(found, missing, vectors)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        keys, found, missing = self._lookup([text])
+        if missing:
+            self._remember(found, missing, [self.embeddings.embed_query(text)])
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts):
+        keys, found, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.embeddings.aembed_documents([text for _, text in missing])
+            await asyncio.to_thread(self._remember, found, missing, vectors)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text):
+        # 热门查询通常在进程内缓存中，直接返回，避免线程切换
+        key = embedding_key(self.model, text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            self._record(1, 0, 0)
+            return vector
+        keys, found, missing = await asyncio.to_thread(self._lookup, [text])
+        if missing:
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._remember, found, missing, [vector])
+        return found[keys[0]]
+
+    def stats(self) -> dict:
+        """返回内存命中、磁盘命中、未命中次数与命中率"""
+        with self._stats_lock:
+            total = sum(self._stats.values())
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return dict(self._stats, stored=len(self.store),
+                        hit_rate=round(hits / total, 4) if total else 0.0)
+
+
+def open_embedding_store() -> EmbeddingStore:
+    """按配置打开磁盘向量缓存"""
+    return EmbeddingStore(config.EMBEDDING_CACHE_PATH, max_rows=config.EMBEDDING_CACHE_MAX_ROWS)
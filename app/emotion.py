@@ -0,0 +1,116 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+
+# 情绪关键词规则（按优先级从高到低，越靠前越需要优先处理）
+EMOTION_RULES = {
+    "abusive": [
+        "傻逼", "傻b", "煞笔", "蠢货", "白痴", "弱智", "脑残", "滚蛋", "滚开", "去死",
+        "他妈的", "tmd", "妈的", "操你", "智障",
+    ],
+    "inappropriate": [
+        "色情", "黄片", "约炮", "裸照", "做爱", "性交", "嫖", "卖淫",
+        "爆炸物", "自制枪", "虐杀", "强奸",
+    ],
+    "sensitive": [
+        "政治", "总书记", "共产党", "台独", "藏独", "六四",
+        "法轮", "邪教", "民族矛盾", "宗教冲突", "身份证号", "银行卡号",
+    ],
+    "depressed": [
+        "不开心", "不高兴", "难过", "伤心", "痛苦", "绝望", "郁闷", "抑郁", "焦虑", "烦",
+        "失落", "沮丧", "崩溃", "想哭", "哭了", "累了", "好累", "失恋", "分手", "离婚",
+        "失业", "被裁", "倒霉", "不顺", "霉运", "孤独", "害怕", "担心", "压力大", "迷茫",
+        "唉", "哎", "活着没意思", "不想活",
+    ],
+    "happy": [
+        "开心", "高兴", "快乐", "幸福", "太好了", "好棒", "真棒", "哈哈", "嘻嘻",
+        "激动", "兴奋", "期待", "谢谢", "感谢", "喜欢", "升职", "加薪", "中奖", "结婚",
+        "怀孕", "考上", "顺利", "好运", "😊", "😄", "❤",
+    ],
+}
+
+# 有歧义的高风险词（梦境、日常叙述中也常见，如"梦见杀人""我在政府上班""被骗子骗了"）：
+# 不直接定性，只把置信度降到兜底阈值以下，交给可选的LLM兜底判断
+AMBIGUOUS_HINTS = [
+    "骗子", "废物", "垃圾", "神经病", "杀人", "砍人", "血腥", "炸弹",
+    "政府", "领导人", "主席", "密码",
+]
+AMBIGUOUS_CONFIDENCE = 0.5
+
+# 冲着对方说的辱骂（如"你这个骗子""你就是个废物"）才视为辱骂
+ABUSIVE_TARGET_RE = re.compile(r"(你|您|你们)(这个|这种|就是|真是|才是|都是|是|这)?个?(骗子|废物|垃圾|神经病)")
+
+# 命理/提问类中性词：命中时倾向"neutral"
+NEUTRAL_HINTS = [
+    "八字", "排盘", "算命", "占卜", "抽签", "解梦", "梦见", "梦到", "运势", "风水", "五行",
+    "生肖", "属", "命理", "流年", "出生", "生日", "吉凶", "紫微", "姓名", "测算",
+    "什么", "怎么", "如何", "多少", "哪", "吗", "呢", "？", "?",
+]
+
+# 否定前缀：命中时对应的"happy"关键词不计分（如"不快乐"）
+NEGATION_PREFIXES = ("不", "没", "没有", "不太", "一点也不")
+
+# 高风险类别：只要命中即直接返回，不与其他情绪比较
+PRIORITY_LABELS = ("abusive", "inappropriate", "sensitive")
+
+_PUNCT_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """归一化用户输入（全角转半角、小写、去除空白），用作缓存键"""
+    text = unicodedata.normalize("NFKC", query or "")
+    return _PUNCT_RE.sub("", text).lower()
+
+
+def _count_hits(text: str, keywords, check_negation: bool = False) -> int:
+    """统计关键词命中次数（可选跳过被否定的关键词）"""
+    hits = 0
+    for word in keywords:
+        start = text.find(word)
+        while start != -1:
+            negated = check_negation and any(
+                text[max(0, start - len(prefix)):start] == prefix for prefix in NEGATION_PREFIXES
+            )
+            if not negated:
+                hits += 1
+            start = text.find(word, start + len(word))
+    return hits
+
+
+@lru_cache(maxsize=2048)
+def _classify_normalized(text: str):
+    if not text:
+        return "unknown", 0.0
+
+    for label in PRIORITY_LABELS:
+        if _count_hits(text, EMOTION_RULES[label]):
+            return label, 0.95
+    if ABUSIVE_TARGET_RE.search(text):
+        return "abusive", 0.95
+
+    label, confidence = _classify_ordinary(text)
+    if _count_hits(text, AMBIGUOUS_HINTS):
+        confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+    return label, confidence
+
+
+def _classify_ordinary(text: str):
+    """按正负情绪与中性线索打分（未命中高风险类别时使用）"""
+    depressed = _count_hits(text, EMOTION_RULES["depressed"])
+    happy = _count_hits(text, EMOTION_RULES["happy"], check_negation=True)
+    top, second = max(depressed, happy), min(depressed, happy)
+    if top:
+        label = "depressed" if depressed >= happy else "happy"
+        # 正负情绪同时出现时置信度降低，交给可选的LLM兜底
+        return label, round(0.5 + 0.5 * (top - second) / top, 2)
+
+    if _count_hits(text, NEUTRAL_HINTS):
+        return "neutral", 0.8
+    # 没有任何线索：短句视为中性寒暄，长句交给LLM兜底判断
+    return ("neutral", 0.6) if len(text) <= 12 else ("unknown", 0.3)
+
+
+def classify_emotion(query: str):
+    """本地情绪识别：返回 (情绪标签, 置信度0~1)，结果按归一化后的输入做LRU缓存"""
+    return _classify_normalized(normalize_query(query))
@@ -0,0 +1,426 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+import httpx
+import requests
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .config import config
+from .knowledge_base import close_knowledge_base, get_knowledge_base
+
+
+# 请求头与 WebBaseLoader 保持一致，避免部分站点拒绝默认UA
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(source: str, text: str) -> str:
+    """稳定的点ID：由来源URL + 片段内容哈希生成（同一URL下相同片段始终得到同一ID）"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{content_hash(text)}"))
+
+
+@dataclass
+class Fingerprint:
+    """URL指纹：用于条件请求与判断页面内容是否变化"""
+    url: str
+    etag: str = None
+    last_modified: str = None
+    content_hash: str = None
+    chunk_count: int = 0
+    updated_at: float = 0.0
+
+
+class FingerprintStore:
+    """URL指纹持久化（SQLite）"""
+
+    def __init__(self, path: str = None):
+        self.path = path or config.INGEST_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS url_fingerprints ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT, "
+            "chunk_count INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, etag, last_modified, content_hash, chunk_count, updated_at "
+                "FROM url_fingerprints WHERE url = ?", (url,)
+            ).fetchone()
+        return Fingerprint(*row) if row else None
+
+    def save(self, fingerprint: Fingerprint):
+        fingerprint.updated_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO url_fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint.url, fingerprint.etag, fingerprint.last_modified,
+                 fingerprint.content_hash, fingerprint.chunk_count, fingerprint.updated_at)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class FetchResult:
+    """抓取结果（not_modified 为 True 时服务端返回了304，没有正文）"""
+    url: str
+    text: str = ""
+    metadata: dict = field(default_factory=dict)
+    etag: str = None
+    last_modified: str = None
+    not_modified: bool = False
+
+
+@dataclass
+class IngestResult:
+    """单个URL的入库结果"""
+    url: str
+    status: str  # unchanged / indexed / failed
+    chunks: int = 0
+    added: int = 0
+    deleted: int = 0
+    error: str = None
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def conditional_headers(fingerprint: Fingerprint = None) -> dict:
+    """根据已保存的指纹生成条件请求头"""
+    headers = dict(DEFAULT_HEADERS)
+    if fingerprint is not None:
+        if fingerprint.etag:
+            headers["If-None-Match"] = fingerprint.etag
+        if fingerprint.last_modified:
+            headers["If-Modified-Since"] = fingerprint.last_modified
+    return headers
+
+
+def parse_html(url: str, html: str):
+    """提取网页正文与元数据（字段与 WebBaseLoader 一致）"""
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if soup.title and soup.title.string:
+        metadata["title"] = soup.title.string.strip()
+    description = soup.find("meta", attrs={"name": "description"})
+    if description and description.get("content"):
+        metadata["description"] = description.get("content")
+    html_tag = soup.find("html")
+    if html_tag and html_tag.get("lang"):
+        metadata["language"] = html_tag.get("lang")
+    return soup.get_text(), metadata
+
+
+def fetch_page(url: str, fingerprint: Fingerprint = None, session=None) -> FetchResult:
+    """条件抓取网页：带上 ETag/Last-Modified，未变化时服务端返回304"""
+    response = (session or requests).get(url, headers=conditional_headers(fingerprint),
+                                         timeout=config.INGEST_FETCH_TIMEOUT)
+    if response.status_code == 304:
+        return FetchResult(url=url, not_modified=True)
+    response.raise_for_status()
+    if not response.encoding or response.encoding.lower() == "iso-8859-1":
+        response.encoding = response.apparent_encoding
+    return _page_from_response(url, response.text, response.headers)
+
+
+async def afetch_page(client: httpx.AsyncClient, url: str, fingerprint: Fingerprint = None) -> FetchResult:
+    """fetch_page 的异步版本（批量入库时共享一个 httpx 连接池）"""
+    response = await client.get(url, headers=conditional_headers(fingerprint))
+    if response.status_code == 304:
+        return FetchResult(url=url, not_modified=True)
+    response.raise_for_status()
+    return _page_from_response(url, response.text, response.headers)
+
+
+def _page_from_response(url: str, html: str, headers) -> FetchResult:
+    text, metadata = parse_html(url, html)
+    return FetchResult(url=url, text=text, metadata=metadata,
+                       etag=headers.get("ETag"), last_modified=headers.get("Last-Modified"))
+
+
+def split_page(text: str, metadata: dict):
+    """分割文档（避免单文档过长），同一页面内重复的片段只保留一份"""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=config.INGEST_CHUNK_SIZE,
+        chunk_overlap=config.INGEST_CHUNK_OVERLAP  # 片段重叠，保证上下文连贯
+    )
+    docs = text_splitter.split_documents([Document(page_content=text, metadata=metadata)])
+    unique = {}
+    for doc in docs:
+        unique.setdefault(chunk_point_id(metadata["source"], doc.page_content), doc)
+    return unique
+
+
+def index_chunks(url: str, chunks: dict, knowledge_base=None):
+    """增量写入：只嵌入并写入新片段，删除该URL下已不存在的旧片段，返回 (新增数, 删除数)"""
+    knowledge_base = knowledge_base or get_knowledge_base()
+    existing = knowledge_base.source_point_ids(url)
+    new_ids = [point_id for point_id in chunks if point_id not in existing]
+    stale_ids = existing - set(chunks)
+    added = knowledge_base.add_documents([chunks[point_id] for point_id in new_ids], ids=new_ids)
+    deleted = knowledge_base.delete_points(stale_ids)
+    return added, deleted
+
+
+def _check_unchanged(page: FetchResult, fingerprint: Fingerprint, store: FingerprintStore):
+    """页面未变化（304或正文哈希相同）时返回结果，否则返回 None"""
+    url = page.url
+    if page.not_modified:
+        print(f"📥 页面未变化（304）：{url}")
+        return IngestResult(url=url, status="unchanged", chunks=fingerprint.chunk_count)
+    if not page.text.strip():
+        raise ValueError("未从URL中加载到内容，请检查URL是否有效（需能正常访问）")
+    if fingerprint is not None and fingerprint.content_hash == content_hash(page.text):
+        fingerprint.etag, fingerprint.last_modified = page.etag, page.last_modified
+        store.save(fingerprint)
+        print(f"📥 页面内容未变化：{url}")
+        return IngestResult(url=url, status="unchanged", chunks=fingerprint.chunk_count)
+    return None
+
+
+def _record_indexed(page: FetchResult, chunks: dict, added: int, deleted: int,
+                    store: FingerprintStore) -> IngestResult:
+    url = page.url
+    store.save(Fingerprint(url=url, etag=page.etag, last_modified=page.last_modified,
+                           content_hash=content_hash(page.text), chunk_count=len(chunks)))
+    print(f"📥 {url}：共{len(chunks)}个片段，新增{added}个，删除{deleted}个")
+    return IngestResult(url=url, status="indexed", chunks=len(chunks), added=added, deleted=deleted)
+
+
+def ingest_url(url: str, store: FingerprintStore = None, knowledge_base=None) -> IngestResult:
+    """增量入库单个URL：页面未变化（304或正文哈希相同）时几乎不做任何事"""
+    store = store or get_fingerprint_store()
+    fingerprint = store.get(url)
+    page = fetch_page(url, fingerprint)
+    unchanged = _check_unchanged(page, fingerprint, store)
+    if unchanged is not None:
+        return unchanged
+
+    chunks = split_page(page.text, page.metadata)
+    added, deleted = index_chunks(url, chunks, knowledge_base)
+    return _record_indexed(page, chunks, added, deleted, store)
+
+
+def parse_sitemap(xml_text: str):
+    """解析 sitemap，返回 (页面URL列表, 子sitemap URL列表)"""
+    root = ET.fromstring(xml_text)
+    locs = [el.text.strip() for el in root.iter() if el.tag.endswith("loc") and el.text]
+    if root.tag.endswith("sitemapindex"):
+        return [], locs
+    return locs, []
+
+
+async def _afetch_sitemap_urls(client: httpx.AsyncClient, sitemap_url: str, depth: int = 2):
+    response = await client.get(sitemap_url, headers=DEFAULT_HEADERS)
+    response.raise_for_status()
+    urls, children = parse_sitemap(response.text)
+    if depth > 0:
+        for child in children:
+            urls.extend(await _afetch_sitemap_urls(client, child, depth - 1))
+    return urls
+
+
+_split_pool = None
+_split_pool_lock = threading.Lock()
+
+
+def get_split_pool(workers: int) -> ProcessPoolExecutor:
+    """获取共享的分割进程池（首次使用时创建；用 spawn 启动子进程，避免在多线程的服务进程中 fork）"""
+    global _split_pool
+    if _split_pool is None:
+        with _split_pool_lock:
+            if _split_pool is None:
+                _split_pool = ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+    return _split_pool
+
+
+def shutdown_split_pool():
+    """关闭共享的分割进程池（服务关闭或进程池损坏时调用）"""
+    global _split_pool
+    with _split_pool_lock:
+        pool, _split_pool = _split_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _split_pages(pages: dict, workers: int):
+    """分割全部页面，返回 {url: 片段字典或异常}
+
+    页面数达到 INGEST_SPLIT_POOL_MIN_PAGES 时放到共享进程池中并行分割（分割是纯CPU计算），
+    页面较少时在线程中分割，省去进程间传输的开销。
+    """
+    if workers <= 1 or len(pages) < max(config.INGEST_SPLIT_POOL_MIN_PAGES, 2):
+        futures = [asyncio.to_thread(split_page, page.text, page.metadata) for page in pages.values()]
+    else:
+        loop = asyncio.get_running_loop()
+        pool = get_split_pool(workers)
+        futures = [loop.run_in_executor(pool, split_page, page.text, page.metadata) for page in pages.values()]
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    if any(isinstance(result, BrokenProcessPool) for result in results):
+        shutdown_split_pool()  # 下次使用时重建
+    return dict(zip(pages, results))
+
+
+def _no_progress(stage: str, count: int = 1):
+    pass
+
+
+async def ingest_urls(urls=(), sitemap: str = None, store: FingerprintStore = None, knowledge_base=None,
+                      concurrency: int = None, split_workers: int = None, progress=None):
+    """批量增量入库：有界并发抓取 → 分割（页面多时用共享进程池）→ 大批量嵌入 → 批量写入，返回每个URL的结果
+
+    单个URL（或sitemap本身）抓取、分割失败只记在该URL的结果上，不影响其余URL。
+
+    progress(stage, count) 用于上报进度，stage 为 total_urls / fetched / chunks / embedded / stored。
+    """
+    progress = progress or _no_progress
+    store = store or get_fingerprint_store()
+    knowledge_base = knowledge_base or get_knowledge_base()
+    concurrency = concurrency or config.INGEST_CONCURRENCY
+    split_workers = config.INGEST_SPLIT_WORKERS if split_workers is None else split_workers
+    results, pages = {}, {}
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=config.INGEST_FETCH_TIMEOUT, limits=limits,
+                                 follow_redirects=True) as client:
+        urls = [url.strip() for url in urls if url and url.strip()]
+        if sitemap:
+            try:
+                sitemap_urls = await _afetch_sitemap_urls(client, sitemap)
+                urls.extend(sitemap_urls)
+                progress("total_urls", len(sitemap_urls))
+            except Exception as e:
+                # sitemap 失败只记在 sitemap 本身上，其余URL照常入库
+                print(f"❌ sitemap读取失败：{sitemap}，{str(e)}")
+                results[sitemap] = IngestResult(url=sitemap, status="failed", error=f"sitemap读取失败：{str(e)}")
+                urls.append(sitemap)
+        urls = list(dict.fromkeys(urls))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                try:
+                    fingerprint = store.get(url)
+                    page = await afetch_page(client, url, fingerprint)
+                    progress("fetched")
+                    unchanged = _check_unchanged(page, fingerprint, store)
+                    if unchanged is not None:
+                        results[url] = unchanged
+                    else:
+                        pages[url] = page
+                except Exception as e:
+                    print(f"❌ 抓取失败：{url}，{str(e)}")
+                    results[url] = IngestResult(url=url, status="failed", error=str(e))
+
+        await asyncio.gather(*(fetch(url) for url in urls if url not in results))
+
+    if pages:
+        chunks_by_url = await _split_pages(pages, split_workers)
+        new_docs, new_ids, stale_ids, plans = [], [], [], {}
+        for url, chunks in chunks_by_url.items():
+            try:
+                if isinstance(chunks, BaseException):
+                    raise chunks
+                existing = await asyncio.to_thread(knowledge_base.source_point_ids, url)
+            except Exception as e:
+                print(f"❌ 分割失败：{url}，{str(e) or type(e).__name__}")
+                results[url] = IngestResult(url=url, status="failed", error=str(e) or type(e).__name__)
+                continue
+            progress("chunks", len(chunks))
+            added = [point_id for point_id in chunks if point_id not in existing]
+            stale = existing - set(chunks)
+            new_ids.extend(added)
+            new_docs.extend(chunks[point_id] for point_id in added)
+            stale_ids.extend(stale)
+            plans[url] = (len(added), len(stale))
+        try:
+            await asyncio.to_thread(knowledge_base.add_documents, new_docs, new_ids, on_progress=progress)
+            await asyncio.to_thread(knowledge_base.delete_points, stale_ids)
+            for url, (added, deleted) in plans.items():
+                results[url] = _record_indexed(pages[url], chunks_by_url[url], added, deleted, store)
+        except Exception as e:
+            print(f"❌ 批量写入知识库失败：{str(e)}")
+            for url in plans:
+                results[url] = IngestResult(url=url, status="failed", error=str(e))
+
+    return [results[url] for url in urls]
+
+
+def summarize(results) -> dict:
+    """按状态统计批量入库结果"""
+    summary = {"total": len(results), "indexed": 0, "unchanged": 0, "failed": 0, "added": 0, "deleted": 0}
+    for result in results:
+        summary[result.status] += 1
+        summary["added"] += result.added
+        summary["deleted"] += result.deleted
+    return summary
+
+_fingerprint_store = None
+_fingerprint_store_lock = threading.Lock()
+
+
+def get_fingerprint_store() -> FingerprintStore:
+    """获取进程内共享的URL指纹库"""
+    global _fingerprint_store
+    if _fingerprint_store is None:
+        with _fingerprint_store_lock:
+            if _fingerprint_store is None:
+                _fingerprint_store = FingerprintStore()
+    return _fingerprint_store
+
+
+def main(argv=None):
+    """命令行批量入库：python -m app.ingestion URL... [--file urls.txt] [--sitemap URL]"""
+    parser = argparse.ArgumentParser(description="批量抓取网页并增量写入本地知识库")
+    parser.add_argument("urls", nargs="*", help="要入库的URL")
+    parser.add_argument("--file", help="URL列表文件（每行一个）")
+    parser.add_argument("--sitemap", help="sitemap地址（会展开其中全部页面）")
+    parser.add_argument("--concurrency", type=int, default=None, help="并发抓取数")
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not urls and not args.sitemap:
+        parser.error("请提供URL、--file 或 --sitemap")
+
+    results = asyncio.run(ingest_urls(urls, sitemap=args.sitemap, concurrency=args.concurrency))
+    print(json.dumps({"summary": summarize(results), "results": [r.to_dict() for r in results]},
+                     ensure_ascii=False, indent=2))
+    shutdown_split_pool()
+    close_knowledge_base()
+    return 0 if all(r.status != "failed" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from .config import config
+from .ingestion import ingest_urls, summarize
+
+
+# 任务状态：排队中 / 执行中 / 已完成 / 失败
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+def _empty_progress(total_urls: int = 0) -> dict:
+    return {"total_urls": total_urls, "fetched": 0, "chunks": 0, "embedded": 0, "stored": 0}
+
+
+class JobStore:
+    """入库任务持久化（SQLite），服务重启后未完成的任务可以重新排队"""
+
+    def __init__(self, path: str = None):
+        self.path = path or config.INGEST_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, progress TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def create(self, urls, sitemap: str = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        payload = {"urls": list(urls), "sitemap": sitemap}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ingest_jobs (id, status, payload, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload, ensure_ascii=False),
+                 json.dumps(_empty_progress(len(payload["urls"]))), now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, payload, progress, result, error, created_at, updated_at "
+                "FROM ingest_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "payload": json.loads(row[2]),
+            "progress": json.loads(row[3]),
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+
+    def update(self, job_id: str, status: str = None, progress: dict = None, result=None, error: str = None):
+        fields, values = ["updated_at = ?"], [time.time()]
+        if status is not None:
+            fields.append("status = ?")
+            values.append(status)
+        if progress is not None:
+            fields.append("progress = ?")
+            values.append(json.dumps(progress))
+        if result is not None:
+            fields.append("result = ?")
+            values.append(json.dumps(result, ensure_ascii=False))
+        if error is not None:
+            fields.append("error = ?")
+            values.append(error)
+        with self._lock:
+            self._conn.execute(f"UPDATE ingest_jobs SET {', '.join(fields)} WHERE id = ?", values + [job_id])
+            self._conn.commit()
+
+    def unfinished(self):
+        """按提交顺序返回未完成（排队中或执行中被中断）的任务ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM ingest_jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobProgress:
+    """把入库流水线的进度事件累加到任务记录上（抓取、分片、嵌入、写入数）"""
+
+    def __init__(self, store: JobStore, job_id: str, total_urls: int):
+        self.store = store
+        self.job_id = job_id
+        self.counts = _empty_progress(total_urls)
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, count: int = 1):
+        with self._lock:
+            self.counts[stage] = self.counts.get(stage, 0) + count
+            snapshot = dict(self.counts)
+        self.store.update(self.job_id, progress=snapshot)
+
+
+class IngestJobQueue:
+    """后台入库任务队列：提交后立即返回任务ID，由固定数量的 worker 协程按顺序执行"""
+
+    def __init__(self, store: JobStore = None, workers: int = None, ingest_options: dict = None):
+        self.store = store or JobStore()
+        self.workers = workers or config.INGEST_WORKERS
+        self.ingest_options = ingest_options or {}  # 透传给 ingest_urls（指纹库、知识库等）
+        self._queue = None
+        self._loop = None
+        self._tasks = []
+
+    async def start(self):
+        """在应用事件循环中启动 worker，并把上次未完成的任务重新排队"""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        pending = self.store.unfinished()
+        for job_id in pending:
+            self.store.update(job_id, status=QUEUED)
+            self._queue.put_nowait(job_id)
+        if pending:
+            print(f"📥 重新排队{len(pending)}个未完成的入库任务")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, urls, sitemap: str = None) -> str:
+        """提交入库任务，返回任务ID（可在线程池中调用：asyncio.Queue 不是线程安全的，转交给应用事件循环入队）"""
+        job_id = self.store.create(urls, sitemap)
+        if self._queue is not None:
+            try:
+                on_loop = asyncio.get_running_loop() is self._loop
+            except RuntimeError:
+                on_loop = False
+            if on_loop:
+                self._queue.put_nowait(job_id)
+            else:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, job_id)
+        return job_id
+
+    async def join(self):
+        await self._queue.join()
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        payload = job["payload"]
+        progress = JobProgress(self.store, job_id, len(payload["urls"]))
+        self.store.update(job_id, status=RUNNING, progress=progress.counts)
+        try:
+            results = await ingest_urls(payload["urls"], sitemap=payload.get("sitemap"), progress=progress,
+                                        **self.ingest_options)
+            summary = summarize(results)
+            self.store.update(job_id, status=FAILED if summary["failed"] == summary["total"] else SUCCEEDED,
+                              result={"summary": summary, "results": [r.to_dict() for r in results]})
+            print(f"📥 入库任务{job_id}完成：{summary}")
+        except Exception as e:
+            print(f"❌ 入库任务{job_id}失败：{str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> IngestJobQueue:
+    """获取进程内共享的入库任务队列"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = IngestJobQueue()
+    return _job_queue
@@ -0,0 +1,293 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from .config import config
+from .model_factory import get_embeddings
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+
+
+COLLECTION_NAME = "local_documents"
+
+
+def mmr_rerank(query_vector, candidates, k: int, lambda_mult: float = 0.5):
+    """向量化MMR：在候选向量矩阵上一次算出相似度，逐步挑选兼顾相关性与多样性的 k 个，返回候选下标
+
+    lambda_mult 越大越偏向相关性，越小越偏向多样性。
+    """
+    matrix = np.asarray(candidates, dtype=np.float32)
+    if matrix.size == 0 or k <= 0:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = matrix @ query
+    selected = [int(np.argmax(relevance))]
+    # 每个候选与已选结果的最大相似度，随挑选增量更新
+    max_redundancy = matrix @ matrix[selected[0]]
+    chosen = np.zeros(len(matrix), dtype=bool)
+    chosen[selected[0]] = True
+    while len(selected) < min(k, len(matrix)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        chosen[best] = True
+        np.maximum(max_redundancy, matrix @ matrix[best], out=max_redundancy)
+    return selected
+
+
+class KnowledgeBase:
+    """本地知识库服务：进程内只打开一次 Qdrant（集合常驻内存），共享一个 embeddings 客户端
+
+    嵌入式 Qdrant 同一路径只允许一个客户端持有存储锁，因此检索与入库都经由本对象完成，
+    所有存储操作串行化；外部进程写入后可调用 reopen() 重新加载。
+    检索为 向量MMR + 本地BM25 的混合检索（倒数排名融合），BM25索引由Qdrant中的片段构建，
+    随写入/删除同步更新；embeddings 服务超时或不可用时只走BM25。
+    """
+
+    def __init__(self, path: str = None, collection_name: str = COLLECTION_NAME, embeddings=None,
+                 url: str = None, quantization: str = None):
+        self.path = path or config.QDRANT_PATH
+        self.url = config.QDRANT_URL if url is None else url
+        self.quantization = config.QDRANT_QUANTIZATION if quantization is None else quantization
+        self.collection_name = collection_name
+        self.embeddings = embeddings or get_embeddings()
+        self._lock = threading.RLock()
+        self.client = None
+        self.lexical = BM25Index()
+        self._embed_retry_at = 0.0  # embeddings 服务故障后，在此时间之前只走BM25
+        self._open()
+
+    @property
+    def quantized(self) -> bool:
+        """是否启用int8标量量化（仅Qdrant服务端模式支持，本地嵌入模式忽略）"""
+        return self.quantization == "int8" and bool(self.url)
+
+    def _open(self):
+        if self.url:
+            self.client = QdrantClient(url=self.url, api_key=config.QDRANT_API_KEY)
+            if self.quantized and self.has_collection() and \
+                    self.client.get_collection(self.collection_name).config.quantization_config is None:
+                # 已有集合补充开启量化（原始向量转存磁盘，内存中只保留int8向量）
+                self.client.update_collection(
+                    collection_name=self.collection_name,
+                    vectors_config={"": rest.VectorParamsDiff(on_disk=True)},
+                    quantization_config=self._quantization_config()
+                )
+        else:
+            self.client = QdrantClient(path=self.path)
+        self._load_lexical_index()
+        print(f"✅ 已加载本地知识库：{self.url or self.path}（集合：{self.collection_name}，"
+              f"{len(self.lexical)}个片段{'，int8量化' if self.quantized else ''}）")
+
+    @staticmethod
+    def _quantization_config():
+        return rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+
+    def _load_lexical_index(self):
+        """由Qdrant中保存的片段文本重建BM25索引（Qdrant是片段的唯一持久化存储）"""
+        self.lexical.clear()
+        if not self.has_collection():
+            return
+        offset = None
+        while True:
+            points, offset = self.client.scroll(collection_name=self.collection_name, limit=256,
+                                                offset=offset, with_payload=True, with_vectors=False)
+            for point in points:
+                payload = point.payload or {}
+                self.lexical.add(str(point.id), payload.get("page_content", ""), payload.get("metadata"))
+            if offset is None:
+                return
+
+    def close(self):
+        with self._lock:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
+    def reopen(self):
+        """关闭并重新打开存储（外部写入后刷新内存中的集合）"""
+        with self._lock:
+            self.close()
+            self._open()
+
+    def has_collection(self) -> bool:
+        with self._lock:
+            names = [c.name for c in self.client.get_collections().collections]
+            return self.collection_name in names
+
+    def _ensure_collection(self, vector_size: int):
+        if not self.has_collection():
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=rest.VectorParams(size=vector_size, distance=rest.Distance.COSINE,
+                                                 on_disk=self.quantized),
+                quantization_config=self._quantization_config() if self.quantized else None
+            )
+
+    def _search_by_vector(self, embedding, k: int, fetch_k: int):
+        """取 fetch_k 个候选（量化时用int8向量粗排、原始向量重打分），再做向量化MMR挑出 k 个"""
+        search_params = None
+        if self.quantized:
+            search_params = rest.SearchParams(
+                quantization=rest.QuantizationSearchParams(rescore=True, oversampling=2.0)
+            )
+        with self._lock:
+            if not self.has_collection():
+                return []
+            hits = self.client.search(
+                collection_name=self.collection_name, query_vector=embedding, limit=fetch_k,
+                with_payload=True, with_vectors=True, search_params=search_params,
+                score_threshold=config.RETRIEVAL_SCORE_THRESHOLD
+            )
+        selected = mmr_rerank(embedding, [hit.vector for hit in hits], k, config.RETRIEVAL_LAMBDA)
+        docs = []
+        for index in selected:
+            payload = hits[index].payload or {}
+            metadata = dict(payload.get("metadata") or {}, _id=str(hits[index].id))
+            docs.append(Document(page_content=payload.get("page_content", ""), metadata=metadata))
+        return docs
+
+    def _lexical_documents(self, hits):
+        docs = []
+        for doc_id, _ in hits:
+            found = self.lexical.document(doc_id)
+            if found is not None:
+                text, metadata = found
+                docs.append(Document(page_content=text, metadata=dict(metadata, _id=doc_id)))
+        return docs
+
+    def _hybrid_search(self, query: str, embedding, k: int, fetch_k: int):
+        """BM25 与向量MMR结果做倒数排名融合；没有查询向量时只用BM25结果"""
+        lexical_docs = self._lexical_documents(self.lexical.search(query, fetch_k))
+        if embedding is None:
+            return lexical_docs[:k]
+        vector_docs = self._search_by_vector(embedding, k=k, fetch_k=fetch_k)
+        by_id = {doc.metadata["_id"]: doc for doc in lexical_docs}
+        by_id.update((str(doc.metadata.get("_id")), doc) for doc in vector_docs)
+        fused = reciprocal_rank_fusion([
+            [str(doc.metadata.get("_id")) for doc in vector_docs],
+            [doc.metadata["_id"] for doc in lexical_docs[:k]],
+        ], k=config.RETRIEVAL_RRF_K)
+        return [by_id[doc_id] for doc_id in fused[:k]]
+
+    def _embedding_available(self) -> bool:
+        return time.time() >= self._embed_retry_at
+
+    def _embedding_failed(self, error):
+        self._embed_retry_at = time.time() + config.RETRIEVAL_EMBED_COOLDOWN
+        print(f"⚠️ 查询向量生成失败：{error}，{config.RETRIEVAL_EMBED_COOLDOWN}秒内仅使用关键词检索")
+
+    def search(self, query: str, k: int = None, fetch_k: int = None):
+        """混合检索相关文档（向量MMR + BM25），k/fetch_k 默认取配置"""
+        k, fetch_k = k or config.RETRIEVAL_K, fetch_k or config.RETRIEVAL_FETCH_K
+        embedding = None
+        if self._embedding_available():
+            try:
+                embedding = self.embeddings.embed_query(query)
+            except Exception as e:
+                self._embedding_failed(str(e) or type(e).__name__)
+        return self._hybrid_search(query, embedding, k, fetch_k)
+
+    async def asearch(self, query: str, k: int = None, fetch_k: int = None):
+        """异步混合检索：查询向量异步生成（超时则只用BM25），内存检索放到线程中执行"""
+        k, fetch_k = k or config.RETRIEVAL_K, fetch_k or config.RETRIEVAL_FETCH_K
+        embedding = None
+        if self._embedding_available():
+            try:
+                embedding = await asyncio.wait_for(self.embeddings.aembed_query(query),
+                                                   timeout=config.RETRIEVAL_EMBED_TIMEOUT)
+            except Exception as e:
+                self._embedding_failed(str(e) or type(e).__name__)
+        return await asyncio.to_thread(self._hybrid_search, query, embedding, k, fetch_k)
+
+    def add_documents(self, documents, ids=None, batch_size: int = 256, on_progress=None) -> int:
+        """文档写入知识库（集合不存在时自动创建），返回写入的片段数
+
+        ids 为稳定的点ID时重复写入同一片段会覆盖而不是追加；不传时随机生成。
+        向量一次性批量生成，写入按 batch_size 分批；on_progress(stage, count) 上报嵌入/写入进度。
+        """
+        if not documents:
+            return 0
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in documents]
+        texts = [doc.page_content for doc in documents]
+        vectors = self.embeddings.embed_documents(texts)
+        if on_progress:
+            on_progress("embedded", len(vectors))
+        points = [
+            rest.PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={"page_content": doc.page_content, "metadata": doc.metadata}
+            )
+            for point_id, doc, vector in zip(ids, documents, vectors)
+        ]
+        with self._lock:
+            self._ensure_collection(len(vectors[0]))
+            for start in range(0, len(points), batch_size):
+                batch = points[start:start + batch_size]
+                self.client.upsert(collection_name=self.collection_name, points=batch)
+                if on_progress:
+                    on_progress("stored", len(batch))
+            for point_id, doc in zip(ids, documents):
+                self.lexical.add(str(point_id), doc.page_content, doc.metadata)
+        return len(points)
+
+    def source_point_ids(self, source: str) -> set:
+        """返回某个来源（metadata.source，即URL）当前已入库的全部点ID"""
+        source_filter = rest.Filter(must=[
+            rest.FieldCondition(key="metadata.source", match=rest.MatchValue(value=source))
+        ])
+        ids, offset = set(), None
+        with self._lock:
+            if not self.has_collection():
+                return ids
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name, scroll_filter=source_filter,
+                    limit=256, offset=offset, with_payload=False, with_vectors=False
+                )
+                ids.update(str(point.id) for point in points)
+                if offset is None:
+                    return ids
+
+    def delete_points(self, ids) -> int:
+        """按点ID删除片段，返回删除数"""
+        ids = list(ids)
+        if not ids:
+            return 0
+        with self._lock:
+            self.client.delete(collection_name=self.collection_name,
+                               points_selector=rest.PointIdsList(points=ids))
+            for point_id in ids:
+                self.lexical.remove(str(point_id))
+        return len(ids)
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """获取进程内共享的知识库服务（首次使用时打开存储）"""
+    global _knowledge_base
+    if _knowledge_base is None:
+        with _knowledge_base_lock:
+            if _knowledge_base is None:
+                _knowledge_base = KnowledgeBase()
+    return _knowledge_base
+
+
+def close_knowledge_base():
+    """释放知识库存储锁（未打开过时不做任何事）"""
+    if _knowledge_base is not None:
+        _knowledge_base.close()
@@ -0,0 +1,106 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+
+# 连续的汉字串按字切分为二元组，字母数字按整词切分
+CJK_RUN_RE = re.compile(r"[㐀-䶿一-鿿]+")
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str):
+    """中文字符二元组分词（单字串保留单字），英文与数字按整词，统一小写、全角转半角"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens = []
+    for run in CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(WORD_RE.findall(text))
+    return tokens
+
+
+class BM25Index:
+    """内存倒排索引 + BM25 打分（与向量库中的片段一一对应，按点ID增删）"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # token -> {doc_id: 词频}
+        self._lengths = {}  # doc_id -> 文档词数
+        self._docs = {}  # doc_id -> (page_content, metadata)
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def add(self, doc_id: str, text: str, metadata: dict = None):
+        """添加或替换一个片段"""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            self.remove(doc_id)
+            for token, tf in counts.items():
+                self._postings[token][doc_id] = tf
+            length = sum(counts.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            self._docs[doc_id] = (text, metadata or {})
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            if doc_id not in self._docs:
+                return
+            text, _ = self._docs.pop(doc_id)
+            for token in set(tokenize(text)):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[token]
+            self._total_length -= self._lengths.pop(doc_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._lengths.clear()
+            self._docs.clear()
+            self._total_length = 0
+
+    def document(self, doc_id: str):
+        """返回 (page_content, metadata)"""
+        return self._docs.get(doc_id)
+
+    def search(self, query: str, k: int = 10):
+        """BM25 检索，返回按得分降序的 [(doc_id, score)]"""
+        tokens = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not tokens:
+                return []
+            avg_length = self._total_length / n
+            scores = defaultdict(float)
+            for token in tokens:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """倒数排名融合：多路检索结果（各自为有序的ID列表）合并为一个有序ID列表"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
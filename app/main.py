@@ -1,27 +1,37 @@
-from fastapi import FastAPI, websockets, WebSocketDisconnect, BackgroundTasks, HTTPException
-import httpx
-from langchain_openai import ChatOpenAI
+from fastapi import FastAPI, websockets, WebSocketDisconnect, BackgroundTasks, HTTPException, Request
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.agents import create_openai_tools_agent, AgentExecutor
 from langchain.schema import StrOutputParser
 from langchain_community.utilities import SerpAPIWrapper
-from langchain_openai import OpenAIEmbeddings
-from langchain.memory import ConversationTokenBufferMemory
-from langchain_community.chat_message_histories import RedisChatMessageHistory, ChatMessageHistory
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Qdrant
+import json
 import os
 import asyncio
 import uuid
-import traceback
 import time
-from starlette.concurrency import run_in_threadpool
+import threading
 from pydantic import BaseModel
 from .config import config
+from .emotion import classify_emotion
+from .model_factory import get_chat_model, get_embeddings
+from .chat_history import LocalChatMessageHistory
+from .session_store import RedisSessionHistory, get_session_store
+from .token_memory import TokenBufferMemory
+from .summarizer import get_summarizer
+from .knowledge_base import get_knowledge_base, close_knowledge_base
+from .answer_cache import get_answer_cache, tools_used
+from .jobs import get_job_queue
+from .ingestion import shutdown_split_pool
+from .tts import get_tts_service
+from .audio_delivery import AUDIO_UID_RE, audio_events, audio_file_response, get_audio_status_board
+from .tts_scheduler import get_tts_scheduler
+from .tts_cache import get_tts_cache
 from .tools.Mingli_tools import bazi_cesuan, mei_ri_zhan_bu, jie_meng
 from .tools.Fuzhu_tools import search, get_infor_from_local_db
+from .tools.yuanfenju_client import get_yuanfenju_client
+from .tools.cache import get_tool_cache
+from .context import current_uid
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
 
 # 1. 单例模式装饰器（解决 Master 重复初始化问题）
@@ -42,6 +52,24 @@ class URLRequest(BaseModel):
     URL: str
 
 
+class BatchURLRequest(BaseModel):
+    URLs: list = []
+    sitemap: str = None
+
+
+# 流式接口中工具调用时推送给前端的进度提示
+TOOL_STATUS = {
+    "search": "正在联网搜索…",
+    "bazi_cesuan": "正在排八字…",
+    "get_infor_from_local_db": "正在查阅本地知识库…",
+    "mei_ri_zhan_bu": "正在为您抽签占卜…",
+    "jie_meng": "正在解梦…",
+}
+
+# Agent主模型的标签（流式接口据此过滤出需要推送的回答token）
+AGENT_LLM_TAG = "huangbanxian_agent"
+
+
 # 3. 初始化 FastAPI 实例（仅1次，避免跨域配置失效）
 app = FastAPI(title="黄半仙风水命理API", version="1.0")
 
@@ -69,14 +97,7 @@ class Master(Singleton):
         self.uid = uid or str(uuid.uuid4())
         
         # 初始化大模型
-        self.chatmodel = ChatOpenAI(
-            model=config.OPENAI_MODEL,
-            temperature=0,
-            streaming=True,
-            timeout=30,
-            openai_api_key=config.OPENAI_API_KEY,
-            openai_api_base=config.OPENAI_API_BASE
-        )
+        self.chatmodel = get_chat_model(temperature=0, streaming=True)
 
         # 系统提示词（保持原逻辑）
         self.SYSTEMPL = """你是一个非常厉害的算命先生，你叫黄清清，人称黄半仙。
@@ -109,186 +130,329 @@ class Master(Singleton):
             "sensitive": {"role_set": "保持谨慎尊重，避免争议，引导理性平和讨论。", "voicestyle": "chat"}
         }
 
-        # 初始化提示词、记忆、工具和Agent
-        self.prompt = self._init_prompt()
-        self.chat_memory = self.save_memory()
-        self.memory = self._init_memory()
+        # 初始化工具，并按情绪预编译Agent执行器（每种情绪只构建一次）
+        # 执行器不绑定记忆：由 run/arun 按会话显式读写历史，异步链路可使用原生异步Redis
+        self.redis_available = self._check_redis()
+        self._local_histories = {}  # Redis 不可用时的进程内会话历史
         self.tools = [search, bazi_cesuan, get_infor_from_local_db, mei_ri_zhan_bu, jie_meng]
-        self.agent = create_openai_tools_agent(self.chatmodel, self.tools, self.prompt)
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            memory=self.memory,
-            return_intermediate_steps=True,
-            verbose=True,
-            handle_parsing_errors="很抱歉，算卦过程中出现小差错，请稍后再试~"
-        )
+        self.agent_executors = {}
+        self._executor_lock = threading.Lock()
+        self.agent_executor = self.get_agent_executor(self.qingxu)
+        # 通用问题的回答缓存（可通过 ANSWER_CACHE_ENABLED 关闭）
+        self.answer_cache = get_answer_cache() if config.ANSWER_CACHE_ENABLED else None
 
         # 标记已初始化（避免重复执行__init__）
         self._initialized = True
 
-    def _init_prompt(self):
-        """初始化提示词模板"""
+    def _init_prompt(self, qingxu: str = "default"):
+        """初始化提示词模板（按情绪填充人设）"""
         return ChatPromptTemplate.from_messages([
-            ("system", self.SYSTEMPL.format(who_you_are=self.MOODS[self.qingxu]["role_set"])),
+            ("system", self.SYSTEMPL.format(who_you_are=self.MOODS[qingxu]["role_set"])),
             MessagesPlaceholder(variable_name=self.MEMORY_KEY),
             ("user", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad", default=[])
         ])
 
-    def _init_memory(self):
-        """初始化对话记忆"""
-        return ConversationTokenBufferMemory(
-            llm=self.chatmodel,
+    def _build_agent_executor(self, qingxu: str):
+        """为指定情绪构建提示词、Agent和执行器"""
+        prompt = self._init_prompt(qingxu)
+        agent = create_openai_tools_agent(
+            self.chatmodel.with_config(tags=[AGENT_LLM_TAG]), self.tools, prompt
+        )
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            return_intermediate_steps=True,
+            verbose=True,
+            handle_parsing_errors="很抱歉，算卦过程中出现小差错，请稍后再试~"
+        )
+
+    def get_agent_executor(self, qingxu: str):
+        """从执行器注册表中取出对应情绪的执行器（首次使用时构建并缓存）"""
+        if qingxu not in self.MOODS:
+            qingxu = "default"
+        executor = self.agent_executors.get(qingxu)
+        if executor is None:
+            with self._executor_lock:
+                executor = self.agent_executors.get(qingxu)
+                if executor is None:
+                    executor = self._build_agent_executor(qingxu)
+                    self.agent_executors[qingxu] = executor
+        return executor
+
+    def _init_memory(self, chat_memory):
+        """初始化对话记忆（按已存的每条消息token数截取最近历史，摘要放在最前面）"""
+        return TokenBufferMemory(
             memory_key=self.MEMORY_KEY,
             human_prefix="用户",
             ai_prefix="黄半仙",
             return_messages=True,
             output_key="output",
             max_token_limit=config.MAX_TOKEN_LIMIT,
-            chat_memory=self.chat_memory
+            chat_memory=chat_memory
         )
 
-    def save_memory(self):
-        """保存对话记忆到Redis（按用户uid区分，避免冲突）"""
+    def _check_redis(self) -> bool:
+        """检查Redis是否可用（不可用时会话历史改存进程内存）"""
         try:
-            # 用用户uid作为Redis会话ID，每个用户独立存储
-            chat_history = RedisChatMessageHistory(
-                url=config.REDIS_URL,
-                session_id=self.uid
-            )
-            print(f"✅ 成功连接Redis并获取用户[{self.uid}]的聊天历史")
-
-            # 对话历史过长时总结（保留关键信息）
-            if len(chat_history.messages) > 10:
-                summary_prompt = ChatPromptTemplate.from_messages([
-                    ("system", f"{self.SYSTEMPL}\n总结对话记忆，提取用户关键信息（姓名、生日等）。\n"
-                               "以如下形式返回：总结摘要|用户关键信息"),
-                    ("user", "{input}")
-                ])
-                summary_chain = summary_prompt | self.chatmodel
-                summary = summary_chain.invoke({
-                    "input": chat_history.messages,
-                    "who_you_are": self.MOODS[self.qingxu]["role_set"]
-                })
-                print(f"📝 对话总结结果：{summary}")
-                chat_history.clear()
-                chat_history.add_message(summary)
-            return chat_history
+            get_session_store().ping()
+            print("✅ 成功连接Redis，聊天历史按用户uid分别存储")
+            return True
         except Exception as e:
             print(f"⚠️ Redis连接失败：{str(e)}，已切换为临时内存存储")
-            return ChatMessageHistory()
+            return False
+
+    def get_history(self, uid: str = None):
+        """获取指定用户（默认当前请求用户）的会话历史（摘要记录 + 最近消息）"""
+        uid = uid or current_uid.get() or self.uid
+        if self.redis_available:
+            return RedisSessionHistory(get_session_store(), uid)
+        history = self._local_histories.get(uid)
+        if history is None:
+            history = self._local_histories.setdefault(uid, LocalChatMessageHistory())
+        return history
+
+    async def summarize_history(self, uid: str):
+        """回答发出后滚动总结该用户的会话历史（较早消息并入摘要，只保留最近若干条）"""
+        await get_summarizer().summarize(uid, self.get_history(uid))
+
+    def schedule_summary(self, uid: str):
+        """在后台调度会话历史总结（不阻塞当前响应）"""
+        get_summarizer().schedule(uid, self.get_history(uid))
+
+    def _needs_llm_qingxu(self, qingxu: str, confidence: float) -> bool:
+        if confidence < config.EMOTION_MIN_CONFIDENCE and config.EMOTION_LLM_FALLBACK:
+            print(f"🤔 本地情绪识别置信度较低（{qingxu}:{confidence}），使用大模型兜底")
+            return True
+        return False
 
     def qingxu_chain(self, query: str):
-        """情绪识别链（判断用户情绪并调整回复风格）"""
+        """情绪识别（本地规则优先，低置信度时可选用大模型兜底）"""
+        qingxu, confidence = classify_emotion(query)
+        if self._needs_llm_qingxu(qingxu, confidence):
+            return self._llm_qingxu_chain(query)
+        return qingxu if qingxu in self.MOODS else "default"
+
+    async def aqingxu_chain(self, query: str):
+        """情绪识别（异步版本：大模型兜底时不阻塞事件循环）"""
+        qingxu, confidence = classify_emotion(query)
+        if self._needs_llm_qingxu(qingxu, confidence):
+            return await self._allm_qingxu_chain(query)
+        return qingxu if qingxu in self.MOODS else "default"
+
+    def _emotion_chain(self):
+        """大模型情绪识别链（判断用户情绪并调整回复风格）"""
+        emotion_prompt = ChatPromptTemplate.from_template("""根据用户输入判断情绪：
+        负面→"depressed"，正面→"happy"，中性→"neutral"
+        无法判断→"unknown"，辱骂→"abusive"，色情暴力→"inappropriate"
+        敏感信息→"sensitive"（仅返回关键词）
+        用户输入：{query}
+        """)
+        return emotion_prompt | self.chatmodel | StrOutputParser()
+
+    def _llm_qingxu_chain(self, query: str):
         try:
-            emotion_prompt = ChatPromptTemplate.from_template("""根据用户输入判断情绪：
-            负面→"depressed"，正面→"happy"，中性→"neutral"
-            无法判断→"unknown"，辱骂→"abusive"，色情暴力→"inappropriate"
-            敏感信息→"sensitive"（仅返回关键词）
-            用户输入：{query}
-            """)
-            emotion_chain = emotion_prompt | self.chatmodel | StrOutputParser()
-            result = emotion_chain.invoke({"query": query}).strip().lower()
+            result = self._emotion_chain().invoke({"query": query}).strip().lower()
             return result if result in self.MOODS else "default"
         except Exception as e:
             print(f"⚠️ 情绪判断失败：{str(e)}，已使用默认情绪")
             return "default"
 
-    def update_prompt_and_agent(self, qingxu: str):
-        """根据用户情绪更新提示词和Agent配置"""
-        self.qingxu = qingxu
-        self.prompt = self._init_prompt()
-        self.agent = create_openai_tools_agent(self.chatmodel, self.tools, self.prompt)
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            memory=self.memory,
-            return_intermediate_steps=True,
-            verbose=True,
-            handle_parsing_errors="很抱歉，算卦过程中出现小差错，请稍后再试~"
-        )
-
-    def background_voice_synthesis(self, text: str, uid: str):
+    async def _allm_qingxu_chain(self, query: str):
         try:
-            asyncio.run(self.get_voice(text, uid))
+            result = (await self._emotion_chain().ainvoke({"query": query})).strip().lower()
+            return result if result in self.MOODS else "default"
         except Exception as e:
-            print(f"⚠️ 语音合成后台任务失败：{str(e)}")
-
-    async def get_voice(self, text: str, uid: str):
-        AZURE_TTS_REGION = "eastus"
-        TTS_API_URL = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/v1"
-        # 代理配置
-        PROXIES = {"http://": "http://127.0.0.1:7890",
-                       "https://": "http://127.0.0.1:7890"}
-        try:
-            print(f"🎤 开始语音合成（UID：{uid}）：{text[:30]}...")
-
-            try:
-                proxy_test = await httpx.AsyncClient(proxies=PROXIES, timeout=5).get("https://www.google.com")
-                print("✅ 代理网络连通性正常")
-            except Exception as e:
-                raise Exception(f"代理网络不通：{str(e)}") from e
-        
+            print(f"⚠️ 情绪判断失败：{str(e)}，已使用默认情绪")
+            return "default"
 
-            voicestyle = self.MOODS.get(self.qingxu, self.MOODS["default"])["voicestyle"]
-            ssml = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis"
-                      xmlns:mstts="http://www.w3.org/2001/mstts" xml:lang="zh-CN">
-                <voice name="zh-CN-XiaoxiaoMultilingualNeural">
-                    <mstts:express-as style="{voicestyle}" role="YoungFemale">
-                        {text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")}
-                    </mstts:express-as>
-                </voice>
-            </speak>"""
-
-            headers = {
-                "Ocp-Apim-Subscription-Key": config.AZURE_TTS_KEY,
-                "Content-Type": "application/ssml+xml",
-                "X-Microsoft-OutputFormat": "audio-16khz-32kbitrate-mono-mp3",
-                "User-Agent": "HuangBanxian-TTS-Client"
-            }
-
-            async with httpx.AsyncClient(proxies=PROXIES, timeout=20) as client:
-                response = await client.post(
-                    url=TTS_API_URL,
-                    headers=headers,
-                    data=ssml.encode("utf-8")
-                )
-            response.raise_for_status()
-
-            os.makedirs("voices", exist_ok=True)
-            with open(f"voices/{uid}.mp3", "wb") as f:
-                f.write(response.content)
-            print(f"✅ 语音文件已保存：voices/{uid}.mp3")
-        except Exception as e:
-            print(f"❌ 语音合成异常：{str(e)}")
-            print(f"📜 异常堆栈：{traceback.format_exc()}")
+    def update_prompt_and_agent(self, qingxu: str):
+        """根据用户情绪切换到预编译的Agent执行器（不再重复构建）"""
+        self.qingxu = qingxu if qingxu in self.MOODS else "default"
+        self.agent_executor = self.get_agent_executor(self.qingxu)
+        return self.agent_executor
+
+    def submit_voice(self, text: str, audio_uid: str, qingxu: str = "default", owner: str = None):
+        """把语音合成提交到调度器（有界并发、限流、短文本优先），不阻塞当前响应
+
+        qingxu 为本次请求识别出的情绪（由 run/arun/astream_run 的结果带回）；Master 为单例，
+        不读取实例上的情绪状态，避免并发请求互相覆盖语气。
+        合成结果为 voices/{audio_uid}.mp3；分句模式下各句依次可用：voices/{audio_uid}_{i}.mp3，
+        进度见清单 voices/{audio_uid}.json
+        """
+        voicestyle = self.MOODS.get(qingxu, self.MOODS["default"])["voicestyle"]
+        return get_tts_scheduler().submit(text, voicestyle, audio_uid, owner=owner)
 
 
     def run(self, query: str):
-        """处理用户查询的核心逻辑"""
+        """处理用户查询的核心逻辑（同步版本）"""
+        user_emotion = "default"
         try:
             # 情绪识别与Agent配置更新
             user_emotion = self.qingxu_chain(query)
-            self.update_prompt_and_agent(user_emotion)
-            print(f"😊 识别用户情绪：{user_emotion}，已更新Agent配置")
+            agent_executor = self.update_prompt_and_agent(user_emotion)
+            print(f"😊 识别用户情绪：{user_emotion}，已切换Agent配置")
+
+            # 通用问题先查回答缓存（命中时不调用大模型，仍记入聊天历史）；
+            # 会话已有历史或摘要时回答依赖上下文，不查也不写缓存
+            memory = self._init_memory(self.get_history())
+            chat_history = memory.load_memory_variables({})[self.MEMORY_KEY]
+            use_cache = self.answer_cache is not None and not chat_history
+            cached, probe = self.answer_cache.lookup(query, user_emotion) if use_cache else (None, None)
+            if cached is not None:
+                print("⚡ 命中回答缓存")
+                memory.save_context({"input": query}, {"output": cached})
+                return {"output": cached, "intermediate_steps": [], "cached": True, "qingxu": user_emotion}
 
             # 调用Agent处理查询
-            result = self.agent_executor.invoke({
+            result = agent_executor.invoke({
                 "input": query,
-                "chat_history": self.memory.chat_memory
+                "chat_history": chat_history
             })
 
             if not isinstance(result, dict) or "output" not in result:
-                return {"output": "很抱歉，暂时无法为您提供算卦解答~", "intermediate_steps": []}
-            return result
+                return {"output": "很抱歉，暂时无法为您提供算卦解答~", "intermediate_steps": [], "qingxu": user_emotion}
+            memory.save_context({"input": query}, {"output": result["output"]})
+            if probe is not None:
+                self.answer_cache.store(probe, result["output"], tools_used(result), has_history=bool(chat_history))
+            return dict(result, qingxu=user_emotion)
         except Exception as e:
             error_msg = f"算卦过程中出现小插曲：{str(e)}"
             print(f"❌ 核心逻辑异常：{error_msg}")
-            return {"output": "很抱歉，算卦过程中出现小插曲，请稍后再试~", "error": error_msg}
+            return {"output": "很抱歉，算卦过程中出现小插曲，请稍后再试~", "error": error_msg, "qingxu": user_emotion}
+
+    async def arun(self, query: str):
+        """处理用户查询的核心逻辑（异步版本：Agent、工具与Redis历史全程异步）"""
+        user_emotion = "default"
+        try:
+            user_emotion = await self.aqingxu_chain(query)
+            agent_executor = self.update_prompt_and_agent(user_emotion)
+            print(f"😊 识别用户情绪：{user_emotion}，已切换Agent配置")
+
+            memory = self._init_memory(self.get_history())
+            chat_history = (await memory.aload_memory_variables({}))[self.MEMORY_KEY]
+            use_cache = self.answer_cache is not None and not chat_history
+            cached, probe = await self.answer_cache.alookup(query, user_emotion) if use_cache else (None, None)
+            if cached is not None:
+                print("⚡ 命中回答缓存")
+                await self.asave_turn(memory, query, cached)
+                return {"output": cached, "intermediate_steps": [], "cached": True, "qingxu": user_emotion}
+
+            result = await agent_executor.ainvoke({
+                "input": query,
+                "chat_history": chat_history
+            })
+
+            if not isinstance(result, dict) or "output" not in result:
+                return {"output": "很抱歉，暂时无法为您提供算卦解答~", "intermediate_steps": [], "qingxu": user_emotion}
+            await self.asave_turn(memory, query, result["output"])
+            if probe is not None:
+                self.answer_cache.store(probe, result["output"], tools_used(result), has_history=bool(chat_history))
+            return dict(result, qingxu=user_emotion)
+        except Exception as e:
+            error_msg = f"算卦过程中出现小插曲：{str(e)}"
+            print(f"❌ 核心逻辑异常：{error_msg}")
+            return {"output": "很抱歉，算卦过程中出现小插曲，请稍后再试~", "error": error_msg, "qingxu": user_emotion}
+
+    async def asave_turn(self, memory, query: str, answer: str):
+        """异步保存一轮对话到聊天历史（连同每条消息的token数）"""
+        try:
+            await memory.asave_context({"input": query}, {"output": str(answer)})
+        except Exception as e:
+            print(f"⚠️ 保存聊天历史失败：{str(e)}")
+
+    async def astream_run(self, query: str):
+        """流式处理用户查询：逐个产出 token / 工具开始 / 工具结束 / 最终结果（含本次识别的情绪） 事件"""
+        answer, user_emotion = "", "default"
+        try:
+            user_emotion = await self.aqingxu_chain(query)
+            agent_executor = self.update_prompt_and_agent(user_emotion)
+            print(f"😊 识别用户情绪：{user_emotion}，已切换Agent配置（流式）")
+
+            tool_names = {t.name for t in self.tools}
+            tokens, used_tools = [], []
+            memory = self._init_memory(self.get_history())
+            chat_history = (await memory.aload_memory_variables({}))[self.MEMORY_KEY]
+            use_cache = self.answer_cache is not None and not chat_history
+            cached, probe = await self.answer_cache.alookup(query, user_emotion) if use_cache else (None, None)
+            if cached is not None:
+                print("⚡ 命中回答缓存（流式）")
+                await self.asave_turn(memory, query, cached)
+                yield {"type": "token", "content": cached}
+                yield {"type": "final", "message": cached, "qingxu": user_emotion}
+                return
+
+            async for event in agent_executor.astream_events(
+                {"input": query, "chat_history": chat_history},
+                version="v1"
+            ):
+                kind, name = event["event"], event["name"]
+                if kind == "on_chat_model_stream" and AGENT_LLM_TAG in event.get("tags", []):
+                    content = event["data"]["chunk"].content
+                    if content:
+                        tokens.append(content)
+                        yield {"type": "token", "content": content}
+                elif kind == "on_tool_start" and name in tool_names:
+                    used_tools.append(name)
+                    yield {"type": "tool_start", "tool": name,
+                           "message": TOOL_STATUS.get(name, "黄半仙正在掐指一算…")}
+                elif kind == "on_tool_end" and name in tool_names:
+                    yield {"type": "tool_end", "tool": name}
+                elif kind == "on_chain_end" and name == "AgentExecutor":
+                    output = event["data"].get("output")
+                    if isinstance(output, dict) and "output" in output:
+                        answer = output["output"]
+            answer = answer or "".join(tokens)
+            if answer:
+                await self.asave_turn(memory, query, answer)
+                if probe is not None:
+                    self.answer_cache.store(probe, answer, used_tools, has_history=bool(chat_history))
+            else:
+                answer = "很抱歉，暂时无法为您提供算卦解答~"
+        except Exception as e:
+            error_msg = f"算卦过程中出现小插曲：{str(e)}"
+            print(f"❌ 流式核心逻辑异常：{error_msg}")
+            yield {"type": "error", "message": error_msg}
+            answer = "很抱歉，算卦过程中出现小插曲，请稍后再试~"
+        yield {"type": "final", "message": answer if isinstance(answer, str) else str(answer), "qingxu": user_emotion}
 
 
 # 5. 接口路由
+@app.on_event("startup")
+async def warm_up_knowledge_base():
+    """启动时打开本地知识库（集合常驻内存，避免首个检索请求加载存储）"""
+    try:
+        await asyncio.to_thread(get_knowledge_base)
+    except Exception as e:
+        print(f"⚠️ 本地知识库预加载失败：{str(e)}，将在首次使用时重试")
+
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    """启动后台入库 worker（上次未完成的任务会重新排队）"""
+    await get_job_queue().start()
+
+
+@app.on_event("startup")
+async def start_tts_service():
+    """在应用事件循环上创建语音服务的长连接、启动定期健康检查与语音任务 worker"""
+    await get_tts_service().start()
+    await get_tts_scheduler().start()
+
+
+@app.on_event("shutdown")
+async def close_shared_clients():
+    """服务关闭时释放共享连接池"""
+    await get_job_queue().stop()
+    shutdown_split_pool()
+    await get_tts_scheduler().stop()
+    await get_tts_service().close()
+    client = get_yuanfenju_client()
+    client.close()
+    await client.aclose()
+    close_knowledge_base()
+
+
 @app.get("/")
 def read_root():
     """根路径健康检查"""
@@ -299,6 +463,20 @@ def read_root():
     }
 
 
+@app.get("/metrics")
+def metrics():
+    """运行指标：各级缓存命中情况、语音服务健康状态、语音任务队列深度与排队时间"""
+    return {
+        "status": "success",
+        "tool_cache": get_tool_cache().stats(),
+        "embedding_cache": get_embeddings().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "tts_cache": get_tts_cache().stats(),
+        "tts_service": get_tts_service().status(),
+        "tts_scheduler": get_tts_scheduler().stats()
+    }
+
+
 @app.post("/chat")
 async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     """聊天接口（核心）：接收用户查询，返回命理解答和语音"""
@@ -310,9 +488,10 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
         # 初始化Master（传递前端uid，无则后端生成）
         user_uid = request.uid or str(uuid.uuid4())
         master = Master(uid=user_uid)
+        current_uid.set(user_uid)
         
-        # 在线程池执行同步逻辑（避免阻塞FastAPI异步进程）
-        response_dict = await run_in_threadpool(master.run, query)
+        # 异步执行Agent（不占用线程池，单个worker即可并发处理大量会话）
+        response_dict = await master.arun(query)
 
         # 处理Agent返回结果
         answer = response_dict.get("output", "很抱歉，暂时无法为您提供解答~")
@@ -321,12 +500,10 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
 
         # 生成唯一语音UID（避免重复）
         audio_uid = f"{user_uid}_{int(time.time())}"
-        # 添加语音合成到后台任务（不阻塞响应返回）
-        background_tasks.add_task(
-            master.background_voice_synthesis,
-            text=answer,
-            uid=audio_uid
-        )
+        # 提交语音合成任务（不阻塞响应返回）
+        master.submit_voice(answer, audio_uid, response_dict.get("qingxu", "default"), owner=user_uid)
+        # 响应发出后滚动总结会话历史
+        background_tasks.add_task(master.summarize_history, user_uid)
 
         # 返回结果（包含uid，供前端下次请求复用）
         return {
@@ -334,6 +511,9 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
             "message": answer,
             "audio_uid": audio_uid,
             "audio_path": f"voices/{audio_uid}.mp3",
+            "audio_manifest": f"voices/{audio_uid}.json",  # 分句合成的分段清单
+            "audio_url": f"/voices/{audio_uid}",  # 语音下载地址（支持Range）
+            "audio_events": f"/voices/{audio_uid}/events",  # 语音就绪通知（SSE）
             "uid": user_uid  # 回传uid，前端保存后下次请求携带
         }
     except HTTPException as e:
@@ -343,42 +523,74 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
         return {"status": "error", "message": error_msg}, 500
 
 
+def _sse(event: dict) -> str:
+    """把事件编码为 Server-Sent Events 格式"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """流式聊天接口（SSE）：边生成边推送回答token和工具进度，最后推送uid和语音UID"""
+    try:
+        query = request.query.strip()
+        if not query:
+            raise HTTPException(status_code=400, detail="查询内容不能为空，请输入您的问题")
+
+        user_uid = request.uid or str(uuid.uuid4())
+        master = Master(uid=user_uid)
+
+        async def event_stream():
+            current_uid.set(user_uid)
+            answer, qingxu = "", "default"
+            async for event in master.astream_run(query):
+                if event["type"] == "final":
+                    answer, qingxu = event["message"], event.get("qingxu", "default")
+                    continue
+                yield _sse(event)
+
+            # 回答完整后再合成语音（不阻塞最终事件的推送）
+            audio_uid = f"{user_uid}_{int(time.time())}"
+            master.submit_voice(answer, audio_uid, qingxu, owner=user_uid)
+            yield _sse({
+                "type": "final",
+                "status": "success",
+                "message": answer,
+                "audio_uid": audio_uid,
+                "audio_path": f"voices/{audio_uid}.mp3",
+                "audio_manifest": f"voices/{audio_uid}.json",
+                "audio_url": f"/voices/{audio_uid}",
+                "audio_events": f"/voices/{audio_uid}/events",
+                "uid": user_uid
+            })
+            # 最终事件推送后再滚动总结会话历史
+            master.schedule_summary(user_uid)
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except HTTPException as e:
+        return {"status": "error", "message": e.detail}, e.status_code
+    except Exception as e:
+        error_msg = f"接口执行失败：{str(e)}"
+        return {"status": "error", "message": error_msg}, 500
+
+
 @app.post("/add_urls")
 def add_urls(request: URLRequest):
-    """知识库接口：添加URL内容到本地向量库"""
+    """知识库接口：提交URL入库任务，立即返回任务ID（进度见 /jobs/{job_id}）"""
     try:
         url = request.URL.strip()
         if not url:
             raise HTTPException(status_code=400, detail="URL不能为空")
 
-        # 加载URL内容
-        loader = WebBaseLoader(url)
-        docs = loader.load()
-        if not docs:
-            raise Exception("未从URL中加载到内容，请检查URL是否有效（需能正常访问）")
-
-        # 分割文档（避免单文档过长）
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=50  # 片段重叠，保证上下文连贯
-        )
-        split_docs = text_splitter.split_documents(docs)
-        print(f"📥 加载并分割文档：{len(split_docs)} 个片段")
-
-        # 存储到Qdrant向量库
-        qdrant = Qdrant.from_documents(
-            documents=split_docs,
-            embedding=OpenAIEmbeddings(
-                openai_api_key=config.OPENAI_API_KEY,
-                openai_api_base=config.OPENAI_API_BASE
-            ),
-            path=config.QDRANT_PATH,
-            collection_name="local_documents"
-        )
+        # 抓取 → 分割 → 嵌入 → 写入 在后台任务中增量执行，不再阻塞请求
+        job_id = get_job_queue().submit([url])
         return {
-            "status": "success", 
-            "message": f"URL内容已添加到知识库（{len(split_docs)}个文档片段）", 
-            "collection": "local_documents",
+            "status": "success",
+            "message": "URL已加入知识库入库队列",
+            "job_id": job_id,
             "url": url
         }
     except HTTPException as e:
@@ -388,6 +600,63 @@ def add_urls(request: URLRequest):
         return {"status": "error", "message": error_msg}, 500
 
 
+@app.post("/add_urls/batch")
+def add_urls_batch(request: BatchURLRequest):
+    """知识库接口：批量提交URL（或sitemap中的全部页面）入库任务，每个URL的结果见 /jobs/{job_id}"""
+    try:
+        urls = [url.strip() for url in request.URLs if url.strip()]
+        if not urls and not request.sitemap:
+            raise HTTPException(status_code=400, detail="URLs 与 sitemap 不能同时为空")
+
+        job_id = get_job_queue().submit(urls, sitemap=request.sitemap)
+        return {
+            "status": "success",
+            "message": f"已加入知识库入库队列（{len(urls)}个URL" + ("，含sitemap）" if request.sitemap else "）"),
+            "job_id": job_id
+        }
+    except HTTPException as e:
+        return {"status": "error", "message": e.detail}, e.status_code
+    except Exception as e:
+        error_msg = f"批量添加URL失败：{str(e)}"
+        return {"status": "error", "message": error_msg}, 500
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """入库任务进度：状态、已抓取页面数、分片数、已嵌入/已写入片段数，完成后附带每个URL的结果"""
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        return JSONResponse({"status": "error", "message": f"任务不存在：{job_id}"}, status_code=404)
+    return {"status": "success", "job": job}
+
+
+@app.get("/voices/{audio_uid}")
+def get_voice(audio_uid: str, request: Request):
+    """语音下载：完整语音 {audio_uid} 或分段 {audio_uid}_{i}，支持Range与ETag，可被浏览器/CDN长期缓存"""
+    if not AUDIO_UID_RE.match(audio_uid):
+        return JSONResponse({"status": "error", "message": "非法的语音UID"}, status_code=400)
+    return audio_file_response(os.path.join(config.VOICES_DIR, f"{audio_uid}.mp3"), request.headers)
+
+
+@app.get("/voices/{audio_uid}/events")
+async def voice_events(audio_uid: str, timeout: float = None):
+    """语音就绪通知（SSE）：每段可播放时推送 segment（含分段地址），完成推送 complete，失败/过期推送 failed；
+    服务端在状态变化时推送，客户端无需轮询"""
+    if not AUDIO_UID_RE.match(audio_uid):
+        return JSONResponse({"status": "error", "message": "非法的语音UID"}, status_code=400)
+    timeout = min(timeout or config.TTS_EVENTS_TIMEOUT, config.TTS_EVENTS_TIMEOUT)
+
+    async def event_stream():
+        async for event in audio_events(get_audio_status_board(), audio_uid, timeout):
+            yield _sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: websockets.WebSocket):
     """WebSocket接口：实时聊天（备用）"""
@@ -397,14 +666,15 @@ async def websocket_endpoint(websocket: websockets.WebSocket):
         # 初始化Master（生成临时uid）
         temp_uid = str(uuid.uuid4())
         master = Master(uid=temp_uid)
+        current_uid.set(temp_uid)
         
         while True:
             # 接收客户端消息
             user_input = await websocket.receive_text()
             print(f"💬 收到WebSocket消息（用户[{temp_uid}]）：{user_input}")
 
-            # 处理请求（线程池执行同步逻辑）
-            response_dict = await run_in_threadpool(master.run, user_input)
+            # 处理请求（异步执行Agent）
+            response_dict = await master.arun(user_input)
             answer = response_dict.get("output", "很抱歉，暂时无法为您提供解答~")
 
             # 发送响应给客户端
@@ -412,9 +682,12 @@ async def websocket_endpoint(websocket: websockets.WebSocket):
 
             # 生成语音（异步执行，不阻塞WebSocket）
             audio_uid = f"{temp_uid}_{int(time.time())}"
-            asyncio.create_task(master.get_voice(answer, audio_uid))
+            master.submit_voice(answer, audio_uid, response_dict.get("qingxu", "default"), owner=temp_uid)
+            master.schedule_summary(temp_uid)
     except WebSocketDisconnect:
         print(f"🔌 WebSocket客户端（用户[{temp_uid}]）已断开连接")
+        # 客户端已断开，排队中的语音不再需要
+        get_tts_scheduler().cancel(temp_uid)
     except Exception as e:
         error_msg = f"WebSocket异常：{str(e)}"
         print(f"❌ {error_msg}")
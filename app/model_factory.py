@@ -0,0 +1,99 @@
+import threading
+
+import openai
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from .config import config
+from .embedding_cache import CachedEmbeddings, open_embedding_store
+
+
+_lock = threading.Lock()
+_openai_clients = {}
+_chat_models = {}
+_embeddings = {}
+_embedding_store = None
+
+
+def get_openai_clients(base_url: str = None):
+    """按 base URL 共享 OpenAI 同步/异步根客户端（同一个 base URL 只建一次连接池）"""
+    base_url = base_url or config.OPENAI_API_BASE
+    clients = _openai_clients.get(base_url)
+    if clients is None:
+        with _lock:
+            clients = _openai_clients.get(base_url)
+            if clients is None:
+                params = {
+                    "api_key": config.OPENAI_API_KEY,
+                    "base_url": base_url,
+                    "timeout": config.OPENAI_TIMEOUT,
+                    "max_retries": config.OPENAI_MAX_RETRIES,
+                }
+                clients = (openai.OpenAI(**params), openai.AsyncOpenAI(**params))
+                _openai_clients[base_url] = clients
+    return clients
+
+
+def get_chat_model(model: str = None, temperature: float = 0, streaming: bool = False,
+                   base_url: str = None) -> ChatOpenAI:
+    """获取缓存的聊天模型实例（按 模型、温度、base URL、是否流式 区分），
+    所有实例共享同一 base URL 下的 OpenAI 客户端与连接池
+    """
+    model = model or config.OPENAI_MODEL
+    base_url = base_url or config.OPENAI_API_BASE
+    key = (model, float(temperature), base_url, streaming)
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        sync_client, async_client = get_openai_clients(base_url)
+        with _lock:
+            chat_model = _chat_models.get(key)
+            if chat_model is None:
+                chat_model = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    streaming=streaming,
+                    openai_api_key=config.OPENAI_API_KEY,
+                    openai_api_base=base_url,
+                    client=sync_client.chat.completions,
+                    async_client=async_client.chat.completions
+                )
+                _chat_models[key] = chat_model
+    return chat_model
+
+
+def get_embedding_store():
+    """获取共享的磁盘向量缓存（所有 embeddings 模型共用，键中包含模型名）"""
+    global _embedding_store
+    if _embedding_store is None:
+        with _lock:
+            if _embedding_store is None:
+                _embedding_store = open_embedding_store()
+    return _embedding_store
+
+
+def get_embeddings(model: str = "text-embedding-ada-002", base_url: str = None) -> CachedEmbeddings:
+    """获取缓存的 embeddings 实例（入库与检索共用，复用 OpenAI 客户端连接池，
+    向量结果经 内存LRU + SQLite 缓存，重复文本不再调用接口）
+    """
+    base_url = base_url or config.OPENAI_API_BASE
+    key = (model, base_url)
+    embeddings = _embeddings.get(key)
+    if embeddings is None:
+        sync_client, async_client = get_openai_clients(base_url)
+        store = get_embedding_store()
+        with _lock:
+            embeddings = _embeddings.get(key)
+            if embeddings is None:
+                embeddings = CachedEmbeddings(
+                    OpenAIEmbeddings(
+                        model=model,
+                        openai_api_key=config.OPENAI_API_KEY,
+                        openai_api_base=base_url,
+                        client=sync_client.embeddings,
+                        async_client=async_client.embeddings
+                    ),
+                    store,
+                    model=model,
+                    memory_size=config.EMBEDDING_CACHE_MEMORY_SIZE
+                )
+                _embeddings[key] = embeddings
+    return embeddings
@@ -0,0 +1,225 @@
+import json
+import threading
+import zlib
+from typing import List, Optional, Sequence
+
+import redis
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict
+from redis import asyncio as aioredis
+
+from .chat_history import summary_message
+from .config import config
+
+
+# 编码首字节：j 为紧凑JSON，z 为 zlib 压缩后的紧凑JSON（短消息压缩反而变大，不压缩）
+RAW_PREFIX, ZLIB_PREFIX = b"j", b"z"
+COMPRESS_MIN_BYTES = 128
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pools(url: str = None):
+    """按URL共享同步/异步 Redis 连接池（进程内所有会话、缓存共用）"""
+    url = url or config.REDIS_URL
+    pools = _pools.get(url)
+    if pools is None:
+        with _pools_lock:
+            pools = _pools.get(url)
+            if pools is None:
+                pools = (
+                    redis.ConnectionPool.from_url(url, max_connections=config.REDIS_MAX_CONNECTIONS),
+                    aioredis.ConnectionPool.from_url(url, max_connections=config.REDIS_MAX_CONNECTIONS),
+                )
+                _pools[url] = pools
+    return pools
+
+
+def encode_message(message: BaseMessage) -> bytes:
+    """消息序列化：只保留类型、正文和附加字段（含token数），较长的消息再做 zlib 压缩"""
+    data = {"t": message.type, "c": message.content}
+    if message.additional_kwargs:
+        data["k"] = message.additional_kwargs
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw)
+        if len(compressed) < len(raw):
+            return ZLIB_PREFIX + compressed
+    return RAW_PREFIX + raw
+
+
+def decode_message(blob: bytes) -> BaseMessage:
+    raw = zlib.decompress(blob[1:]) if blob[:1] == ZLIB_PREFIX else blob[1:]
+    data = json.loads(raw)
+    return messages_from_dict([{
+        "type": data["t"],
+        "data": {"content": data["c"], "additional_kwargs": data.get("k", {})},
+    }])[0]
+
+
+class SessionStore:
+    """Redis 会话存储
+
+    - 共享连接池，不再每个会话新建连接
+    - 读取（消息 + 摘要）与追加（写入 + 续期）各只需一次往返（pipeline）
+    - 每个会话的键按 SESSION_TTL 过期，每次追加时续期
+    - 消息以紧凑JSON存储，较长的消息 zlib 压缩
+    """
+
+    def __init__(self, url: str = None, ttl: int = None, key_prefix: str = "session:",
+                 client=None, async_client=None):
+        self.ttl = config.SESSION_TTL if ttl is None else ttl
+        self.key_prefix = key_prefix
+        if client is None or async_client is None:
+            pool, async_pool = get_connection_pools(url)
+            client = client or redis.Redis(connection_pool=pool)
+            async_client = async_client or aioredis.Redis(connection_pool=async_pool)
+        self.client = client
+        self.async_client = async_client
+
+    def messages_key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}:messages"
+
+    def summary_key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}:summary"
+
+    @staticmethod
+    def _parse(items, raw_summary):
+        messages = [decode_message(item) for item in items]
+        return (json.loads(raw_summary) if raw_summary else None), messages
+
+    def _queue_append(self, pipe, session_id: str, messages: Sequence[BaseMessage]):
+        pipe.rpush(self.messages_key(session_id), *[encode_message(m) for m in messages])
+        if self.ttl:
+            pipe.expire(self.messages_key(session_id), self.ttl)
+            pipe.expire(self.summary_key(session_id), self.ttl)
+
+    def load(self, session_id: str):
+        """一次往返读取 (摘要记录, 消息列表)"""
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.lrange(self.messages_key(session_id), 0, -1)
+            pipe.get(self.summary_key(session_id))
+            items, raw_summary = pipe.execute()
+        return self._parse(items, raw_summary)
+
+    async def aload(self, session_id: str):
+        async with self.async_client.pipeline(transaction=False) as pipe:
+            pipe.lrange(self.messages_key(session_id), 0, -1)
+            pipe.get(self.summary_key(session_id))
+            items, raw_summary = await pipe.execute()
+        return self._parse(items, raw_summary)
+
+    def append(self, session_id: str, messages: Sequence[BaseMessage]):
+        """一次往返追加消息并续期会话"""
+        if not messages:
+            return
+        with self.client.pipeline(transaction=False) as pipe:
+            self._queue_append(pipe, session_id, messages)
+            pipe.execute()
+
+    async def aappend(self, session_id: str, messages: Sequence[BaseMessage]):
+        if not messages:
+            return
+        async with self.async_client.pipeline(transaction=False) as pipe:
+            self._queue_append(pipe, session_id, messages)
+            await pipe.execute()
+
+    async def acompact(self, session_id: str, record: dict, keep: int, seen: int):
+        """写入新摘要并只保留最近 keep 条消息（生成摘要期间新追加的消息一并保留）"""
+        key = self.messages_key(session_id)
+        async with self.async_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    newer = max(await pipe.llen(key) - seen, 0)
+                    pipe.multi()
+                    pipe.set(self.summary_key(session_id), json.dumps(record, ensure_ascii=False),
+                             ex=self.ttl or None)
+                    if keep + newer:
+                        pipe.ltrim(key, -(keep + newer), -1)
+                    else:
+                        pipe.delete(key)
+                    await pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def clear(self, session_id: str):
+        self.client.delete(self.messages_key(session_id), self.summary_key(session_id))
+
+    async def aclear(self, session_id: str):
+        await self.async_client.delete(self.messages_key(session_id), self.summary_key(session_id))
+
+    def ping(self) -> bool:
+        return self.client.ping()
+
+
+class RedisSessionHistory(BaseChatMessageHistory):
+    """单个会话的聊天历史视图（接口与 LocalChatMessageHistory 一致）"""
+
+    def __init__(self, store: SessionStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.store.load(self.session_id)[1]
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        return (await self.store.aload(self.session_id))[1]
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.store.append(self.session_id, [message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.append(self.session_id, messages)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        await self.store.aappend(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+    async def aclear(self) -> None:
+        await self.store.aclear(self.session_id)
+
+    def load(self):
+        """返回 (摘要记录, 消息列表)"""
+        return self.store.load(self.session_id)
+
+    async def aload(self):
+        return await self.store.aload(self.session_id)
+
+    def get_summary(self) -> Optional[dict]:
+        return self.load()[0]
+
+    async def aget_summary(self) -> Optional[dict]:
+        return (await self.aload())[0]
+
+    def context_messages(self) -> List[BaseMessage]:
+        summary, messages = self.load()
+        summary = summary_message(summary)
+        return ([summary] if summary else []) + messages
+
+    async def acontext_messages(self) -> List[BaseMessage]:
+        summary, messages = await self.aload()
+        summary = summary_message(summary)
+        return ([summary] if summary else []) + messages
+
+    async def acompact(self, record: dict, keep: int, seen: int) -> None:
+        await self.store.acompact(self.session_id, record, keep, seen)
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """获取进程内共享的会话存储"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore()
+    return _session_store
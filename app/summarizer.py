@@ -0,0 +1,135 @@
+import asyncio
+import json
+import re
+import threading
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain.schema import StrOutputParser
+
+from .config import config
+from .model_factory import get_chat_model
+from .tools.bazi_params import extract_bazi_params
+
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是对话记录整理助手。把“已有摘要”和“新对话”合并为一份简洁的中文摘要（不超过{max_chars}字），"
+               "保留用户问过的问题与得到的结论，并提取用户关键信息（姓名、性别、生日、出生时间、出生地）。\n"
+               "只返回JSON：{{\"summary\": \"摘要\", \"facts\": {{\"姓名\": \"\", \"性别\": \"\", "
+               "\"生日\": \"\", \"出生时间\": \"\", \"出生地\": \"\"}}}}，未知字段留空。"),
+    ("user", "已有摘要：{summary}\n已知关键信息：{facts}\n\n新对话：\n{dialogue}")
+])
+
+JSON_RE = re.compile(r"\{.*\}", re.S)
+
+
+def extract_facts(messages) -> dict:
+    """用规则从用户消息中提取关键信息（姓名、性别、生日、出生时间），后出现的覆盖先出现的"""
+    facts = {}
+    for message in messages:
+        if message.type != "human":
+            continue
+        params, _ = extract_bazi_params(message.content)
+        if "name" in params:
+            facts["姓名"] = params["name"]
+        if "sex" in params:
+            facts["性别"] = "男" if params["sex"] == 0 else "女"
+        if "year" in params:
+            calendar = "农历" if params["type"] == 0 else "公历"
+            facts["生日"] = f"{calendar}{params['year']}-{params['month']:02d}-{params['day']:02d}"
+            if (params["hours"], params["minute"]) != (0, 0):
+                facts["出生时间"] = f"{params['hours']:02d}:{params['minute']:02d}"
+    return facts
+
+
+def format_dialogue(messages) -> str:
+    speakers = {"human": "用户", "ai": "黄半仙"}
+    return "\n".join(f"{speakers.get(m.type, m.type)}：{m.content}" for m in messages)
+
+
+def parse_summary(text: str, previous: dict):
+    """解析模型返回的JSON；格式不对时整段作为摘要、沿用已有关键信息"""
+    match = JSON_RE.search(text or "")
+    try:
+        data = json.loads(match.group(0)) if match else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return (text or "").strip() or previous.get("summary", ""), {}
+    facts = data.get("facts") if isinstance(data.get("facts"), dict) else {}
+    return str(data.get("summary") or "").strip(), {k: str(v).strip() for k, v in facts.items() if v}
+
+
+class ConversationSummarizer:
+    """按会话滚动总结聊天历史：超过 trigger 条消息后，把较早的消息并入“摘要 + 关键信息”记录，
+    只保留最近 keep 条原始消息，提示词长度与历史读取开销不随对话轮数增长。
+
+    在回答发出之后异步执行；同一会话同时只有一个总结任务。
+    """
+
+    def __init__(self, chat_model=None, trigger: int = None, keep: int = None, max_chars: int = None):
+        self._chat_model = chat_model
+        self.trigger = trigger or config.MEMORY_SUMMARY_TRIGGER
+        self.keep = config.MEMORY_TAIL_MESSAGES if keep is None else keep
+        self.max_chars = max_chars or config.MEMORY_SUMMARY_MAX_CHARS
+        self._running = set()
+        self._tasks = set()
+
+    @property
+    def chat_model(self):
+        if self._chat_model is None:
+            self._chat_model = get_chat_model(temperature=0)
+        return self._chat_model
+
+    async def summarize(self, session_id: str, history) -> bool:
+        """需要时总结一次会话历史，返回是否执行了总结"""
+        if session_id in self._running:
+            return False
+        self._running.add(session_id)
+        try:
+            previous, messages = await history.aload()
+            if len(messages) <= self.trigger:
+                return False
+            older = messages[:len(messages) - self.keep] if self.keep else messages
+            previous = previous or {}
+            # 规则提取的信息优先于旧记录，模型提取的信息只补充缺失字段
+            facts = dict(previous.get("facts") or {})
+            facts.update(extract_facts(older))
+            chain = SUMMARY_PROMPT | self.chat_model | StrOutputParser()
+            text = await chain.ainvoke({
+                "max_chars": self.max_chars,
+                "summary": previous.get("summary") or "无",
+                "facts": json.dumps(facts, ensure_ascii=False),
+                "dialogue": format_dialogue(older),
+            })
+            summary, llm_facts = parse_summary(text, previous)
+            for key, value in llm_facts.items():
+                facts.setdefault(key, value)
+            await history.acompact({"summary": summary, "facts": facts}, keep=self.keep, seen=len(messages))
+            print(f"📝 会话[{session_id}]已总结{len(older)}条历史消息")
+            return True
+        except Exception as e:
+            print(f"⚠️ 会话[{session_id}]历史总结失败：{str(e)}")
+            return False
+        finally:
+            self._running.discard(session_id)
+
+    def schedule(self, session_id: str, history):
+        """在当前事件循环中后台执行总结（不阻塞调用方）"""
+        task = asyncio.create_task(self.summarize(session_id, history))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer() -> ConversationSummarizer:
+    """获取进程内共享的会话总结器"""
+    global _summarizer
+    if _summarizer is None:
+        with _summarizer_lock:
+            if _summarizer is None:
+                _summarizer = ConversationSummarizer()
+    return _summarizer
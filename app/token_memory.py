@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import tiktoken
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, get_buffer_string
+
+from .chat_history import summary_message
+from .config import config
+
+
+# 每条消息除正文外的固定开销（角色、分隔符），与OpenAI的计数口径一致
+TOKENS_PER_MESSAGE = 4
+# token数随消息存入历史（additional_kwargs 不会发送给模型）
+TOKEN_COUNT_KEY = "token_count"
+
+
+@lru_cache(maxsize=8)
+def get_encoder(model: str):
+    """按模型缓存tiktoken编码器；加载失败（如离线无法下载词表）时返回None，改按字符数估算"""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken编码器加载失败：{str(e)}，按字符数估算token")
+        return None
+
+
+def count_text_tokens(text: str, model: str = None) -> int:
+    encoder = get_encoder(model or config.OPENAI_MODEL)
+    return len(encoder.encode(text)) if encoder is not None else len(text)
+
+
+def message_tokens(message: BaseMessage, counter: Callable[[str], int] = None) -> int:
+    """消息的token数：首次计算后记在消息上，之后直接读取，不再重复编码"""
+    count = message.additional_kwargs.get(TOKEN_COUNT_KEY)
+    if count is None:
+        count = (counter or count_text_tokens)(str(message.content)) + TOKENS_PER_MESSAGE
+        message.additional_kwargs[TOKEN_COUNT_KEY] = count
+    return count
+
+
+def token_window(messages: List[BaseMessage], max_tokens: int, counter: Callable[[str], int] = None):
+    """从最新消息往前累加token数，返回不超过上限的最近消息（至少保留最后一条）"""
+    total, start = 0, len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        total += message_tokens(messages[i], counter)
+        if total > max_tokens and start < len(messages):
+            break
+        start = i
+    return messages[start:]
+
+
+class TokenBufferMemory(BaseChatMemory):
+    """按token上限截取最近消息的对话记忆（替代 ConversationTokenBufferMemory）
+
+    每条消息的token数在写入时计算一次并随消息存入历史，读取时按已存的计数累加截取，
+    不再每轮把整段历史重新编码；会话摘要作为系统消息放在最前面，占用同一份token预算。
+    """
+
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    memory_key: str = "history"
+    max_token_limit: int = 2000
+    counter: Optional[Callable[[str], int]] = None
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def _window(self, messages: List[BaseMessage], summary: Optional[dict]) -> List[BaseMessage]:
+        summary = summary_message(summary)
+        budget = self.max_token_limit
+        if summary is not None:
+            budget -= message_tokens(summary, self.counter)
+        window = ([summary] if summary else []) + token_window(messages, budget, self.counter)
+        if self.return_messages:
+            return window
+        return get_buffer_string(window, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if hasattr(self.chat_memory, "load"):
+            summary, messages = self.chat_memory.load()
+        else:
+            summary, messages = None, self.chat_memory.messages
+        return {self.memory_key: self._window(messages, summary)}
+
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # 会话存储支持一次往返同时读取摘要与消息
+        if hasattr(self.chat_memory, "aload"):
+            summary, messages = await self.chat_memory.aload()
+        else:
+            summary, messages = None, await self.chat_memory.aget_messages()
+        return {self.memory_key: self._window(messages, summary)}
+
+    def _turn(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> List[BaseMessage]:
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        messages = [HumanMessage(content=input_str), AIMessage(content=str(output_str))]
+        for message in messages:
+            message_tokens(message, self.counter)
+        return messages
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        self.chat_memory.add_messages(self._turn(inputs, outputs))
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        await self.chat_memory.aadd_messages(self._turn(inputs, outputs))
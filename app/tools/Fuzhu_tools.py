@@ -1,20 +1,21 @@
 from langchain.agents import tool
 from langchain_community.utilities import SerpAPIWrapper
-from langchain_community.vectorstores import Qdrant
-from qdrant_client import QdrantClient
-from langchain_openai import OpenAIEmbeddings
 from ..config import config
+from ..knowledge_base import get_knowledge_base
+
+
+def _serpapi():
+    return SerpAPIWrapper(
+        serpapi_api_key=config.SERPAPI_API_KEY,
+        params={"no_cache": "true"}
+    )
 
 
 @tool
 def search(query: str):
     '''只有需要了解实时信息或者不知道的事情时才会使用这个工具'''
     try:
-        serp = SerpAPIWrapper(
-            serpapi_api_key=config.SERPAPI_API_KEY,
-            params={"no_cache": "true"}
-        )
-        result = serp.run(query)
+        result = _serpapi().run(query)
         print(f"实时搜索结果（{query}）：{result[:100]}...")
         return result
     except Exception as e:
@@ -22,30 +23,50 @@ def search(query: str):
         return f"搜索失败：{str(e)}，请尝试其他问题"
 
 
+async def _asearch(query: str):
+    """search 的异步版本（SerpAPI 原生异步请求）"""
+    try:
+        result = await _serpapi().arun(query)
+        print(f"实时搜索结果（{query}）：{result[:100]}...")
+        return result
+    except Exception as e:
+        print(f"搜索工具异常：{str(e)}")
+        return f"搜索失败：{str(e)}，请尝试其他问题"
+
+
+def _format_local_db_result(result):
+    """格式化知识库检索结果"""
+    if result:
+        length = config.RETRIEVAL_SNIPPET_LENGTH
+        return "\n\n".join([f"知识库信息：{doc.page_content[:length]}..." for doc in result])
+    else:
+        return "本地知识库中未找到相关信息"
+
+
 @tool
 def get_infor_from_local_db(query: str):
     '''只有回答与2025年运势或者2025年相关问题才使用这个工具，从本地知识库中获取信息'''
     try:
-        # 连接本地向量库
-        client = Qdrant(
-            QdrantClient(path=config.QDRANT_PATH),
-            "local_documents",
-            OpenAIEmbeddings(
-                openai_api_key=config.OPENAI_API_KEY,
-                openai_api_base=config.OPENAI_API_BASE
-            )
-        )
-        
-        # 检索相关文档
-        retriever = client.as_retriever(search_type="mmr")
-        result = retriever.get_relevant_documents(query)
-        
+        # 检索相关文档（共享的知识库服务，不再每次重新打开向量库）
+        result = get_knowledge_base().search(query)
+
         # 格式化结果
-        if result:
-            return "\n\n".join([f"知识库信息：{doc.page_content[:300]}..." for doc in result[:3]])
-        else:
-            return "本地知识库中未找到相关信息"
+        return _format_local_db_result(result)
+    except Exception as e:
+        print(f"本地知识库查询异常：{str(e)}")
+        return f"知识库查询失败：{str(e)}"
+
+
+async def _aget_infor_from_local_db(query: str):
+    """get_infor_from_local_db 的异步版本"""
+    try:
+        result = await get_knowledge_base().asearch(query)
+        return _format_local_db_result(result)
     except Exception as e:
         print(f"本地知识库查询异常：{str(e)}")
         return f"知识库查询失败：{str(e)}"
-    
\ No newline at end of file
+
+
+# 挂载异步实现（Agent 走 ainvoke 时使用）
+search.coroutine = _asearch
+get_infor_from_local_db.coroutine = _aget_infor_from_local_db
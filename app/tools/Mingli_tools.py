@@ -1,17 +1,108 @@
 from langchain.agents import tool
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
-from langchain_openai import ChatOpenAI
-import requests
 import json
 import os
+from datetime import datetime, timedelta
+from functools import lru_cache
 from ..config import config
+from ..context import current_uid
+from ..model_factory import get_chat_model
+from .bazi_engine import bazi_from_params, format_bazi
+from .bazi_params import extract_bazi_params
+from .cache import get_tool_cache, normalize_key_part
+from .yuanfenju_client import get_yuanfenju_client
 
 
-@tool
-def bazi_cesuan(query: str):
-    "只有做八字排盘的时候才会使用到这个工具，需要输入用户姓名和出生年月日时，如果缺少则不可用"
-    url = "https://api.yuanfenju.com/index.php/v1/Bazi/paipan"
+# 缘份居接口（相对 config.YUANFENJU_BASE_URL）
+BAZI_ENDPOINT = "Bazi/paipan"
+MEIRI_ENDPOINT = "Zhanbu/meiri"
+ZHOUGONG_ENDPOINT = "Gongju/zhougong"
+
+# 八字缓存键使用的参数（同一姓名、性别、历法和出生时间的排盘结果恒定不变）
+BAZI_KEY_FIELDS = ("name", "sex", "type", "year", "month", "day", "hours", "minute")
+# 远程排盘接口要求姓名、性别；只取其中的八字（与姓名、性别无关），用户未提供时填默认值
+REMOTE_BAZI_DEFAULTS = {"name": "缘主", "sex": 0}
+
+
+class CachedResponse:
+    """缓存命中时的响应替身（提供与 requests/httpx 响应一致的 status_code/json/text）"""
+    status_code = 200
+
+    def __init__(self, json_data):
+        self._json_data = json_data
+
+    def json(self):
+        return self._json_data
+
+    @property
+    def text(self):
+        return json.dumps(self._json_data, ensure_ascii=False)
+
+
+def _bazi_cache_spec(data):
+    return "bazi", [data.get(k) for k in BAZI_KEY_FIELDS], config.TOOL_CACHE_BAZI_TTL
+
+
+def _meiri_cache_spec():
+    """每日占卜按用户按天缓存（无用户标识时不缓存），当天24点过期"""
+    uid = current_uid.get()
+    if not uid:
+        return None
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return "meiri", [uid, now.date().isoformat()], max(1, int((midnight - now).total_seconds()))
+
+
+def _jie_meng_cache_spec(keywords: str):
+    """解梦按关键词组合缓存（忽略顺序、空白和中英文逗号差异）"""
+    words = sorted(normalize_key_part(w) for w in keywords.replace("，", ",").split(",") if w.strip())
+    return "jie_meng", words, config.TOOL_CACHE_JIE_MENG_TTL
+
+
+def _is_success(result) -> bool:
+    try:
+        json_data = result.json()
+        return result.status_code == 200 and json_data.get("errcode") == 0 and "data" in json_data
+    except Exception:
+        return False
+
+
+def _cached_post(cache_spec, endpoint: str, data: dict):
+    """带结果缓存的缘份居请求（仅缓存成功结果）"""
+    if cache_spec is None:
+        return get_yuanfenju_client().post(endpoint, data)
+    namespace, parts, ttl = cache_spec
+    cache = get_tool_cache()
+    cached = cache.get(namespace, parts)
+    if cached is not None:
+        print(f"⚡ 工具缓存命中：{namespace}")
+        return CachedResponse(cached)
+    result = get_yuanfenju_client().post(endpoint, data)
+    if _is_success(result):
+        cache.set(namespace, parts, result.json(), ttl)
+    return result
+
+
+async def _acached_post(cache_spec, endpoint: str, data: dict):
+    """_cached_post 的异步版本"""
+    if cache_spec is None:
+        return await get_yuanfenju_client().apost(endpoint, data)
+    namespace, parts, ttl = cache_spec
+    cache = get_tool_cache()
+    cached = await cache.aget(namespace, parts)
+    if cached is not None:
+        print(f"⚡ 工具缓存命中：{namespace}")
+        return CachedResponse(cached)
+    result = await get_yuanfenju_client().apost(endpoint, data)
+    if _is_success(result):
+        await cache.aset(namespace, parts, result.json(), ttl)
+    return result
+
+
+@lru_cache(maxsize=1)
+def _bazi_params_chain():
+    """构建八字参数提取链（大模型从用户输入中提取排盘参数，进程内只构建一次）"""
     prompt = ChatPromptTemplate.from_template(
         """根据用户输入提取参数并按JSON格式返回：
         -"api_key":"{api_key}"
@@ -33,127 +124,234 @@ def bazi_cesuan(query: str):
         api_key=config.YUAN_MENG_JU_API_KEY
     )
     
-    # 初始化模型
-    llm = ChatOpenAI(
-        model=config.OPENAI_MODEL,
-        temperature=0.3,
-        openai_api_key=config.OPENAI_API_KEY,
-        openai_api_base=config.OPENAI_API_BASE
-    )
+    # 共享的模型实例（不再每次调用都新建客户端）
+    llm = get_chat_model(temperature=0.3)
     
-    chain = prompt | llm | parser
-    data = chain.invoke({"query": query})
+    return prompt | llm | parser
+
+
+def _format_bazi_result(result):
+    """解析八字排盘接口返回（requests/httpx 响应对象通用）"""
+    if result.status_code == 200:
+        print("============八字排盘返回数据===========")
+        print(result.json())
+        try:
+            json_data = result.json()
+            if json_data.get("errcode") == 0 and "data" in json_data:
+                returnstring = f"八字为：{json_data['data']['bazi_info']['bazi']}\n"
+                #returnstring += f"五行分布：{json_data['data']['bazi_info']['wuxing']}\n"
+                #returnstring += f"命局分析：{json_data['data']['analysis'][:200]}..."
+                return returnstring
+            else:
+                return f"八字排盘失败：{json_data.get('msg', '未知错误')}"
+        except Exception as e:
+            print("解析返回数据时出错：", e)
+            return "八字排盘失败，数据解析错误，请补充信息后重试"
+    else:
+        print(f"请求失败，状态码：{result.status_code}，响应：{result.text}")
+        return f"八字排盘失败，服务器返回状态码：{result.status_code}"
+
+
+def _local_bazi_data(query: str):
+    """规则提取排盘参数，必需字段齐全时直接返回接口参数，否则返回None（交给大模型提取）"""
+    params, missing = extract_bazi_params(query)
+    if missing:
+        print(f"规则提取八字参数缺少{missing}，使用大模型提取")
+        return None
+    data = {k: params[k] for k in BAZI_KEY_FIELDS if k in params}
+    data["api_key"] = config.YUAN_MENG_JU_API_KEY
+    if params.get("leap_month"):
+        data["leap_month"] = True
+    return data
+
+
+def _local_paipan(data):
+    """本地四柱排盘（无网络请求）；参数不完整或超出农历表范围时返回None，回退到远程排盘"""
+    try:
+        pillars = bazi_from_params(
+            int(data["year"]), int(data["month"]), int(data["day"]),
+            int(data.get("hours") or 0), int(data.get("minute") or 0),
+            lunar=str(data.get("type", 1)) == "0",
+            leap_month=bool(data.get("leap_month"))
+        )
+    except Exception as e:
+        print(f"本地排盘不可用（{str(e)}），使用远程排盘")
+        return None
+    return f"八字为：{format_bazi(pillars)}\n"
+
+
+def _remote_data(data):
+    """远程排盘接口参数（去掉本地专用字段，补齐姓名、性别）"""
+    if not isinstance(data, dict):
+        return data
+    data = {k: v for k, v in data.items() if k != "leap_month"}
+    for key, value in REMOTE_BAZI_DEFAULTS.items():
+        if data.get(key) in (None, ""):
+            data[key] = value
+    return data
+
+
+@tool
+def bazi_cesuan(query: str):
+    "只有做八字排盘的时候才会使用到这个工具，需要输入用户出生年月日时（姓名、性别可选），如果缺少出生日期则不可用"
+    data = _local_bazi_data(query) or _bazi_params_chain().invoke({"query": query})
+    local_result = _local_paipan(data)
+    if local_result:
+        return local_result
     
     try:
-        result = requests.post(url, data=data, proxies=config.PROXIES)
-        
-        if result.status_code == 200:
-            print("============八字排盘返回数据===========")
-            print(result.json())
-            try:
-                json_data = result.json()
-                if json_data.get("errcode") == 0 and "data" in json_data:
-                    returnstring = f"八字为：{json_data['data']['bazi_info']['bazi']}\n"
-                    #returnstring += f"五行分布：{json_data['data']['bazi_info']['wuxing']}\n"
-                    #returnstring += f"命局分析：{json_data['data']['analysis'][:200]}..."
-                    return returnstring
-                else:
-                    return f"八字排盘失败：{json_data.get('msg', '未知错误')}"
-            except Exception as e:
-                print("解析返回数据时出错：", e)
-                return "八字排盘失败，数据解析错误，请补充信息后重试"
-        else:
-            print(f"请求失败，状态码：{result.status_code}，响应：{result.text}")
-            return f"八字排盘失败，服务器返回状态码：{result.status_code}"
+        data = _remote_data(data)
+        result = _cached_post(_bazi_cache_spec(data), BAZI_ENDPOINT, data)
+        return _format_bazi_result(result)
+    except Exception as e:
+        print(f"八字排盘请求异常：{str(e)}")
+        return "八字排盘失败，网络异常，请稍后重试"
+
+
+async def _abazi_cesuan(query: str):
+    """bazi_cesuan 的异步版本"""
+    data = _local_bazi_data(query) or await _bazi_params_chain().ainvoke({"query": query})
+    local_result = _local_paipan(data)
+    if local_result:
+        return local_result
+
+    try:
+        data = _remote_data(data)
+        result = await _acached_post(_bazi_cache_spec(data), BAZI_ENDPOINT, data)
+        return _format_bazi_result(result)
     except Exception as e:
         print(f"八字排盘请求异常：{str(e)}")
         return "八字排盘失败，网络异常，请稍后重试"
 
 
+def _format_meiri_result(result):
+    """解析每日占卜接口返回"""
+    if result.status_code == 200:
+        print("============每日占卜返回数据===========")
+        print(result.json())
+        try:
+            json_data = result.json()
+            if json_data.get("errcode") == 0 and "data" in json_data:
+                data = json_data["data"]
+                returnstring = data
+                return returnstring
+            else:
+                return f"每日占卜失败：{json_data.get('msg', '未知错误')}"
+        except Exception as e:
+            print("解析返回数据时出错：", e)
+            return "每日占卜失败，数据解析错误，请稍后重试"
+    else:
+        print(f"请求失败，状态码：{result.status_code}")
+        return f"每日占卜失败，服务器返回状态码：{result.status_code}"
+
+
 @tool
 def mei_ri_zhan_bu():
     """只有用户想要每日占卜抽签的时候才会使用到这个工具，其他时候不可用"""
     try:
-        url = "https://api.yuanfenju.com/index.php/v1/Zhanbu/meiri"
-        result = requests.post(
-            url, 
-            data={"api_key": config.YUAN_MENG_JU_API_KEY},
-            proxies=config.PROXIES
+        result = _cached_post(
+            _meiri_cache_spec(),
+            MEIRI_ENDPOINT,
+            {"api_key": config.YUAN_MENG_JU_API_KEY}
         )
-        
-        if result.status_code == 200:
-            print("============每日占卜返回数据===========")
-            print(result.json())
-            try:
-                json_data = result.json()
-                if json_data.get("errcode") == 0 and "data" in json_data:
-                    data = json_data["data"]
-                    returnstring = data
-                    return returnstring
-                else:
-                    return f"每日占卜失败：{json_data.get('msg', '未知错误')}"
-            except Exception as e:
-                print("解析返回数据时出错：", e)
-                return "每日占卜失败，数据解析错误，请稍后重试"
-        else:
-            print(f"请求失败，状态码：{result.status_code}")
-            return f"每日占卜失败，服务器返回状态码：{result.status_code}"
+        return _format_meiri_result(result)
     except Exception as e:
         print(f"每日占卜请求异常：{str(e)}")
         return "每日占卜失败，网络异常，请稍后重试"
 
 
+async def _amei_ri_zhan_bu():
+    """mei_ri_zhan_bu 的异步版本"""
+    try:
+        result = await _acached_post(
+            _meiri_cache_spec(),
+            MEIRI_ENDPOINT,
+            {"api_key": config.YUAN_MENG_JU_API_KEY}
+        )
+        return _format_meiri_result(result)
+    except Exception as e:
+        print(f"每日占卜请求异常：{str(e)}")
+        return "每日占卜失败，网络异常，请稍后重试"
+
+
+@lru_cache(maxsize=1)
+def _jie_meng_keywords_chain():
+    """构建梦境关键词提取链（进程内只构建一次）"""
+    llm = get_chat_model(temperature=0)
+    
+    prompt = PromptTemplate.from_template(
+        """提取梦境关键词，只返回最多3个关键词（英文逗号分隔）：
+        例如："梦见,可爱的,婴儿"
+        用户输入：{query}
+        """
+    )
+    parser = StrOutputParser()
+    return prompt | llm | parser
+
+
+def _format_jie_meng_result(result):
+    """解析周公解梦接口返回"""
+    if result.status_code == 200:
+        print("============解梦返回数据===========")
+        print(result.json())
+        try:
+            json_data = result.json()
+            if json_data.get("errcode") == 0 and "data" in json_data:
+                return f"梦境解析结果：{json_data['data']}"
+            else:
+                return f"解梦失败：{json_data.get('msg', '未知错误')}"
+        except Exception as e:
+            print("解析返回数据时出错：", e)
+            return "解梦失败，数据解析错误，请重新描述梦境"
+    else:
+        print(f"请求失败，状态码：{result.status_code}")
+        return f"解梦失败，服务器返回状态码：{result.status_code}"
+
+
 @tool
 def jie_meng(query: str):
     """只有用户想要解梦的时候才会使用，需要输入梦境内容，缺少则不可用"""
     try:
-        url = "https://api.yuanfenju.com/index.php/v1/Gongju/zhougong"
-        
         # 提取梦境关键词
-        llm = ChatOpenAI(
-            model=config.OPENAI_MODEL,
-            temperature=0,
-            openai_api_key=config.OPENAI_API_KEY,
-            openai_api_base=config.OPENAI_API_BASE
-        )
-        
-        prompt = PromptTemplate.from_template(
-            """提取梦境关键词，只返回最多3个关键词（英文逗号分隔）：
-            例如："梦见,可爱的,婴儿"
-            用户输入：{query}
-            """
-        )
-        parser = StrOutputParser()
-        chain = prompt | llm | parser
-        keywords = chain.invoke({"query": query})
+        keywords = _jie_meng_keywords_chain().invoke({"query": query})
         print("梦境关键词：", keywords)
         
         # 调用解梦API
-        result = requests.post(
-            url, 
-            data={
+        result = _cached_post(
+            _jie_meng_cache_spec(keywords),
+            ZHOUGONG_ENDPOINT,
+            {
                 "api_key": config.YUAN_MENG_JU_API_KEY,
                 "title_zhougong": keywords
-            },
-            proxies=config.PROXIES
+            }
         )
-        
-        if result.status_code == 200:
-            print("============解梦返回数据===========")
-            print(result.json())
-            try:
-                json_data = result.json()
-                if json_data.get("errcode") == 0 and "data" in json_data:
-                    return f"梦境解析结果：{json_data['data']}"
-                else:
-                    return f"解梦失败：{json_data.get('msg', '未知错误')}"
-            except Exception as e:
-                print("解析返回数据时出错：", e)
-                return "解梦失败，数据解析错误，请重新描述梦境"
-        else:
-            print(f"请求失败，状态码：{result.status_code}")
-            return f"解梦失败，服务器返回状态码：{result.status_code}"
+        return _format_jie_meng_result(result)
+    except Exception as e:
+        print(f"解梦请求异常：{str(e)}")
+        return "解梦失败，网络异常，请稍后重试"
+
+
+async def _ajie_meng(query: str):
+    """jie_meng 的异步版本"""
+    try:
+        keywords = await _jie_meng_keywords_chain().ainvoke({"query": query})
+        print("梦境关键词：", keywords)
+
+        result = await _acached_post(
+            _jie_meng_cache_spec(keywords),
+            ZHOUGONG_ENDPOINT,
+            {
+                "api_key": config.YUAN_MENG_JU_API_KEY,
+                "title_zhougong": keywords
+            }
+        )
+        return _format_jie_meng_result(result)
     except Exception as e:
         print(f"解梦请求异常：{str(e)}")
         return "解梦失败，网络异常，请稍后重试"
-    
\ No newline at end of file
+
+
+# 挂载异步实现：Agent 走 ainvoke 时直接 await 这些协程，不再占用线程池
+bazi_cesuan.coroutine = _abazi_cesuan
+mei_ri_zhan_bu.coroutine = _amei_ri_zhan_bu
+jie_meng.coroutine = _ajie_meng
@@ -0,0 +1,341 @@
+import math
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+
+TIANGAN = "甲乙丙丁戊己庚辛壬癸"
+DIZHI = "子丑寅卯辰巳午未申酉戌亥"
+GANZHI = [TIANGAN[i % 10] + DIZHI[i % 12] for i in range(60)]
+_GANZHI_ARRAY = np.array(GANZHI)
+
+# 农历数据表（1900-2100）：低4位为闰月月份，第5位（0x10000）为闰月大小，
+# 0x8000~0x10 依次为正月至十二月的大小月（1为30天，0为29天）
+LUNAR_INFO = [
+    0x04bd8, 0x04ae0, 0x0a570, 0x054d5, 0x0d260, 0x0d950, 0x16554, 0x056a0, 0x09ad0, 0x055d2,  # 1900
+    0x04ae0, 0x0a5b6, 0x0a4d0, 0x0d250, 0x1d255, 0x0b540, 0x0d6a0, 0x0ada2, 0x095b0, 0x14977,  # 1910
+    0x04970, 0x0a4b0, 0x0b4b5, 0x06a50, 0x06d40, 0x1ab54, 0x02b60, 0x09570, 0x052f2, 0x04970,  # 1920
+    0x06566, 0x0d4a0, 0x0ea50, 0x16a95, 0x05ad0, 0x02b60, 0x186e3, 0x092e0, 0x1c8d7, 0x0c950,  # 1930
+    0x0d4a0, 0x1d8a6, 0x0b550, 0x056a0, 0x1a5b4, 0x025d0, 0x092d0, 0x0d2b2, 0x0a950, 0x0b557,  # 1940
+    0x06ca0, 0x0b550, 0x15355, 0x04da0, 0x0a5b0, 0x14573, 0x052b0, 0x0a9a8, 0x0e950, 0x06aa0,  # 1950
+    0x0aea6, 0x0ab50, 0x04b60, 0x0aae4, 0x0a570, 0x05260, 0x0f263, 0x0d950, 0x05b57, 0x056a0,  # 1960
+    0x096d0, 0x04dd5, 0x04ad0, 0x0a4d0, 0x0d4d4, 0x0d250, 0x0d558, 0x0b540, 0x0b6a0, 0x195a6,  # 1970
+    0x095b0, 0x049b0, 0x0a974, 0x0a4b0, 0x0b27a, 0x06a50, 0x06d40, 0x0af46, 0x0ab60, 0x09570,  # 1980
+    0x04af5, 0x04970, 0x064b0, 0x074a3, 0x0ea50, 0x06b58, 0x05ac0, 0x0ab60, 0x096d5, 0x092e0,  # 1990
+    0x0c960, 0x0d954, 0x0d4a0, 0x0da50, 0x07552, 0x056a0, 0x0abb7, 0x025d0, 0x092d0, 0x0cab5,  # 2000
+    0x0a950, 0x0b4a0, 0x0baa4, 0x0ad50, 0x055d9, 0x04ba0, 0x0a5b0, 0x15176, 0x052b0, 0x0a930,  # 2010
+    0x07954, 0x06aa0, 0x0ad50, 0x05b52, 0x04b60, 0x0a6e6, 0x0a4e0, 0x0d260, 0x0ea65, 0x0d530,  # 2020
+    0x05aa0, 0x076a3, 0x096d0, 0x04afb, 0x04ad0, 0x0a4d0, 0x1d0b6, 0x0d250, 0x0d520, 0x0dd45,  # 2030
+    0x0b5a0, 0x056d0, 0x055b2, 0x049b0, 0x0a577, 0x0a4b0, 0x0aa50, 0x1b255, 0x06d20, 0x0ada0,  # 2040
+    0x14b63, 0x09370, 0x049f8, 0x04970, 0x064b0, 0x168a6, 0x0ea50, 0x06b20, 0x1a6c4, 0x0aae0,  # 2050
+    0x0a2e0, 0x0d2e3, 0x0c960, 0x0d557, 0x0d4a0, 0x0da50, 0x05d55, 0x056a0, 0x0a6d0, 0x055d4,  # 2060
+    0x052d0, 0x0a9b8, 0x0a950, 0x0b4a0, 0x0b6a6, 0x0ad50, 0x055a0, 0x0aba4, 0x0a5b0, 0x052b0,  # 2070
+    0x0b273, 0x06930, 0x07337, 0x06aa0, 0x0ad50, 0x14b55, 0x04b60, 0x0a570, 0x054e4, 0x0d160,  # 2080
+    0x0e968, 0x0d520, 0x0daa0, 0x16aa6, 0x056d0, 0x04ae0, 0x0a9d4, 0x0a2d0, 0x0d150, 0x0f252,  # 2090
+    0x0d520,  # 2100
+]
+LUNAR_MIN_YEAR, LUNAR_MAX_YEAR = 1900, 1900 + len(LUNAR_INFO) - 1
+LUNAR_EPOCH = date(1900, 1, 31)  # 农历1900年正月初一
+
+# 十二"节"（决定月柱）：(名称, 太阳黄经, 对应月支序号)，按公历年内先后排列
+JIE_TERMS = [
+    ("小寒", 285, 1), ("立春", 315, 2), ("惊蛰", 345, 3), ("清明", 15, 4),
+    ("立夏", 45, 5), ("芒种", 75, 6), ("小暑", 105, 7), ("立秋", 135, 8),
+    ("白露", 165, 9), ("寒露", 195, 10), ("立冬", 225, 11), ("大雪", 255, 0),
+]
+# 各节的大致公历日期（作为迭代求解的初值）
+_JIE_GUESS = [(1, 6), (2, 4), (3, 6), (4, 5), (5, 6), (6, 6), (7, 7), (8, 8), (9, 8), (10, 8), (11, 7), (12, 7)]
+
+BEIJING_OFFSET = timedelta(hours=8)
+_J2000 = 2451545.0
+_UNIX_EPOCH_JD = 2440587.5
+
+# 地球日心黄经 VSOP87D 截断级数（Meeus《天文算法》附录三），每项为 (A, B, C)：A·cos(B + C·τ)，
+# 依次为 L0~L5，单位 1e-8 弧度；太阳黄经精度约1角秒（对应交节时刻误差在半分钟以内）
+_VSOP87_EARTH_L = (
+    np.array([
+        (175347046, 0, 0), (3341656, 4.6692568, 6283.07585), (34894, 4.6261, 12566.1517),
+        (3497, 2.7441, 5753.3849), (3418, 2.8289, 3.5231), (3136, 3.6277, 77713.7715),
+        (2676, 4.4181, 7860.4194), (2343, 6.1352, 3930.2097), (1324, 0.7425, 11506.7698),
+        (1273, 2.0371, 529.691), (1199, 1.1096, 1577.3435), (990, 5.233, 5884.927), (902, 2.045, 26.298),
+        (857, 3.508, 398.149), (780, 1.179, 5223.694), (753, 2.533, 5507.553), (505, 4.583, 18849.228),
+        (492, 4.205, 775.523), (357, 2.92, 0.067), (317, 5.849, 11790.629), (284, 1.899, 796.298),
+        (271, 0.315, 10977.079), (243, 0.345, 5486.778), (206, 4.806, 2544.314), (205, 1.869, 5573.143),
+        (202, 2.458, 6069.777), (156, 0.833, 213.299), (132, 3.411, 2942.463), (126, 1.083, 20.775),
+        (115, 0.645, 0.98), (103, 0.636, 4694.003), (102, 0.976, 15720.839), (102, 4.267, 7.114),
+        (99, 6.21, 2146.17), (98, 0.68, 155.42), (86, 5.98, 161000.69), (85, 1.3, 6275.96), (85, 3.67, 71430.7),
+        (80, 1.81, 17260.15), (79, 3.04, 12036.46), (75, 1.76, 5088.63), (74, 3.5, 3154.69), (74, 4.68, 801.82),
+        (70, 0.83, 9437.76), (62, 3.98, 8827.39), (61, 1.82, 7084.9), (57, 2.78, 6286.6), (56, 4.39, 14143.5),
+        (56, 3.47, 6279.55), (52, 0.19, 12139.55), (52, 1.33, 1748.02), (51, 0.28, 5856.48),
+        (49, 0.49, 1194.45), (41, 5.37, 8429.24), (41, 2.4, 19651.05), (39, 6.17, 10447.39),
+        (37, 6.04, 10213.29), (37, 2.57, 1059.38), (36, 1.71, 2352.87), (36, 1.78, 6812.77),
+        (33, 0.59, 17789.85), (30, 0.44, 83996.85), (30, 2.74, 1349.87), (25, 3.16, 4690.48),
+    ]),
+    np.array([
+        (628331966747, 0, 0), (206059, 2.678235, 6283.07585), (4303, 2.6351, 12566.1517), (425, 1.59, 3.523),
+        (119, 5.796, 26.298), (109, 2.966, 1577.344), (93, 2.59, 18849.23), (72, 1.14, 529.69),
+        (68, 1.87, 398.15), (67, 4.41, 5507.55), (59, 2.89, 5223.69), (56, 2.17, 155.42), (45, 0.4, 796.3),
+        (36, 0.47, 775.52), (29, 2.65, 7.11), (21, 5.34, 0.98), (19, 1.85, 5486.78), (19, 4.97, 213.3),
+        (17, 2.99, 6275.96), (16, 0.03, 2544.31), (16, 1.43, 2146.17), (15, 1.21, 10977.08),
+        (12, 2.83, 1748.02), (12, 3.26, 5088.63), (12, 5.27, 1194.45), (12, 2.08, 4694.0), (11, 0.77, 553.57),
+        (10, 1.3, 6286.6), (10, 4.24, 1349.87), (9, 2.7, 242.73), (9, 5.64, 951.72), (8, 5.3, 2352.87),
+        (6, 2.65, 9437.76), (6, 4.67, 4690.48),
+    ]),
+    np.array([
+        (52919, 0, 0), (8720, 1.0721, 6283.0758), (309, 0.867, 12566.152), (27, 0.05, 3.52), (16, 5.19, 26.3),
+        (16, 3.68, 155.42), (10, 0.76, 18849.23), (9, 2.06, 77713.77), (7, 0.83, 775.52), (5, 4.66, 1577.34),
+        (4, 1.03, 7.11), (4, 3.44, 5573.14), (3, 5.14, 796.3), (3, 6.05, 5507.55), (3, 1.19, 242.73),
+        (3, 6.12, 529.69), (3, 0.31, 398.15), (3, 2.28, 553.57), (2, 4.38, 5223.69), (2, 3.75, 0.98),
+    ]),
+    np.array([
+        (289, 5.844, 6283.076), (35, 0, 0), (17, 5.49, 12566.15), (3, 5.2, 155.42), (1, 4.72, 3.52),
+        (1, 5.3, 18849.23), (1, 5.97, 242.73),
+    ]),
+    np.array([
+        (114, 3.142, 0), (8, 4.13, 6283.08), (1, 3.84, 12566.15),
+    ]),
+    np.array([
+        (1, 3.14, 0),
+    ]),
+)
+
+
+# ---------------------------- 农历 → 公历 ----------------------------
+
+def _lunar_info(year: int) -> int:
+    if not LUNAR_MIN_YEAR <= year <= LUNAR_MAX_YEAR:
+        raise ValueError(f"农历年份超出支持范围（{LUNAR_MIN_YEAR}-{LUNAR_MAX_YEAR}）：{year}")
+    return LUNAR_INFO[year - LUNAR_MIN_YEAR]
+
+
+def leap_month_of(year: int) -> int:
+    """农历某年的闰月月份（无闰月返回0）"""
+    return _lunar_info(year) & 0xf
+
+
+def _leap_days(year: int) -> int:
+    if not leap_month_of(year):
+        return 0
+    return 30 if _lunar_info(year) & 0x10000 else 29
+
+
+def lunar_month_days(year: int, month: int) -> int:
+    """农历某年某月（非闰月）的天数"""
+    return 30 if _lunar_info(year) & (0x10000 >> month) else 29
+
+
+def lunar_year_days(year: int) -> int:
+    """农历某年的总天数"""
+    info = _lunar_info(year)
+    return 348 + sum(1 for bit in range(4, 16) if info & (1 << bit)) + _leap_days(year)
+
+
+def lunar_to_solar(year: int, month: int, day: int, leap: bool = False) -> date:
+    """农历日期转公历日期（leap=True 表示闰月）"""
+    if not 1 <= month <= 12:
+        raise ValueError(f"农历月份无效：{month}")
+    if leap and leap_month_of(year) != month:
+        raise ValueError(f"农历{year}年没有闰{month}月")
+    month_days = _leap_days(year) if leap else lunar_month_days(year, month)
+    if not 1 <= day <= month_days:
+        raise ValueError(f"农历{year}年{'闰' if leap else ''}{month}月只有{month_days}天")
+
+    offset = sum(lunar_year_days(y) for y in range(LUNAR_MIN_YEAR, year))
+    leap_month = leap_month_of(year)
+    for m in range(1, month):
+        offset += lunar_month_days(year, m)
+        if m == leap_month:
+            offset += _leap_days(year)
+    if leap:
+        offset += lunar_month_days(year, month)
+    return LUNAR_EPOCH + timedelta(days=offset + day - 1)
+
+
+def lunar_next_day(year: int, month: int, day: int, leap: bool = False):
+    """农历日期的次日，返回 (年, 月, 日, 是否闰月)"""
+    month_days = _leap_days(year) if leap else lunar_month_days(year, month)
+    if day < month_days:
+        return year, month, day + 1, leap
+    if not leap and leap_month_of(year) == month:
+        return year, month, 1, True
+    return (year + 1, 1, 1, False) if month == 12 else (year, month + 1, 1, False)
+
+
+# ---------------------------- 节气 ----------------------------
+
+def _delta_t_days(year: float) -> float:
+    """力学时与世界时之差 ΔT（Espenak–Meeus 分段多项式，1900-2100 年误差在数秒以内；单位：天）"""
+    if year < 1900:
+        t = year - 1860
+        seconds = (7.62 + 0.5737 * t - 0.251754 * t ** 2 + 0.01680668 * t ** 3
+                   - 0.0004473624 * t ** 4 + t ** 5 / 233174)
+    elif year < 1920:
+        t = year - 1900
+        seconds = -2.79 + 1.494119 * t - 0.0598939 * t ** 2 + 0.0061966 * t ** 3 - 0.000197 * t ** 4
+    elif year < 1941:
+        t = year - 1920
+        seconds = 21.20 + 0.84493 * t - 0.0761 * t ** 2 + 0.0020936 * t ** 3
+    elif year < 1961:
+        t = year - 1950
+        seconds = 29.07 + 0.407 * t - t ** 2 / 233 + t ** 3 / 2547
+    elif year < 1986:
+        t = year - 1975
+        seconds = 45.45 + 1.067 * t - t ** 2 / 260 - t ** 3 / 718
+    elif year < 2005:
+        t = year - 2000
+        seconds = (63.86 + 0.3345 * t - 0.060374 * t ** 2 + 0.0017275 * t ** 3
+                   + 0.000651814 * t ** 4 + 0.00002373599 * t ** 5)
+    elif year < 2050:
+        t = year - 2000
+        seconds = 62.92 + 0.32217 * t + 0.005589 * t ** 2
+    else:
+        u = (year - 1820) / 100
+        seconds = -20 + 32 * u * u - 0.5628 * max(2150 - year, 0)
+    return seconds / 86400
+
+
+def _sun_apparent_longitude(jde: float) -> float:
+    """太阳视黄经（VSOP87 截断级数 + FK5 修正 + 章动 + 光行差，精度约1角秒）"""
+    tau = (jde - _J2000) / 365250
+    t = tau * 10
+    earth = sum((terms[:, 0] * np.cos(terms[:, 1] + terms[:, 2] * tau)).sum() * tau ** i
+                for i, terms in enumerate(_VSOP87_EARTH_L)) / 1e8
+    omega = math.radians(125.04452 - 1934.136261 * t)
+    sun_mean = math.radians(280.4665 + 36000.7698 * t)
+    moon_mean = math.radians(218.3165 + 481267.8813 * t)
+    anomaly = math.radians(357.52911 + 35999.05029 * t)
+    # 黄经章动（角秒，低精度公式误差约0.5角秒）与日地距离（天文单位，用于光行差）
+    nutation = (-17.20 * math.sin(omega) - 1.32 * math.sin(2 * sun_mean)
+                - 0.23 * math.sin(2 * moon_mean) + 0.21 * math.sin(2 * omega))
+    distance = 1.00014 - 0.01671 * math.cos(anomaly) - 0.00014 * math.cos(2 * anomaly)
+    correction = -0.09033 + nutation - 20.4898 / distance
+    return (math.degrees(earth) + 180 + correction / 3600) % 360
+
+
+def _jd_to_beijing(jd_ut: float) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(days=jd_ut - _UNIX_EPOCH_JD) + BEIJING_OFFSET
+
+
+def _beijing_to_jd(dt: datetime) -> float:
+    return (dt - BEIJING_OFFSET - datetime(1970, 1, 1)) / timedelta(days=1) + _UNIX_EPOCH_JD
+
+
+@lru_cache(maxsize=512)
+def jie_times(year: int):
+    """某公历年内十二节的交节时刻（北京时间，精确到分钟），按时间先后排列"""
+    result = []
+    for (name, longitude, branch), (month, day) in zip(JIE_TERMS, _JIE_GUESS):
+        jd = _beijing_to_jd(datetime(year, month, day, 12))
+        for _ in range(10):
+            jde = jd + _delta_t_days(year + (month - 0.5) / 12)
+            diff = (longitude - _sun_apparent_longitude(jde) + 180) % 360 - 180
+            jd += diff * 365.2422 / 360
+            if abs(diff) < 1e-9:
+                break
+        moment = _jd_to_beijing(jd)
+        result.append((name, (moment + timedelta(seconds=30)).replace(second=0, microsecond=0), branch))
+    return tuple(result)
+
+
+@lru_cache(maxsize=64)
+def _jie_table(start_year: int, end_year: int):
+    """连续年份的交节表：(交节时刻列表, 月支序号列表, 所属八字年列表)"""
+    moments, branches, bazi_years = [], [], []
+    for year in range(start_year, end_year + 1):
+        for name, moment, branch in jie_times(year):
+            moments.append(moment)
+            branches.append(branch)
+            # 小寒到立春之间（丑月）仍属于上一个八字年
+            bazi_years.append(year - 1 if name == "小寒" else year)
+    return moments, branches, bazi_years
+
+
+# ---------------------------- 四柱 ----------------------------
+
+def _month_stem(year_stem, month_branch):
+    """五虎遁：由年干和月支推月干（寅月起）"""
+    return (year_stem * 2 + 2 + (month_branch - 2) % 12) % 10
+
+
+def _ganzhi_index(stem, branch):
+    """由天干、地支序号求六十甲子序号"""
+    return (6 * stem - 5 * branch) % 60
+
+
+def _hour_pillar(day_stem, hour):
+    """五鼠遁：由日干和时辰推时柱序号"""
+    branch = ((hour + 1) // 2) % 12
+    return _ganzhi_index((day_stem * 2 + branch) % 10, branch)
+
+
+def _day_index(day: date) -> int:
+    """日柱序号（以儒略日计算，2000-01-07 为甲子日）"""
+    return (day.toordinal() + 1721425 + 49) % 60
+
+
+def bazi_pillars(birth: datetime) -> dict:
+    """计算出生时刻（北京时间）的四柱八字
+
+    年柱以立春交节时刻为界，月柱以十二节交节时刻为界，23点后的子时按次日起日柱。
+    """
+    moments, branches, bazi_years = _jie_table(birth.year - 1, birth.year)
+    idx = bisect_right(moments, birth) - 1
+    bazi_year = bazi_years[idx]
+    month_branch = branches[idx]
+
+    year_index = (bazi_year - 4) % 60
+    month_index = _ganzhi_index(_month_stem(year_index % 10, month_branch), month_branch)
+
+    day = birth.date() + timedelta(days=1 if birth.hour >= 23 else 0)
+    day_index = _day_index(day)
+    hour_index = _hour_pillar(day_index % 10, birth.hour)
+
+    return {
+        "year": GANZHI[year_index],
+        "month": GANZHI[month_index],
+        "day": GANZHI[day_index],
+        "hour": GANZHI[hour_index],
+    }
+
+
+def bazi_from_params(year: int, month: int, day: int, hours: int = 0, minute: int = 0,
+                     lunar: bool = False, leap_month: bool = False) -> dict:
+    """按排盘参数计算四柱（lunar=True 时先把农历日期转换为公历）"""
+    if lunar:
+        solar = lunar_to_solar(year, month, day, leap_month)
+        year, month, day = solar.year, solar.month, solar.day
+    return bazi_pillars(datetime(year, month, day, hours, minute))
+
+
+def format_bazi(pillars: dict) -> str:
+    """四柱格式化为"甲子 丙寅 戊午 庚申"形式"""
+    return " ".join(pillars[k] for k in ("year", "month", "day", "hour"))
+
+
+def bazi_batch(births) -> dict:
+    """批量计算四柱：输入出生时刻序列（datetime 或 numpy datetime64），
+    返回 {"year"/"month"/"day"/"hour": 干支字符串数组}，全部为向量化计算
+    """
+    births = np.asarray(births, dtype="datetime64[m]")
+    years = births.astype("datetime64[Y]").astype(np.int64) + 1970
+
+    moments, branches, bazi_years = _jie_table(int(years.min()) - 1, int(years.max()))
+    idx = np.searchsorted(np.array(moments, dtype="datetime64[m]"), births, side="right") - 1
+    year_index = (np.asarray(bazi_years)[idx] - 4) % 60
+    month_branch = np.asarray(branches)[idx]
+    month_index = _ganzhi_index(_month_stem(year_index % 10, month_branch), month_branch)
+
+    days = births.astype("datetime64[D]")
+    hours = (births - days).astype(np.int64) // 60
+    # 1970-01-01 的儒略日数为 2440588
+    day_index = (days.astype(np.int64) + 2440588 + 49 + (hours >= 23)) % 60
+    hour_index = _hour_pillar(day_index % 10, hours)
+
+    return {
+        "year": _GANZHI_ARRAY[year_index],
+        "month": _GANZHI_ARRAY[month_index],
+        "day": _GANZHI_ARRAY[day_index],
+        "hour": _GANZHI_ARRAY[hour_index],
+    }
@@ -0,0 +1,182 @@
+import re
+import unicodedata
+from datetime import date, timedelta
+
+from .bazi_engine import lunar_next_day, lunar_to_solar
+
+
+# 排盘必需参数（缺少任意一项时才回退到大模型提取）：本地排盘只需要出生日期（时间默认0点），
+# 姓名、性别只有远程排盘接口需要，缺少时由调用方补默认值
+REQUIRED_FIELDS = ("year", "month", "day")
+
+CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+             "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CN_MONTHS = {"正": 1, "冬": 11, "腊": 12}
+
+# 时辰（取每个时辰的中间整点：子时0点、丑时2点……亥时22点）
+SHICHEN = "子丑寅卯辰巳午未申酉戌亥"
+
+_NUM = r"\d{1,2}|[零〇一二两三四五六七八九十]{1,3}"
+_NAME_STOP = r"(?=[，,。.；;、\s]|$|男|女|性别|出生|生于|生日|\d|公历|农历|阳历|阴历|新历|旧历)"
+
+NAME_RE = re.compile(
+    r"(?:我叫|我的名字是|名字是|名字叫|姓名是?[:：]?|叫做|本人)\s*([一-龥·]{2,5}?)" + _NAME_STOP
+)
+SEX_FIELD_RE = re.compile(r"性别\s*[:：是为]?\s*(男|女)")
+MALE_RE = re.compile(r"男(?!朋友|友|方)|先生|儿子|男孩|男生")
+FEMALE_RE = re.compile(r"女(?!朋友|友|方)|女士|小姐|女儿|女孩|女生")
+LUNAR_RE = re.compile(r"农历|阴历|旧历")
+SOLAR_RE = re.compile(r"公历|阳历|新历")
+
+ISO_DATE_RE = re.compile(
+    r"(\d{4})\s*[-/.]\s*(\d{1,2})\s*[-/.]\s*(\d{1,2})(?:\s*[T\s]\s*(\d{1,2})[:：](\d{2}))?"
+)
+CN_DATE_RE = re.compile(
+    r"(\d{4}|[零〇一二三四五六七八九]{4})\s*年\s*(闰)?\s*(\d{1,2}|[正冬腊]|十[一二]?|[一二三四五六七八九十])\s*月"
+    r"\s*(\d{1,2}|初[一二三四五六七八九十]|[廿卅][一二三四五六七八九]?|[二三]?十[一二三四五六七八九]?|[一二三四五六七八九])\s*[日号]?"
+)
+TIME_RE = re.compile(
+    r"(凌晨|早上|早晨|清晨|上午|中午|下午|傍晚|晚上|夜里|夜间|半夜)?\s*(" + _NUM + r")\s*(?:点|时(?!辰)|[:：])"
+    r"\s*(半|\d{1,2}|[零一二三四五六七八九十]{1,3})?\s*(分)?"
+)
+SHICHEN_RE = re.compile(r"([子丑寅卯辰巳午未申酉戌亥])\s*时")
+
+
+def cn_to_int(text: str) -> int:
+    """中文数字转整数（支持"一九九五"、"十二"、"廿三"、"初八"等写法）"""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    text = text.replace("初", "").replace("廿", "二十").replace("卅", "三十")
+    if text in CN_MONTHS:
+        return CN_MONTHS[text]
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (CN_DIGITS.get(ones, 0) if ones else 0)
+    value = 0
+    for ch in text:
+        value = value * 10 + CN_DIGITS[ch]
+    return value
+
+
+def _extract_time(text: str):
+    """提取出生时间，返回 (小时, 分钟, 是否已过零点到次日) 或 None"""
+    for match in TIME_RE.finditer(text):
+        period, hour_text, minute_text, fen = match.groups()
+        # 没有时段词、分钟的中文数字+"点"多是口语（如"详细一点""快一点"），不当作时间
+        if not (period or hour_text.isdigit() or minute_text == "半" or (minute_text and fen)):
+            continue
+        hour = cn_to_int(hour_text)
+        minute = 30 if minute_text == "半" else (cn_to_int(minute_text) if minute_text else 0)
+        next_day = False
+        if period in ("晚上", "夜里", "夜间", "半夜") and hour == 12:
+            # “晚上12点”是当天结束的午夜，即次日0点
+            hour, next_day = 0, True
+        elif period in ("下午", "傍晚", "晚上", "夜里", "夜间") and hour < 12:
+            hour += 12
+        elif period == "中午" and hour < 11:
+            hour += 12
+        elif period == "凌晨" and hour == 12:
+            hour = 0
+        if hour == 24:
+            hour, next_day = 0, True
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return hour, minute, next_day
+        break
+    match = SHICHEN_RE.search(text)
+    if match:
+        return SHICHEN.index(match.group(1)) * 2, 0, False
+    return None
+
+
+def _valid_date(params: dict) -> bool:
+    """公历用 datetime.date 校验，农历按农历数据表校验（如1990年2月30日无效）"""
+    try:
+        if params["type"] == 0:
+            lunar_to_solar(params["year"], params["month"], params["day"], params.get("leap_month", False))
+        else:
+            date(params["year"], params["month"], params["day"])
+        return True
+    except ValueError:
+        return False
+
+
+def _roll_to_next_day(params: dict):
+    """出生时间过了午夜时日期顺延一天（与排盘引擎一致：日柱按公历次日起）"""
+    if params["type"] == 0:
+        year, month, day, leap = lunar_next_day(params["year"], params["month"], params["day"],
+                                                params.get("leap_month", False))
+        params.update(year=year, month=month, day=day)
+        if leap:
+            params["leap_month"] = True
+        else:
+            params.pop("leap_month", None)
+    else:
+        next_day = date(params["year"], params["month"], params["day"]) + timedelta(days=1)
+        params.update(year=next_day.year, month=next_day.month, day=next_day.day)
+
+
+def extract_bazi_params(text: str):
+    """规则提取八字排盘参数
+
+    返回 (参数字典, 缺失的必需字段列表)。参数字段与缘份居排盘接口一致：
+    name、sex(0男1女)、type(0农历1公历)、year、month、day、hours、minute；
+    农历闰月时额外带 leap_month=True。
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    params = {"type": 1, "hours": 0, "minute": 0}
+
+    match = NAME_RE.search(text)
+    if match:
+        params["name"] = match.group(1)
+
+    match = SEX_FIELD_RE.search(text)
+    if match:
+        params["sex"] = 0 if match.group(1) == "男" else 1
+    else:
+        # 姓名中的字不参与性别判断
+        rest = text.replace(params.get("name", ""), "") if params.get("name") else text
+        male, female = MALE_RE.search(rest), FEMALE_RE.search(rest)
+        if male and not female:
+            params["sex"] = 0
+        elif female and not male:
+            params["sex"] = 1
+
+    if LUNAR_RE.search(text):
+        params["type"] = 0
+    elif SOLAR_RE.search(text):
+        params["type"] = 1
+
+    date_text = text
+    match = ISO_DATE_RE.search(text)
+    if match:
+        year, month, day, hour, minute = match.groups()
+        params.update(year=int(year), month=int(month), day=int(day))
+        if hour is not None:
+            params.update(hours=int(hour), minute=int(minute))
+        date_text = text[match.end():]
+    else:
+        match = CN_DATE_RE.search(text)
+        if match:
+            year, leap, month, day = match.groups()
+            params.update(year=cn_to_int(year), month=cn_to_int(month), day=cn_to_int(day))
+            if leap:
+                params["type"] = 0
+                params["leap_month"] = True
+            date_text = text[match.end():]
+
+    # 不存在的日期（如2月30日）视为缺失，交给大模型或追问用户
+    if "year" in params and not _valid_date(params):
+        for key in ("year", "month", "day", "leap_month"):
+            params.pop(key, None)
+
+    # 出生时间只在日期之后查找，避免把"1995年"之类误判为时间
+    if "year" in params and (params["hours"], params["minute"]) == (0, 0):
+        found = _extract_time(date_text)
+        if found:
+            params["hours"], params["minute"], next_day = found
+            if next_day:
+                _roll_to_next_day(params)
+
+    missing = [field for field in REQUIRED_FIELDS if field not in params]
+    return params, missing
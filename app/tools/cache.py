@@ -0,0 +1,168 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import redis
+from redis import asyncio as aioredis
+
+from ..config import config
+from ..session_store import get_connection_pools
+
+
+def normalize_key_part(value) -> str:
+    """归一化缓存键片段（全角转半角、去空白、小写）"""
+    text = unicodedata.normalize("NFKC", str(value if value is not None else ""))
+    return "".join(text.split()).lower()
+
+
+def make_cache_key(namespace: str, parts) -> str:
+    """由命名空间和参数生成稳定的缓存键"""
+    raw = "|".join(normalize_key_part(p) for p in parts)
+    return f"{namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+class LRUTTLCache:
+    """进程内 LRU 缓存（每个条目单独设置过期时间，线程安全）"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value, ttl: float = None):
+        self.set(key, value, ttl)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Redis 缓存后端（值以JSON存储，与会话存储共用连接池）"""
+
+    def __init__(self, url: str = None, prefix: str = "tool_cache:"):
+        url = url or config.REDIS_URL
+        self.prefix = prefix
+        pool, async_pool = get_connection_pools(url)
+        self.client = redis.Redis(connection_pool=pool)
+        self.async_client = aioredis.Redis(connection_pool=async_pool)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl: float = None):
+        self.client.set(self.prefix + key, json.dumps(value, ensure_ascii=False),
+                        ex=int(ttl) if ttl else None)
+
+    async def aget(self, key):
+        raw = await self.async_client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def aset(self, key, value, ttl: float = None):
+        await self.async_client.set(self.prefix + key, json.dumps(value, ensure_ascii=False),
+                                    ex=int(ttl) if ttl else None)
+
+
+class ToolCache:
+    """工具结果缓存：可插拔后端 + 按命名空间统计命中/未命中次数
+
+    后端异常时视为未命中，不影响工具本身的调用。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _record(self, namespace: str, hit: bool):
+        with self._lock:
+            counter = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+            counter["hits" if hit else "misses"] += 1
+
+    def get(self, namespace: str, parts):
+        try:
+            value = self.backend.get(make_cache_key(namespace, parts))
+        except Exception as e:
+            print(f"⚠️ 工具缓存读取失败：{str(e)}")
+            value = None
+        self._record(namespace, value is not None)
+        return value
+
+    def set(self, namespace: str, parts, value, ttl: float = None):
+        try:
+            self.backend.set(make_cache_key(namespace, parts), value, ttl)
+        except Exception as e:
+            print(f"⚠️ 工具缓存写入失败：{str(e)}")
+
+    async def aget(self, namespace: str, parts):
+        try:
+            value = await self.backend.aget(make_cache_key(namespace, parts))
+        except Exception as e:
+            print(f"⚠️ 工具缓存读取失败：{str(e)}")
+            value = None
+        self._record(namespace, value is not None)
+        return value
+
+    async def aset(self, namespace: str, parts, value, ttl: float = None):
+        try:
+            await self.backend.aset(make_cache_key(namespace, parts), value, ttl)
+        except Exception as e:
+            print(f"⚠️ 工具缓存写入失败：{str(e)}")
+
+    def stats(self) -> dict:
+        """返回各命名空间的命中/未命中次数与命中率"""
+        with self._lock:
+            result = {}
+            for namespace, counter in self._stats.items():
+                total = counter["hits"] + counter["misses"]
+                result[namespace] = dict(counter, hit_rate=round(counter["hits"] / total, 4) if total else 0.0)
+            return result
+
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolCache:
+    """获取进程内共享的工具缓存（按 config.TOOL_CACHE_BACKEND 选择后端）"""
+    global _tool_cache
+    if _tool_cache is None:
+        with _tool_cache_lock:
+            if _tool_cache is None:
+                backend = LRUTTLCache(maxsize=config.TOOL_CACHE_MAXSIZE)
+                if config.TOOL_CACHE_BACKEND == "redis":
+                    try:
+                        backend = RedisCache()
+                        backend.client.ping()
+                        print("✅ 工具缓存使用Redis后端")
+                    except Exception as e:
+                        print(f"⚠️ Redis缓存不可用：{str(e)}，已切换为进程内缓存")
+                        backend = LRUTTLCache(maxsize=config.TOOL_CACHE_MAXSIZE)
+                _tool_cache = ToolCache(backend)
+    return _tool_cache
@@ -0,0 +1,132 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import config
+
+
+# 需要重试的上游状态码（限流/网关/服务暂不可用）
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class YuanfenjuClient:
+    """缘份居API共享客户端：连接池复用（keep-alive）、按接口超时、有限次数的抖动退避重试
+
+    同步调用走 requests.Session，异步调用走 httpx.AsyncClient，两者都是进程内共享的长连接池。
+    """
+
+    def __init__(self, base_url: str = None, pool_size: int = None, max_retries: int = None,
+                 backoff: float = None, timeouts: dict = None, default_timeout: float = None,
+                 proxies: dict = None):
+        self.base_url = (base_url or config.YUANFENJU_BASE_URL).rstrip("/")
+        self.pool_size = pool_size or config.YUANFENJU_POOL_SIZE
+        self.max_retries = config.YUANFENJU_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = config.YUANFENJU_BACKOFF if backoff is None else backoff
+        self.timeouts = dict(config.YUANFENJU_TIMEOUTS if timeouts is None else timeouts)
+        self.default_timeout = default_timeout or config.YUANFENJU_TIMEOUT
+        self.proxies = config.PROXIES if proxies is None else proxies
+
+        # 同步连接池（重试由本类统一处理，适配器本身不重试）
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # requests 的代理键为 "http"/"https"，配置中为 httpx 风格的 "http://"/"https://"
+        self.session.proxies.update({k.rstrip(":/"): v for k, v in self.proxies.items()})
+
+        # 异步连接池与事件循环绑定，首次异步调用时创建
+        self._async_client = None
+        self._async_loop = None
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+    def _timeout(self, endpoint: str) -> float:
+        return self.timeouts.get(endpoint.strip("/"), self.default_timeout)
+
+    def _retry_delay(self, attempt: int) -> float:
+        """指数退避 + 随机抖动，避免大量请求同时重试"""
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def post(self, endpoint: str, data: dict):
+        """同步POST（返回 requests.Response；重试耗尽后返回最后一次响应或抛出最后一次异常）"""
+        url, timeout = self._url(endpoint), self._timeout(endpoint)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, data=data, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return response
+                print(f"⚠️ 缘份居接口[{endpoint}]返回{response.status_code}，第{attempt + 1}次重试")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"⚠️ 缘份居接口[{endpoint}]请求异常：{str(e)}，第{attempt + 1}次重试")
+            time.sleep(self._retry_delay(attempt))
+
+    async def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            if self._async_client is not None:
+                await self._close_stale_client(self._async_client, self._async_loop)
+            self._async_client = httpx.AsyncClient(
+                proxies=self.proxies or None,
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+                timeout=self.default_timeout
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    @staticmethod
+    async def _close_stale_client(client: httpx.AsyncClient, loop):
+        """关闭绑定在旧事件循环上的连接池：旧循环仍在运行时交回该循环关闭，否则在当前循环中关闭"""
+        try:
+            if loop is not None and loop.is_running() and not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                await client.aclose()
+        except Exception as e:
+            print(f"⚠️ 关闭旧的缘份居异步连接池失败：{str(e)}")
+
+    async def apost(self, endpoint: str, data: dict):
+        """异步POST（返回 httpx.Response，重试策略与同步版本一致）"""
+        client = await self._get_async_client()
+        url, timeout = self._url(endpoint), self._timeout(endpoint)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.post(url, data=data, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    return response
+                print(f"⚠️ 缘份居接口[{endpoint}]返回{response.status_code}，第{attempt + 1}次重试")
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"⚠️ 缘份居接口[{endpoint}]请求异常：{str(e)}，第{attempt + 1}次重试")
+            await asyncio.sleep(self._retry_delay(attempt))
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_yuanfenju_client() -> YuanfenjuClient:
+    """获取进程内共享的缘份居客户端"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = YuanfenjuClient()
+    return _client
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import httpx
+
+from .config import config
+from .tts_cache import get_tts_cache, tts_cache_key
+
+
+# 按中文句末标点切分（标点保留在句尾）
+SENTENCE_RE = re.compile(r"[^。！？；!?;\n]+[。！？；!?;\n]*")
+
+
+def split_sentences(text: str, min_chars: int = None):
+    """把回答切成句子；过短的句子并入下一句，减少上游调用次数"""
+    min_chars = config.TTS_CHUNK_MIN_CHARS if min_chars is None else min_chars
+    chunks, pending = [], ""
+    for sentence in SENTENCE_RE.findall(text or ""):
+        pending += sentence.strip()
+        if len(pending) >= min_chars:
+            chunks.append(pending)
+            pending = ""
+    if pending:
+        if chunks and len(pending) < min_chars:
+            chunks[-1] += pending
+        else:
+            chunks.append(pending)
+    return chunks
+
+
+def write_json_atomic(path: str, data: dict):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class TokenBucket:
+    """令牌桶限流：每秒补充 rate 个令牌，最多积累 capacity 个（rate<=0 时不限流）
+
+    只在单个事件循环内使用，检查与扣减之间没有 await，无需加锁。
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = max(capacity or rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def build_ssml(text: str, style: str, voice: str = None) -> str:
+    """生成带语气风格的SSML（正文做XML转义）"""
+    escaped = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis"
+          xmlns:mstts="http://www.w3.org/2001/mstts" xml:lang="zh-CN">
+    <voice name="{voice or config.TTS_VOICE}">
+        <mstts:express-as style="{style}" role="YoungFemale">
+            {escaped}
+        </mstts:express-as>
+    </voice>
+</speak>"""
+
+
+class TTSService:
+    """Azure 语音合成服务
+
+    在应用事件循环上常驻一个带连接池的 httpx.AsyncClient（安装了 h2 时启用 HTTP/2），
+    地区、代理、超时均来自配置；连通性由后台定期健康检查维护，合成请求不再每次探测，
+    一次合成只需在已建立的连接上发一个请求。上游调用经令牌桶限流（与 Azure 定价层的速率匹配），
+    缓存命中不占用配额。
+    """
+
+    def __init__(self, api_url: str = None, health_url: str = None, key: str = None,
+                 proxies: dict = None, timeout: float = None, pool_size: int = None,
+                 health_interval: float = None, cache=None, rate_limit: float = None,
+                 rate_burst: float = None):
+        self.api_url = api_url or config.TTS_API_URL
+        self.health_url = health_url or config.TTS_HEALTH_URL
+        self.key = config.AZURE_TTS_KEY if key is None else key
+        self.proxies = config.PROXIES if proxies is None else proxies
+        self.timeout = timeout or config.TTS_TIMEOUT
+        self.pool_size = pool_size or config.TTS_POOL_SIZE
+        self.health_interval = config.TTS_HEALTH_INTERVAL if health_interval is None else health_interval
+        self.cache = cache or get_tts_cache()
+        self.rate_limiter = TokenBucket(config.TTS_RATE_LIMIT if rate_limit is None else rate_limit,
+                                        config.TTS_RATE_BURST if rate_burst is None else rate_burst)
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self.healthy = None  # None：尚未检查
+        self.last_check = None
+        self.last_error = None
+        self._client = None
+        self._health_task = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                proxies=self.proxies or None,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+                headers={"Ocp-Apim-Subscription-Key": self.key or "",
+                         "User-Agent": "HuangBanxian-TTS-Client"},
+            )
+        return self._client
+
+    async def start(self):
+        """在应用事件循环中创建客户端并启动定期健康检查"""
+        self.client  # 客户端与连接池绑定到当前（应用）事件循环
+        if self.health_interval and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def check_health(self) -> bool:
+        """请求发音人列表接口确认网络、代理与密钥可用（同时预热连接）"""
+        try:
+            response = await self.client.get(self.health_url)
+            response.raise_for_status()
+            self.healthy, self.last_error = True, None
+        except Exception as e:
+            if self.healthy is not False:
+                print(f"⚠️ 语音服务健康检查失败：{str(e)}")
+            self.healthy, self.last_error = False, str(e)
+        self.last_check = time.time()
+        return self.healthy
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    async def synthesize(self, text: str, style: str) -> bytes:
+        """调用上游合成一段文本，返回音频字节"""
+        await self.rate_limiter.acquire()
+        response = await self.client.post(
+            self.api_url,
+            headers={"Content-Type": "application/ssml+xml",
+                     "X-Microsoft-OutputFormat": config.TTS_OUTPUT_FORMAT},
+            content=build_ssml(text, style).encode("utf-8"),
+        )
+        response.raise_for_status()
+        return response.content
+
+    async def speak(self, text: str, style: str, audio_uid: str) -> str:
+        """合成（或复用缓存）并保存为 voices/{audio_uid}.mp3，返回文件路径"""
+        key = tts_cache_key(text, config.TTS_VOICE, style, config.TTS_OUTPUT_FORMAT)
+        path = await self.cache.get_or_create(key, text, lambda: self.synthesize(text, style))
+        return self.cache.link(path, audio_uid)
+
+    def manifest_path(self, audio_uid: str) -> str:
+        return os.path.join(self.cache.voices_dir, f"{audio_uid}.json")
+
+    async def speak_chunked(self, text: str, style: str, audio_uid: str, concurrency: int = None,
+                            on_update=None) -> str:
+        """分句并发合成：每句合成完成即保存为 voices/{audio_uid}_{i}.mp3 并更新清单 {audio_uid}.json，
+        前端拿到第一段即可开始播放；全部完成后再拼接出完整的 voices/{audio_uid}.mp3。
+        清单每次更新后回调 on_update(manifest)（用于通知等待语音的客户端）。
+        """
+        chunks = split_sentences(text) or [text]
+        manifest = {
+            "audio_uid": audio_uid,
+            "total": len(chunks),
+            "segments": [f"{audio_uid}_{i}.mp3" for i in range(len(chunks))],
+            "ready": [False] * len(chunks),
+            "complete": False,
+            "error": None,
+        }
+        manifest_path = self.manifest_path(audio_uid)
+
+        def publish():
+            write_json_atomic(manifest_path, manifest)
+            if on_update is not None:
+                on_update(manifest)
+
+        publish()
+        semaphore = asyncio.Semaphore(concurrency or config.TTS_CHUNK_CONCURRENCY)
+
+        async def speak_segment(i: int, chunk: str):
+            async with semaphore:
+                path = await self.speak(chunk, style, f"{audio_uid}_{i}")
+            manifest["ready"][i] = True
+            publish()
+            return path
+
+        try:
+            paths = await asyncio.gather(*[speak_segment(i, chunk) for i, chunk in enumerate(chunks)])
+            # MP3 由独立的帧组成，同格式的分段直接按顺序拼接即为完整音频；
+            # 完整音频按内容摘要存入缓存，与分段一样受容量上限约束
+            parts = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    parts.append(f.read())
+            audio = b"".join(parts)
+            target = self.cache.link(self.cache.put(hashlib.sha256(audio).hexdigest(), audio), audio_uid)
+            manifest["complete"] = True
+            return target
+        except Exception as e:
+            manifest["error"] = str(e)
+            raise
+        finally:
+            publish()
+
+    def status(self) -> dict:
+        return {"healthy": self.healthy, "last_check": self.last_check, "last_error": self.last_error,
+                "http2": self.http2}
+
+
+_tts_service = None
+_tts_service_lock = threading.Lock()
+
+
+def get_tts_service() -> TTSService:
+    """获取进程内共享的语音合成服务"""
+    global _tts_service
+    if _tts_service is None:
+        with _tts_service_lock:
+            if _tts_service is None:
+                _tts_service = TTSService()
+    return _tts_service
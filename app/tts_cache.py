@@ -0,0 +1,190 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+from .config import config
+
+
+def tts_cache_key(text: str, voice: str, style: str, output_format: str) -> str:
+    """语音缓存键：hash(文本, 发音人, 风格, 输出格式)"""
+    raw = "\0".join([text, voice, style, output_format])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """按内容寻址的语音缓存
+
+    同一 (文本, 发音人, 风格, 格式) 只合成一次，音频存为 cache/{hash}.mp3；
+    每个请求的 voices/{audio_uid}.mp3 硬链接到共享文件（不支持硬链接时复制）。
+    同一内容的并发请求共享一次上游合成（用 concurrent.futures.Future，跨线程、跨事件循环均可等待）。
+    缓存目录总大小超过 max_bytes 时按最近使用时间淘汰（LRU，命中时刷新文件修改时间，重启后顺序不丢）；
+    淘汰时一并删除链接到该文件的 voices 文件（及同名清单），否则硬链接会让磁盘空间无法释放。
+    """
+
+    def __init__(self, directory: str = None, voices_dir: str = None, max_bytes: int = None):
+        self.voices_dir = voices_dir or config.VOICES_DIR
+        self.directory = directory or config.TTS_CACHE_DIR
+        self.max_bytes = config.TTS_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._inflight = {}  # key -> concurrent.futures.Future
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "shared": 0, "saved_chars": 0, "evictions": 0}
+        self._entries = OrderedDict()  # key -> 文件字节数，最久未使用的在前
+        self._links = {}  # key -> {voices 文件路径: 链接时的 inode}
+        self._size = 0
+        self._load()
+
+    def _load(self):
+        """启动时按修改时间恢复已有缓存文件的使用顺序，并按 inode 找回 voices 中的硬链接"""
+        files, inodes = [], {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".mp3"):
+                    stat = entry.stat()
+                    key = entry.name[:-len(".mp3")]
+                    files.append((stat.st_mtime, key, stat.st_size))
+                    inodes[stat.st_ino] = key
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        if not os.path.isdir(self.voices_dir):
+            return
+        with os.scandir(self.voices_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".mp3"):
+                    inode = entry.stat().st_ino
+                    if inode in inodes:
+                        self._links.setdefault(inodes[inode], {})[entry.path] = inode
+
+    def _touch(self, key: str, path: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _add(self, key: str, size: int):
+        """登记新写入的文件，超出容量时淘汰最久未使用的文件（不淘汰刚写入的）"""
+        victims = []
+        with self._lock:
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self.max_bytes and self._size > self.max_bytes and len(self._entries) > 1:
+                victim, victim_size = self._entries.popitem(last=False)
+                self._size -= victim_size
+                self._stats["evictions"] += 1
+                victims.append(victim)
+        for victim in victims:
+            self._remove(victim)
+
+    def _remove(self, key: str):
+        """删除缓存文件及链接到它的 voices 文件（已被其他内容覆盖的链接保留）"""
+        with self._lock:
+            links = self._links.pop(key, {})
+        for link, inode in links.items():
+            try:
+                if os.stat(link).st_ino != inode:
+                    continue
+                os.remove(link)
+            except FileNotFoundError:
+                continue
+            manifest = link[:-len(".mp3")] + ".json"
+            if os.path.exists(manifest):
+                os.remove(manifest)
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _record(self, name: str, chars: int = 0):
+        with self._lock:
+            self._stats[name] += 1
+            self._stats["saved_chars"] += chars
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    async def get_or_create(self, key: str, text: str, synthesize) -> str:
+        """返回缓存音频路径；未命中时调用 synthesize()（协程函数，返回音频字节）合成并写入"""
+        path = self.path(key)
+        if os.path.exists(path):
+            self._record("hits", len(text))
+            self._touch(key, path)
+            return path
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+        if not owner:
+            self._record("shared", len(text))
+            return await asyncio.wrap_future(future)
+
+        self._record("misses")
+        try:
+            audio = await synthesize()
+            self.put(key, audio)
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def put(self, key: str, audio: bytes) -> str:
+        """写入一段音频并登记（可能触发淘汰），返回缓存路径"""
+        path = self.path(key)
+        # 先写临时文件再原子替换，其他请求不会读到写了一半的音频
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+        self._add(key, len(audio))
+        return path
+
+    def link(self, path: str, audio_uid: str) -> str:
+        """把请求的 audio_uid 映射到共享音频文件（缓存文件被淘汰时一并删除）"""
+        os.makedirs(self.voices_dir, exist_ok=True)
+        target = os.path.join(self.voices_dir, f"{audio_uid}.mp3")
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(path, tmp)
+        except OSError:
+            shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+        key = os.path.basename(path)[:-len(".mp3")]
+        with self._lock:
+            self._links.setdefault(key, {})[target] = os.stat(target).st_ino
+        return target
+
+    def stats(self) -> dict:
+        """返回命中、未命中、并发共享、淘汰次数、节省的合成字符数、占用空间与命中率"""
+        with self._lock:
+            reused = self._stats["hits"] + self._stats["shared"]
+            total = reused + self._stats["misses"]
+            return dict(self._stats, files=len(self._entries), bytes=self._size,
+                        hit_rate=round(reused / total, 4) if total else 0.0)
+
+
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """获取进程内共享的语音缓存"""
+    global _tts_cache
+    if _tts_cache is None:
+        with _tts_cache_lock:
+            if _tts_cache is None:
+                _tts_cache = TTSCache()
+    return _tts_cache
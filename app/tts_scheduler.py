@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+
+from .audio_delivery import EXPIRED, FAILED, QUEUED, REJECTED, RUNNING, get_audio_status_board
+from .config import config
+from .tts import get_tts_service
+
+
+@dataclass
+class TTSJob:
+    """一次语音合成任务（owner 为请求用户，同一用户的新任务会让其排队中的旧任务过期）"""
+    audio_uid: str
+    text: str
+    style: str
+    owner: str = None
+    enqueued_at: float = field(default_factory=time.time)
+    expires_at: float = None
+    cancelled: bool = False
+
+    def expired(self, now: float = None) -> bool:
+        return self.cancelled or (self.expires_at is not None and (now or time.time()) > self.expires_at)
+
+
+class TTSScheduler:
+    """语音合成任务调度
+
+    - 固定数量的 worker 协程，上游并发有上限
+    - 优先队列：文本越短越先合成（短回答几乎立即可播放，不被长篇解读堵住）
+    - 队列已满时拒绝新任务（背压），不再无限制地堆积
+    - 任务过期（超过 TTS_JOB_TTL 未开始、被同一用户的新任务取代、或用户断开）后直接丢弃
+    - 统计队列深度、排队等待时间、完成/失败/过期/拒绝数
+    - 任务状态变化同步到语音就绪状态表，等待语音的客户端随即收到通知
+    上游请求速率由 TTSService 的令牌桶限制。
+    """
+
+    def __init__(self, service=None, workers: int = None, max_queue: int = None, job_ttl: float = None,
+                 chunked: bool = None, board=None):
+        self._service = service
+        self.board = board or get_audio_status_board()
+        self.workers = workers or config.TTS_WORKERS
+        self.max_queue = config.TTS_MAX_QUEUE if max_queue is None else max_queue
+        self.job_ttl = config.TTS_JOB_TTL if job_ttl is None else job_ttl
+        self.chunked = config.TTS_CHUNKED if chunked is None else chunked
+        self._queue = None
+        self._tasks = []
+        self._seq = itertools.count()
+        self._pending = {}  # owner -> 排队中的任务
+        self.running = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "expired": 0, "rejected": 0}
+        self._waits = {"count": 0, "total": 0.0, "max": 0.0}
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = get_tts_service()
+        return self._service
+
+    async def start(self):
+        """在应用事件循环中启动 worker"""
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, text: str, style: str, audio_uid: str, owner: str = None):
+        """提交合成任务，返回任务；队列已满时返回 None"""
+        if self._queue is None or not text:
+            return None
+        if self.max_queue and self._queue.qsize() >= self.max_queue:
+            self._stats["rejected"] += 1
+            self.board.update(audio_uid, status=REJECTED, error="语音任务队列已满")
+            print(f"⚠️ 语音任务队列已满（{self._queue.qsize()}），放弃合成：{audio_uid}")
+            return None
+        if owner is not None:
+            # 同一用户只需要最新一条回答的语音
+            previous = self._pending.get(owner)
+            if previous is not None:
+                self._expire(previous, "已被新的回答取代")
+        job = TTSJob(audio_uid=audio_uid, text=text, style=style, owner=owner,
+                     expires_at=time.time() + self.job_ttl if self.job_ttl else None)
+        if owner is not None:
+            self._pending[owner] = job
+        self._queue.put_nowait((len(text), next(self._seq), job))
+        self.board.update(audio_uid, status=QUEUED)
+        self._stats["submitted"] += 1
+        return job
+
+    def cancel(self, owner: str):
+        """用户不再需要语音（如断开连接）时取消其排队中的任务"""
+        job = self._pending.pop(owner, None)
+        if job is not None:
+            self._expire(job, "用户已断开")
+
+    def _expire(self, job: TTSJob, reason: str):
+        job.cancelled = True
+        self.board.update(job.audio_uid, status=EXPIRED, error=reason)
+
+    async def join(self):
+        await self._queue.join()
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await self.run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job: TTSJob):
+        if job.owner is not None and self._pending.get(job.owner) is job:
+            del self._pending[job.owner]
+        now = time.time()
+        if job.expired(now):
+            self._stats["expired"] += 1
+            if not job.cancelled:
+                self.board.update(job.audio_uid, status=EXPIRED, error="排队超时")
+            return
+        wait = now - job.enqueued_at
+        self._waits["count"] += 1
+        self._waits["total"] += wait
+        self._waits["max"] = max(self._waits["max"], wait)
+        self.running += 1
+        self.board.update(job.audio_uid, status=RUNNING)
+        try:
+            print(f"🎤 开始语音合成（UID：{job.audio_uid}，排队{wait:.2f}秒）：{job.text[:30]}...")
+            if self.chunked:
+                target = await self.service.speak_chunked(
+                    job.text, job.style, job.audio_uid,
+                    on_update=lambda manifest: self.board.update(
+                        job.audio_uid, total=manifest["total"], segments=list(manifest["segments"]),
+                        ready=list(manifest["ready"]), complete=manifest["complete"]))
+            else:
+                target = await self.service.speak(job.text, job.style, job.audio_uid)
+            self.board.update(job.audio_uid, complete=True)
+            self._stats["completed"] += 1
+            print(f"✅ 语音文件已保存：{target}")
+        except Exception as e:
+            self._stats["failed"] += 1
+            self.board.update(job.audio_uid, status=FAILED, error=str(e))
+            print(f"❌ 语音合成异常：{str(e)}")
+            print(f"📜 异常堆栈：{traceback.format_exc()}")
+        finally:
+            self.running -= 1
+
+    def stats(self) -> dict:
+        """返回队列深度、执行中任务数、排队等待时间（平均/最大，秒）与各类任务计数"""
+        count = self._waits["count"]
+        return dict(
+            self._stats,
+            queue_depth=self._queue.qsize() if self._queue is not None else 0,
+            running=self.running,
+            avg_wait=round(self._waits["total"] / count, 4) if count else 0.0,
+            max_wait=round(self._waits["max"], 4),
+        )
+
+
+_tts_scheduler = None
+_tts_scheduler_lock = threading.Lock()
+
+
+def get_tts_scheduler() -> TTSScheduler:
+    """获取进程内共享的语音任务调度器"""
+    global _tts_scheduler
+    if _tts_scheduler is None:
+        with _tts_scheduler_lock:
+            if _tts_scheduler is None:
+                _tts_scheduler = TTSScheduler()
+    return _tts_scheduler
@@ -2,8 +2,6 @@ import streamlit as st
 import requests
 import os
 import json
-import base64
-import time
 from datetime import datetime
 from streamlit.components.v1 import html
 import sys
@@ -32,69 +30,74 @@ def init_session_state():
         st.session_state.current_audio_uid = None  # 当前语音UID
     if "user_uid" not in st.session_state:
         st.session_state.user_uid = None  # 后端回传的用户唯一标识（复用会话）
+    if "ingest_jobs" not in st.session_state:
+        st.session_state.ingest_jobs = []  # 已提交的知识库入库任务 [{"job_id", "url"}]
 
 init_session_state()
 
 
-# 3. 语音自动播放函数（修正路径拼接，支持轮询检测文件生成）
+# 3. 语音自动播放函数（通过后端接口获取语音，不再读取本地文件）
 def auto_play_audio(audio_uid):
-    """自动播放语音，轮询检测文件是否生成，超时显示手动播放按钮"""
-    # 拼接语音文件路径（项目根目录/voices/xxx.mp3）
-    project_root = Path(__file__).parent.parent  # 项目根目录（如：G:\code\HuangBanxian_Langchain_Agent）
-    audio_path = project_root / "voices" / f"{audio_uid}.mp3"
-
-    # 轮询检测语音文件（最多等待 config.TTS_WAIT_TIMEOUT 秒）
-    wait_time = 0
-    while not audio_path.exists() and wait_time < config.TTS_WAIT_TIMEOUT:
-        time.sleep(0.5)
-        wait_time += 0.5
-        # 每2秒提示一次进度
-        if int(wait_time) % 2 == 0:
-            st.toast(f"正在准备语音回复（已等待 {int(wait_time)} 秒）...")
-
-    # 处理超时/文件存在情况
-    if not audio_path.exists():
-        st.warning("语音生成超时，可点击下方按钮手动播放")
-        st.audio(str(audio_path), format="audio/mp3")
-        return
-
-    # 读取文件并转为Base64（支持前端直接播放）
-    try:
-        audio_bytes = audio_path.read_bytes()
-        audio_b64 = base64.b64encode(audio_bytes).decode()
-    except Exception as e:
-        st.error(f"读取语音文件失败：{str(e)}")
-        st.audio(str(audio_path), format="audio/mp3")
-        return
-
-    # 嵌入HTML实现自动播放（兼容浏览器自动播放策略）
+    """订阅后端语音就绪通知（SSE），每段可播放即按顺序播放，全部完成后播放器切换为完整语音；
+    浏览器禁止自动播放时，用户点击播放器即可收听完整语音"""
+    api_url = st.session_state.api_url.rstrip("/")
     html_content = f"""
+    <audio id="voice" controls style="width: 100%;" title="黄半仙语音回复"></audio>
+    <div id="hint" style="font-size: 12px; color: #888;">正在准备语音回复...</div>
     <script>
-        // 创建音频元素
-        const audio = new Audio("data:audio/mp3;base64,{audio_b64}");
-        
-        // 尝试自动播放（需用户交互，浏览器限制）
-        function playAudio() {{
-            audio.play().then(() => {{
-                console.log("语音自动播放成功（UID：{audio_uid}）");
-            }}).catch(error => {{
-                console.log("自动播放需用户交互，显示手动播放按钮：", error);
-                // 创建手动播放按钮
-                const audioContainer = document.createElement('div');
-                audioContainer.style.marginTop = '10px';
-                const audioElement = document.createElement('audio');
-                audioElement.controls = true;
-                audioElement.src = "data:audio/mp3;base64,{audio_b64}";
-                audioElement.title = "黄半仙语音回复";
-                audioContainer.appendChild(audioElement);
-                document.body.appendChild(audioContainer);
+        const apiUrl = "{api_url}";
+        const audio = document.getElementById("voice");
+        const hint = document.getElementById("hint");
+        const segments = [];  // 按序号排列的分段地址
+        let next = 0, playing = false, blocked = false, fullUrl = null;
+
+        function play(url) {{
+            audio.src = url;
+            playing = true;
+            audio.play().catch(error => {{
+                // 浏览器自动播放策略限制：等待用户点击播放器
+                console.log("自动播放需用户交互：", error);
+                playing = false;
+                blocked = true;
+                hint.textContent = "点击播放器收听语音回复";
             }});
         }}
-        
-        // 页面加载完成后触发播放（或等待用户交互）
-        window.addEventListener('load', playAudio);
-        // 兼容Streamlit的交互事件（点击页面后触发）
-        document.addEventListener('click', playAudio, {{once: true}});
+
+        function playNext() {{
+            if (playing || blocked) return;
+            if (next < segments.length && segments[next]) {{
+                play(segments[next++]);
+            }} else if (fullUrl && next === 0) {{
+                play(fullUrl);  // 非分句合成（或命中缓存）直接播放完整语音
+                next = 1;
+            }} else if (fullUrl && next >= segments.length) {{
+                audio.src = fullUrl;  // 分段播完后切换为完整语音，便于回放/拖动
+            }}
+        }}
+
+        audio.addEventListener("ended", () => {{ playing = false; playNext(); }});
+
+        const events = new EventSource(`${{apiUrl}}/voices/{audio_uid}/events`);
+        events.addEventListener("segment", e => {{
+            const data = JSON.parse(e.data);
+            segments[data.index] = apiUrl + data.url;
+            hint.textContent = `语音生成中（${{segments.filter(Boolean).length}}/${{data.total}}）`;
+            playNext();
+        }});
+        events.addEventListener("complete", e => {{
+            fullUrl = apiUrl + JSON.parse(e.data).url;
+            hint.textContent = "";
+            events.close();
+            if (blocked) {{ audio.src = fullUrl; }} else {{ playNext(); }}
+        }});
+        events.addEventListener("failed", e => {{
+            hint.textContent = "语音生成失败：" + JSON.parse(e.data).message;
+            events.close();
+        }});
+        events.addEventListener("timeout", () => {{
+            hint.textContent = "语音生成超时";
+            events.close();
+        }});
     </script>
     """
     html(html_content, height=80)  # 渲染HTML音频播放器
@@ -124,6 +127,7 @@ def render_page():
                 add_url_to_knowledge_base(url_input.strip())
             else:
                 st.warning("请输入有效的URL（如：https://xxx.com/fengshui.html）")
+        render_ingest_jobs()
         
         # 功能说明
         st.subheader("❓ 支持功能")
@@ -147,11 +151,10 @@ def render_page():
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
-            # 显示语音（若有）
-            if "audio_path" in message:
-                audio_file = Path(__file__).parent.parent / message["audio_path"]
-                if audio_file.exists():
-                    st.audio(str(audio_file), format="audio/mp3")
+            # 显示语音（若有，由后端接口提供）
+            if message.get("audio_uid"):
+                st.audio(f"{st.session_state.api_url.rstrip('/')}/voices/{message['audio_uid']}",
+                         format="audio/mp3")
 
     # 用户输入区域（聊天输入框）
     if prompt := st.chat_input("请输入您想咨询的问题（例如：帮我排一下八字）"):
@@ -214,7 +217,6 @@ def handle_user_input(prompt):
             if response_data.get("status") == "success":
                 answer = response_data.get("message", "暂无回应")
                 audio_uid = response_data.get("audio_uid", "")
-                audio_path = response_data.get("audio_path", "")
                 # 保存后端回传的uid（下次请求复用）
                 if "uid" in response_data:
                     st.session_state.user_uid = response_data["uid"]
@@ -231,7 +233,7 @@ def handle_user_input(prompt):
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": answer,
-                    "audio_path": audio_path,
+                    "audio_uid": audio_uid,
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 })
 
@@ -288,12 +290,13 @@ def add_url_to_knowledge_base(url):
             "Referer": "http://localhost:8501/"
         }
 
+        # 后端只负责排队，立即返回任务ID，入库进度由 render_ingest_jobs 轮询展示
         response = requests.post(
             url=f"{st.session_state.api_url}/add_urls",
             json={"URL": url},
             headers=headers,
             proxies=proxies,
-            timeout=20,
+            timeout=5,
             verify=False
         )
         response.raise_for_status()
@@ -301,6 +304,7 @@ def add_url_to_knowledge_base(url):
         response_data = response.json()
         
         if response_data.get("status") == "success":
+            st.session_state.ingest_jobs.append({"job_id": response_data.get("job_id"), "url": url})
             st.success(f"✅ {response_data.get('message')}")
         else:
             st.error(f"❌ 添加失败：{response_data.get('message', '未知错误')}")
@@ -310,6 +314,51 @@ def add_url_to_knowledge_base(url):
         st.error(f"❌ 未知错误：{str(e)}")
 
 
-# 8. 启动页面渲染
+# 8. 辅助函数：轮询知识库入库任务进度（局部刷新，不阻塞页面）
+@st.fragment(run_every=2)
+def render_ingest_jobs():
+    """展示最近提交的入库任务进度（抓取、分片、嵌入、写入）"""
+    for job in st.session_state.ingest_jobs[-5:]:
+        if job.get("done"):
+            st.caption(job["summary"])
+            continue
+        try:
+            response = requests.get(
+                url=f"{st.session_state.api_url}/jobs/{job['job_id']}",
+                proxies={"http": None, "https": None},
+                timeout=3
+            )
+            if response.status_code == 404:
+                job.update(done=True, summary=f"❌ {job['url']}：入库任务不存在（可能已被清理）")
+                st.caption(job["summary"])
+                continue
+            data = response.json().get("job") or {}
+        except Exception:
+            st.caption(f"⏳ {job['url']}：等待后端响应…")
+            continue
+
+        status, progress = data.get("status"), data.get("progress", {})
+        if status in ("succeeded", "failed"):
+            results = (data.get("result") or {}).get("results") or []
+            result = results[0] if results else {}
+            if status == "succeeded" and result.get("status") == "unchanged":
+                summary = f"✅ {job['url']}：内容未变化，无需更新"
+            elif status == "succeeded":
+                summary = (f"✅ {job['url']}：已入库{result.get('chunks', 0)}个片段"
+                           f"（新增{result.get('added', 0)}，删除{result.get('deleted', 0)}）")
+            else:
+                summary = f"❌ {job['url']}：{result.get('error') or data.get('error') or '入库失败'}"
+            job.update(done=True, summary=summary)
+            st.caption(summary)
+        else:
+            chunks = progress.get("chunks", 0)
+            st.caption(f"⏳ {job['url']}：{'排队中' if status == 'queued' else '入库中'}"
+                       f"（已抓取{progress.get('fetched', 0)}页，分片{chunks}，"
+                       f"嵌入{progress.get('embedded', 0)}，写入{progress.get('stored', 0)}）")
+            if chunks:
+                st.progress(min(progress.get("stored", 0) / chunks, 1.0))
+
+
+# 9. 启动页面渲染
 if __name__ == "__main__":
     render_page()
\ No newline at end of file
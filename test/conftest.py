@@ -0,0 +1,96 @@
+import pytest
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tts import TTSService
+from app.tts_cache import TTSCache
+
+
+class StubTTSHandler(BaseHTTPRequestHandler):
+    """模拟 Azure TTS：POST 返回固定音频，GET 返回发音人列表；记录连接、请求与最大并发数"""
+    protocol_version = "HTTP/1.1"  # 支持长连接
+    connections = set()
+    posts = []
+    delay = 0.0
+    active = max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        StubTTSHandler.connections.add(self.client_address)
+        self._reply(b"[]", "application/json")
+
+    def do_POST(self):
+        StubTTSHandler.connections.add(self.client_address)
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        with StubTTSHandler.lock:
+            StubTTSHandler.posts.append((body, self.headers.get("Ocp-Apim-Subscription-Key")))
+            StubTTSHandler.active += 1
+            StubTTSHandler.max_active = max(StubTTSHandler.max_active, StubTTSHandler.active)
+        threading.Event().wait(StubTTSHandler.delay)
+        with StubTTSHandler.lock:
+            StubTTSHandler.active -= 1
+        self._reply(b"ID3" + body.encode("utf-8")[-16:], "audio/mpeg")
+
+    def _reply(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowTTSService(TTSService):
+    """按文本长度模拟合成耗时，记录最大并发数"""
+
+    def __init__(self, cache):
+        super().__init__(api_url="http://unused", health_url="http://unused", key="", proxies={},
+                         health_interval=0, cache=cache, rate_limit=0)
+        self.active = self.max_active = 0
+
+    async def synthesize(self, text, style):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01 * len(text))
+        self.active -= 1
+        return f"[{text}]".encode("utf-8")
+
+
+@pytest.fixture
+def stub_tts():
+    StubTTSHandler.connections, StubTTSHandler.posts = set(), []
+    StubTTSHandler.delay, StubTTSHandler.active, StubTTSHandler.max_active = 0.0, 0, 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubTTSHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def make_service(stub_tts, tmp_path):
+    def factory(health_interval: float = 0, rate_limit: float = 0, **kwargs):
+        cache = TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path))
+        return TTSService(api_url=stub_tts + "/cognitiveservices/v1",
+                          health_url=stub_tts + "/cognitiveservices/voices/list",
+                          key="test-key", proxies={}, health_interval=health_interval, cache=cache,
+                          rate_limit=rate_limit, **kwargs)
+    return factory
+
+
+@pytest.fixture
+def tts_handler(stub_tts):
+    """本地TTS桩服务的处理类（收到的请求、连接与并发数记录在类属性上）"""
+    return StubTTSHandler
+
+
+@pytest.fixture
+def slow_service(tmp_path):
+    return SlowTTSService(TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path)))
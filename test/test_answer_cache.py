@@ -0,0 +1,106 @@
+import pytest
+import asyncio
+import time
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from langchain_core.embeddings import Embeddings
+from app.answer_cache import AnswerCache
+
+
+class KeywordEmbeddings(Embeddings):
+    """按是否包含“运势”“风水”“龙”“虎”生成向量（足以区分测试问题的语义）"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [1.0 if "运势" in text else 0.0, 1.0 if "风水" in text else 0.0,
+                0.1 if "龙" in text else 0.0, 0.1 if "虎" in text else 0.0]
+
+
+class ConstantEmbeddings(Embeddings):
+    """所有文本都得到同一向量（相似度恒为1，只靠关键词约束区分）"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(maxsize=8, ttl=60, similarity=0.9, skip_tools=["bazi_cesuan"],
+                       embeddings=KeywordEmbeddings())
+
+
+class TestAnswerCache:
+    """测试回答缓存"""
+
+    def test_exact_hit_ignores_punctuation(self, cache):
+        """测试归一化后的同一问题精确命中"""
+        _, probe = cache.lookup("2025年运势怎么样？", "default")
+        assert cache.store(probe, "流年大吉")
+        answer, _ = cache.lookup("2025年运势 怎么样", "default")
+        assert answer == "流年大吉"
+        assert cache.stats()["exact_hits"] == 1
+
+    def test_mood_in_key(self, cache):
+        """测试不同情绪的回答分开缓存"""
+        _, probe = cache.lookup("2025年运势怎么样", "happy")
+        cache.store(probe, "开心版")
+        answer, _ = cache.lookup("2025年运势怎么样", "depressed")
+        assert answer is None
+
+    def test_semantic_hit_with_same_key_terms(self, cache):
+        """测试同义改写语义命中，生肖不同的问题不互用"""
+        _, probe = cache.lookup("属龙的2025年运势", "default")
+        cache.store(probe, "龙年答案")
+        answer, _ = cache.lookup("2025年属龙运势如何", "default")
+        assert answer == "龙年答案"
+        answer, _ = cache.lookup("属虎的2025年运势", "default")
+        assert answer is None
+        assert cache.stats()["semantic_hits"] == 1
+
+    @pytest.mark.parametrize("stored, other", [
+        ("今年财运怎么样", "今年感情怎么样"),
+        ("今年事业运势如何", "今年健康运势如何"),
+        ("今天运势怎么样", "明天运势怎么样"),
+    ])
+    def test_semantic_miss_on_different_topic(self, stored, other):
+        """测试所问方面或时间不同的问题即使向量完全相同也不互用答案"""
+        cache = AnswerCache(maxsize=8, ttl=60, similarity=0.9, embeddings=ConstantEmbeddings())
+        _, probe = cache.lookup(stored, "default")
+        cache.store(probe, "缓存的回答")
+        answer, _ = cache.lookup(other, "default")
+        assert answer is None and cache.stats()["semantic_hits"] == 0
+
+    def test_personal_and_opt_out_not_stored(self, cache):
+        """测试个人问题、已有历史、使用禁止缓存工具的回答不写入"""
+        answer, probe = cache.lookup("我2025年运势怎么样", "default")
+        assert answer is None and not cache.store(probe, "个人答案")
+        assert cache.stats()["bypassed"] == 1
+        _, probe = cache.lookup("家居风水要注意什么", "default")
+        assert not cache.store(probe, "答案", tools_used=["bazi_cesuan"])
+        assert not cache.store(probe, "答案", has_history=True)
+        assert cache.store(probe, "答案", tools_used=["get_infor_from_local_db"])
+
+    def test_ttl(self):
+        """测试过期后不再命中"""
+        cache = AnswerCache(maxsize=8, ttl=0.05, similarity=0.9, skip_tools=[],
+                            embeddings=KeywordEmbeddings())
+        _, probe = cache.lookup("家居风水要注意什么", "default")
+        cache.store(probe, "答案")
+        time.sleep(0.1)
+        assert cache.lookup("家居风水要注意什么", "default")[0] is None
+        assert cache.lookup("家居风水注意事项", "default")[0] is None
+
+    def test_async_lookup(self, cache):
+        """测试异步查询"""
+        _, probe = cache.lookup("家居风水要注意什么", "default")
+        cache.store(probe, "答案")
+        answer, _ = asyncio.run(cache.alookup("家居风水注意事项", "default"))
+        assert answer == "答案"
@@ -0,0 +1,140 @@
+import pytest
+import asyncio
+import json
+import os
+from pathlib import Path
+import sys
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.audio_delivery import AudioStatusBoard, audio_events, audio_file_response, parse_range
+from app.tts_scheduler import TTSScheduler
+
+
+@pytest.fixture
+def voice_client(tmp_path):
+    """只挂载语音下载路由的应用（与 /voices/{audio_uid} 行为一致）"""
+    (tmp_path / "a1.mp3").write_bytes(bytes(range(256)) * 4)
+    app = FastAPI()
+
+    @app.get("/voices/{audio_uid}")
+    def get_voice(audio_uid: str, request: Request):
+        return audio_file_response(str(tmp_path / f"{audio_uid}.mp3"), request.headers)
+
+    return TestClient(app)
+
+
+def collect(board, audio_uid, timeout=1.0):
+    async def run():
+        return [event async for event in audio_events(board, audio_uid, timeout)]
+    return asyncio.run(run())
+
+
+class TestAudioFileResponse:
+    """测试语音文件下发（Range、ETag、缓存头）"""
+
+    def test_parse_range(self):
+        """测试单段范围解析"""
+        assert parse_range("bytes=0-99", 1024) == (0, 99)
+        assert parse_range("bytes=1000-", 1024) == (1000, 1023)
+        assert parse_range("bytes=-24", 1024) == (1000, 1023)
+        assert parse_range("bytes=0-99999", 1024) == (0, 1023)
+        assert parse_range("bytes=2000-", 1024) is None
+        assert parse_range("bytes=0-1,5-9", 1024) is None
+
+    def test_full_and_partial_content(self, voice_client):
+        """测试完整下载与范围请求"""
+        full = voice_client.get("/voices/a1")
+        assert full.status_code == 200 and len(full.content) == 1024
+        assert full.headers["accept-ranges"] == "bytes" and "max-age" in full.headers["cache-control"]
+
+        part = voice_client.get("/voices/a1", headers={"Range": "bytes=256-511"})
+        assert part.status_code == 206
+        assert part.headers["content-range"] == "bytes 256-511/1024"
+        assert part.content == bytes(range(256))
+
+        assert voice_client.get("/voices/a1", headers={"Range": "bytes=5000-"}).status_code == 416
+        assert voice_client.get("/voices/a1", headers={"Range": "bytes=0-1,5-9"}).status_code == 200
+
+    def test_etag_revalidation(self, voice_client):
+        """测试 If-None-Match 命中返回304，If-Range 不匹配时返回完整文件"""
+        etag = voice_client.get("/voices/a1").headers["etag"]
+        assert voice_client.get("/voices/a1", headers={"If-None-Match": etag}).status_code == 304
+        stale = voice_client.get("/voices/a1", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+        assert stale.status_code == 200 and len(stale.content) == 1024
+
+    def test_validators_survive_touch(self, voice_client, tmp_path):
+        """测试缓存命中刷新修改时间（硬链接共享 inode）后 ETag 不变，不返回按 mtime 生成的 Last-Modified"""
+        first = voice_client.get("/voices/a1")
+        assert "last-modified" not in first.headers
+        os.utime(tmp_path / "a1.mp3", (1, 1))
+        etag = first.headers["etag"]
+        assert voice_client.get("/voices/a1", headers={"If-None-Match": etag}).status_code == 304
+        resumed = voice_client.get("/voices/a1", headers={"Range": "bytes=0-9", "If-Range": etag})
+        assert resumed.status_code == 206 and resumed.headers["etag"] == etag
+
+    def test_missing_file(self, voice_client):
+        """测试语音不存在时返回404"""
+        assert voice_client.get("/voices/nope").status_code == 404
+
+
+class TestAudioEvents:
+    """测试语音就绪通知"""
+
+    def test_notified_without_polling(self, tmp_path):
+        """测试状态变化即推送分段与完成事件"""
+        board = AudioStatusBoard(voices_dir=str(tmp_path))
+        board.update("a1", status="running", total=2, segments=["a1_0.mp3", "a1_1.mp3"], ready=[False, False])
+
+        async def run():
+            async def produce():
+                await asyncio.sleep(0.02)
+                board.update("a1", ready=[False, True])
+                await asyncio.sleep(0.02)
+                board.update("a1", ready=[True, True], complete=True)
+
+            producer = asyncio.create_task(produce())
+            events = [event async for event in audio_events(board, "a1", timeout=1.0)]
+            await producer
+            return events
+
+        events = asyncio.run(run())
+        assert [(e["type"], e.get("index")) for e in events] == [("segment", 1), ("segment", 0), ("complete", None)]
+        assert events[0]["url"] == "/voices/a1_1" and events[-1]["url"] == "/voices/a1"
+
+    def test_failed_unknown_and_timeout(self, tmp_path):
+        """测试失败、未知语音与等待超时"""
+        board = AudioStatusBoard(voices_dir=str(tmp_path))
+        board.update("a1", status="expired", error="用户已断开")
+        assert collect(board, "a1")[-1]["type"] == "failed"
+        assert collect(board, "nope")[-1]["type"] == "failed"
+        board.update("a2", status="queued")
+        assert collect(board, "a2", timeout=0.05)[-1]["type"] == "timeout"
+
+    def test_falls_back_to_manifest(self, tmp_path):
+        """测试状态表中没有的语音从磁盘清单推断"""
+        (tmp_path / "a1.json").write_text(json.dumps({
+            "audio_uid": "a1", "total": 1, "segments": ["a1_0.mp3"], "ready": [True], "complete": True,
+            "error": None}), encoding="utf-8")
+        board = AudioStatusBoard(voices_dir=str(tmp_path))
+        assert [e["type"] for e in collect(board, "a1")] == ["segment", "complete"]
+
+    def test_scheduler_publishes_progress(self, slow_service, tmp_path):
+        """测试调度器执行分句合成时同步更新就绪状态"""
+        board = AudioStatusBoard(voices_dir=str(tmp_path))
+        service = slow_service
+        scheduler = TTSScheduler(service, workers=1, max_queue=0, job_ttl=0, chunked=True, board=board)
+
+        async def run():
+            await scheduler.start()
+            scheduler.submit("您好，我是黄半仙。您的八字五行偏旺于木。", "chat", "a1")
+            events = [event async for event in audio_events(board, "a1", timeout=2.0)]
+            await scheduler.stop()
+            return events
+
+        events = asyncio.run(run())
+        assert [e["type"] for e in events] == ["segment", "segment", "complete"]
+        assert (tmp_path / "a1.mp3").exists()
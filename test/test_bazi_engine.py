@@ -0,0 +1,87 @@
+import pytest
+import json
+from datetime import datetime, date
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tools.bazi_engine import (
+    bazi_pillars, bazi_batch, bazi_from_params, format_bazi, jie_times, lunar_to_solar
+)
+
+FIXTURES = json.loads((Path(__file__).parent / "fixtures" / "bazi_charts.json").read_text(encoding="utf-8"))
+
+
+def _parse(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M")
+
+
+class TestBaziEngine:
+    """测试本地四柱排盘引擎（对照已知命盘）"""
+
+    @pytest.mark.parametrize("chart", FIXTURES["charts"], ids=lambda c: c["birth"])
+    def test_known_charts(self, chart):
+        """测试已知命盘"""
+        assert format_bazi(bazi_pillars(_parse(chart["birth"]))) == chart["bazi"]
+
+    @pytest.mark.parametrize("case", FIXTURES["lunar_to_solar"], ids=lambda c: str(c["lunar"]))
+    def test_lunar_to_solar(self, case):
+        """测试农历转公历（含闰月）"""
+        assert lunar_to_solar(*case["lunar"]).isoformat() == case["solar"]
+
+    def test_lunar_invalid(self):
+        """测试不存在的闰月/日期"""
+        with pytest.raises(ValueError):
+            lunar_to_solar(2024, 5, 1, leap=True)
+        with pytest.raises(ValueError):
+            lunar_to_solar(2024, 1, 31)
+
+    @pytest.mark.parametrize("name, expected", [
+        ("小寒", "2024-01-06 04:49"), ("立春", "2024-02-04 16:27"), ("惊蛰", "2024-03-05 10:23"),
+        ("清明", "2024-04-04 15:02"), ("立夏", "2024-05-05 08:10"), ("芒种", "2024-06-05 12:10"),
+        ("小暑", "2024-07-06 22:20"), ("立秋", "2024-08-07 08:09"), ("白露", "2024-09-07 11:11"),
+        ("寒露", "2024-10-08 03:00"), ("立冬", "2024-11-07 06:20"), ("大雪", "2024-12-06 23:17"),
+    ])
+    def test_jie_times(self, name, expected):
+        """测试2024年十二节交节时刻（与天文台公布时刻误差不超过1分钟）"""
+        moment = dict((n, m) for n, m, _ in jie_times(2024))[name]
+        assert abs((moment - _parse(expected)).total_seconds()) <= 60
+
+    @pytest.mark.parametrize("year, expected", [
+        (1990, "1990-02-04 10:14"), (2000, "2000-02-04 20:40"), (2019, "2019-02-04 11:14"),
+        (2020, "2020-02-04 17:03"), (2021, "2021-02-03 22:59"), (2022, "2022-02-04 04:51"),
+        (2023, "2023-02-04 10:42"), (2025, "2025-02-03 22:10"),
+    ])
+    def test_lichun_times(self, year, expected):
+        """测试各年立春交节时刻（误差不超过1分钟）"""
+        lichun = dict((n, m) for n, m, _ in jie_times(year))["立春"]
+        assert abs((lichun - _parse(expected)).total_seconds()) <= 60
+
+    @pytest.mark.parametrize("before, after, pillars_before, pillars_after", [
+        # 2023年立春 10:42：前一分钟仍为壬寅年丑月
+        ("2023-02-04 10:40", "2023-02-04 10:44", ("壬寅", "癸丑"), ("癸卯", "甲寅")),
+        # 2024年立春 16:27
+        ("2024-02-04 16:25", "2024-02-04 16:29", ("癸卯", "乙丑"), ("甲辰", "丙寅")),
+        # 2024年惊蛰 10:23
+        ("2024-03-05 10:21", "2024-03-05 10:25", ("甲辰", "丙寅"), ("甲辰", "丁卯")),
+    ])
+    def test_births_around_jie(self, before, after, pillars_before, pillars_after):
+        """测试交节前后几分钟出生的年柱、月柱"""
+        for birth, expected in ((before, pillars_before), (after, pillars_after)):
+            pillars = bazi_pillars(_parse(birth))
+            assert (pillars["year"], pillars["month"]) == expected
+
+    def test_from_lunar_params(self):
+        """测试按农历参数排盘"""
+        pillars = bazi_from_params(2024, 1, 1, 12, 0, lunar=True)
+        assert format_bazi(pillars) == "甲辰 丙寅 甲辰 庚午"
+
+    def test_batch_matches_scalar(self):
+        """测试批量向量化排盘与逐个计算结果一致"""
+        births = [_parse(c["birth"]) for c in FIXTURES["charts"]]
+        result = bazi_batch(births)
+        for i, birth in enumerate(births):
+            pillars = bazi_pillars(birth)
+            assert [result[k][i] for k in ("year", "month", "day", "hour")] == \
+                [pillars[k] for k in ("year", "month", "day", "hour")]
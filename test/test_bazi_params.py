@@ -0,0 +1,102 @@
+import pytest
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tools.bazi_params import extract_bazi_params, cn_to_int
+from app.tools import Mingli_tools
+
+class TestBaziParams:
+    """测试八字排盘参数的规则提取"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("我叫张三，男，1995年3月12日早上8点出生",
+         {"name": "张三", "sex": 0, "type": 1, "year": 1995, "month": 3, "day": 12, "hours": 8, "minute": 0}),
+        ("姓名：李四 性别：女 1995-03-12 08:00",
+         {"name": "李四", "sex": 1, "type": 1, "year": 1995, "month": 3, "day": 12, "hours": 8, "minute": 0}),
+        ("我叫赵敏，女，公历2001年10月1日下午3点半出生",
+         {"name": "赵敏", "sex": 1, "type": 1, "year": 2001, "month": 10, "day": 1, "hours": 15, "minute": 30}),
+        ("我叫王小明，男，农历一九九零年腊月初八子时出生",
+         {"name": "王小明", "sex": 0, "type": 0, "year": 1990, "month": 12, "day": 8, "hours": 0, "minute": 0}),
+    ])
+    def test_extract_complete(self, text, expected):
+        """测试常见中文/ISO日期写法"""
+        params, missing = extract_bazi_params(text)
+        assert missing == []
+        for key, value in expected.items():
+            assert params[key] == value
+
+    def test_lunar_leap_month(self):
+        """测试农历闰月"""
+        params, missing = extract_bazi_params("我叫刘备，男，2020年闰四月廿三晚上9点15分")
+        assert params["type"] == 0 and params["leap_month"] is True
+        assert (params["month"], params["day"], params["hours"], params["minute"]) == (4, 23, 21, 15)
+
+    def test_missing_fields(self):
+        """测试缺少必需字段时返回缺失列表（交给大模型兜底）"""
+        _, missing = extract_bazi_params("帮我算八字")
+        assert set(missing) == {"year", "month", "day"}
+        # 本地排盘只需要出生日期，姓名、性别可缺省
+        _, missing = extract_bazi_params("1995年3月12日出生，帮我排盘")
+        assert missing == []
+
+    @pytest.mark.parametrize("text, expected", [
+        ("我叫张三，男，1995年3月12日 晚上12点", (1995, 3, 13, 0)),
+        ("我叫张三，男，1995年3月31日半夜12点出生", (1995, 4, 1, 0)),
+        ("我叫张三，男，1999年12月31日夜里12点", (2000, 1, 1, 0)),
+        ("我叫张三，男，1995年3月12日中午12点", (1995, 3, 12, 12)),
+        ("我叫张三，男，1995年3月12日凌晨12点", (1995, 3, 12, 0)),
+    ])
+    def test_midnight(self, text, expected):
+        """测试“晚上12点”按次日0点处理（日期顺延），中午12点不变"""
+        params, _ = extract_bazi_params(text)
+        assert (params["year"], params["month"], params["day"], params["hours"]) == expected
+
+    @pytest.mark.parametrize("text, expected", [
+        ("1995年3月12日出生，请说详细一点", (0, 0)),
+        ("1995年3月12日出生，快一点，分析一下", (0, 0)),
+        ("1995年3月12日早上八点出生，说详细一点", (8, 0)),
+        ("1995年3月12日三点半出生", (3, 30)),
+        ("1995年3月12日三点十五分出生", (3, 15)),
+        ("1995年3月12日8点出生，请说详细一点", (8, 0)),
+    ])
+    def test_colloquial_yidian_not_time(self, text, expected):
+        """测试口语“一点”不当作出生时间；中文数字时间需带时段词或分钟"""
+        params, missing = extract_bazi_params(text)
+        assert missing == [] and (params["hours"], params["minute"]) == expected
+
+    def test_lunar_midnight_rolls_month(self):
+        """测试农历月末的晚上12点顺延到下月初一"""
+        params, _ = extract_bazi_params("我叫王小明，男，农历一九九零年腊月三十晚上12点")
+        assert (params["year"], params["month"], params["day"], params["hours"]) == (1991, 1, 1, 0)
+
+    @pytest.mark.parametrize("text", ["我叫张三，男，1990年2月30日早上8点", "我叫张三，男，1991-02-29 08:00",
+                                      "我叫张三，男，农历1990年闰四月初一"])
+    def test_invalid_date_missing(self, text):
+        """测试不存在的日期视为缺失"""
+        params, missing = extract_bazi_params(text)
+        assert "year" not in params and {"year", "month", "day"} <= set(missing)
+
+    def test_cn_to_int(self):
+        """测试中文数字转换"""
+        assert cn_to_int("一九九五") == 1995
+        assert cn_to_int("十二") == 12
+        assert cn_to_int("廿三") == 23
+        assert cn_to_int("初十") == 10
+        assert cn_to_int("正") == 1
+
+
+class TestLocalBazi:
+    """测试八字工具的本地排盘路径"""
+
+    def test_no_llm_without_name(self, monkeypatch):
+        """测试没有“我叫”等姓名前缀时仍在本地排盘，不调用大模型提取参数"""
+        monkeypatch.setattr(Mingli_tools, "_bazi_params_chain", lambda: pytest.fail("不应调用大模型提取"))
+        result = Mingli_tools.bazi_cesuan.invoke("张三，男，1995年3月12日8点")
+        assert result.startswith("八字为：")
+
+    def test_remote_defaults(self):
+        """测试远程排盘缺少姓名、性别时补默认值"""
+        data = Mingli_tools._remote_data({"year": 1995, "month": 3, "day": 12, "leap_month": True})
+        assert data["name"] and data["sex"] == 0 and "leap_month" not in data
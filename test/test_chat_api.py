@@ -0,0 +1,196 @@
+import pytest
+import json
+from pathlib import Path
+import sys
+from typing import List
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+import app.main as main
+from app.answer_cache import AnswerCache
+from app.chat_history import LocalChatMessageHistory
+from app.config import config
+
+
+class RecordingChatModel(FakeListChatModel):
+    """按顺序返回固定回答的聊天模型，记录每次调用的方式（sync/async）与收到的消息"""
+    calls: List = []
+
+    def _call(self, messages, *args, **kwargs):
+        self.calls.append(("sync", messages))
+        return super()._call(messages, *args, **kwargs)
+
+    def _stream(self, messages, *args, **kwargs):
+        self.calls.append(("sync", messages))
+        return super()._stream(messages, *args, **kwargs)
+
+    def _astream(self, messages, *args, **kwargs):
+        self.calls.append(("async", messages))
+        return super()._astream(messages, *args, **kwargs)
+
+    async def _agenerate(self, messages, *args, **kwargs):
+        self.calls.append(("async", messages))
+        content = FakeListChatModel._call(self, messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+@pytest.fixture
+def fake_model():
+    return RecordingChatModel(responses=["您好，我是黄半仙。"], calls=[])
+
+
+@pytest.fixture
+def master(monkeypatch, fake_model):
+    """用假模型重建 Master 单例（进程内会话历史、只做精确匹配的回答缓存）"""
+    monkeypatch.setattr(main, "get_chat_model", lambda **kwargs: fake_model)
+    monkeypatch.setattr(main.Master, "_instance", None)
+    monkeypatch.setattr(main.Master, "_check_redis", lambda self: False)
+    master = main.Master()
+    master.answer_cache = AnswerCache(similarity=0)
+    return master
+
+
+@pytest.fixture
+def client(master):
+    # 不进入 with 块：不触发启动事件（不启动语音合成与入库 worker）
+    return TestClient(main.app)
+
+
+def parse_sse(text: str) -> list:
+    """把 SSE 响应体解析为事件列表"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        data = [line[len("data: "):] for line in block.splitlines() if line.startswith("data: ")]
+        if data:
+            events.append(json.loads("".join(data)))
+    return events
+
+
+class TestChatStream:
+    """测试流式聊天接口（SSE）"""
+
+    def test_tokens_then_final(self, client):
+        """测试先逐个推送回答token，最后推送带uid与语音UID的最终事件"""
+        response = client.post("/chat/stream", json={"query": "你好", "uid": "u1"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_sse(response.text)
+        assert [e["type"] for e in events[:-1]] == ["token"] * len(events[:-1])
+        assert "".join(e["content"] for e in events[:-1]) == "您好，我是黄半仙。"
+        final = events[-1]
+        assert final["type"] == "final" and final["message"] == "您好，我是黄半仙。"
+        assert final["uid"] == "u1" and final["audio_uid"].startswith("u1_")
+
+    def test_generates_uid(self, client):
+        """测试未携带uid时由后端生成并在最终事件中回传"""
+        final = parse_sse(client.post("/chat/stream", json={"query": "你好"}).text)[-1]
+        assert final["uid"] and final["audio_uid"].startswith(final["uid"] + "_")
+
+
+class TestAsyncChat:
+    """测试 /chat 的异步Agent链路"""
+
+    def test_chat_uses_async_path(self, client, master, fake_model, monkeypatch):
+        """测试 /chat 走 arun，模型只经异步接口调用"""
+        monkeypatch.setattr(main.Master, "run", lambda self, query: pytest.fail("/chat 不应调用同步 run"))
+        data = client.post("/chat", json={"query": "你好", "uid": "u1"}).json()
+        assert data["status"] == "success" and data["message"] == "您好，我是黄半仙。"
+        assert data["uid"] == "u1" and data["audio_uid"].startswith("u1_")
+        assert fake_model.calls and all(mode == "async" for mode, _ in fake_model.calls)
+        assert [m.content for m in master.get_history("u1").messages] == ["你好", "您好，我是黄半仙。"]
+
+    def test_llm_emotion_fallback_is_async(self, client, fake_model, monkeypatch):
+        """测试情绪识别大模型兜底在异步链路中使用异步调用"""
+        monkeypatch.setattr(config, "EMOTION_LLM_FALLBACK", True)
+        monkeypatch.setattr(config, "EMOTION_MIN_CONFIDENCE", 1.1)
+        client.post("/chat", json={"query": "你好", "uid": "u1"})
+        assert len(fake_model.calls) == 2 and all(mode == "async" for mode, _ in fake_model.calls)
+
+    def test_history_pruned_and_per_user(self, client, master, fake_model):
+        """测试 arun 只带入当前用户的历史，且按 MAX_TOKEN_LIMIT 截取"""
+        long_history = LocalChatMessageHistory()
+        for i in range(20):
+            long_history.add_message(HumanMessage(content=f"第{i}问" + "问" * 200))
+            long_history.add_message(AIMessage(content=f"第{i}答" + "答" * 200))
+        master._local_histories["u2"] = long_history
+        other = LocalChatMessageHistory()
+        other.add_message(HumanMessage(content="别人的问题"))
+        master._local_histories["u3"] = other
+
+        client.post("/chat", json={"query": "你好", "uid": "u2"})
+        history = [m.content for m in fake_model.calls[-1][1][1:-1]]  # 去掉系统提示与本轮输入
+        assert 0 < len(history) < 40 and "第19答" in history[-1]
+        assert sum(len(content) for content in history) <= config.MAX_TOKEN_LIMIT
+        assert "别人的问题" not in history
+
+
+class TestAnswerCacheGating:
+    """测试回答缓存只用于没有会话历史的请求"""
+
+    def test_new_session_hits_cache(self, client, master, fake_model):
+        """测试新会话的通用问题命中缓存，不再调用模型"""
+        client.post("/chat", json={"query": "八字是什么", "uid": "u1"})
+        calls = len(fake_model.calls)
+        data = client.post("/chat", json={"query": "八字是什么", "uid": "u2"}).json()
+        assert data["message"] == "您好，我是黄半仙。" and len(fake_model.calls) == calls
+
+    def test_user_with_history_skips_cache(self, client, master, fake_model):
+        """测试已有聊天历史或摘要的用户不命中缓存，问题交给模型结合上下文回答"""
+        client.post("/chat", json={"query": "八字是什么", "uid": "u1"})
+        history = LocalChatMessageHistory()
+        history.add_message(HumanMessage(content="我是1990年出生的"))
+        history.add_message(AIMessage(content="好的，记下了"))
+        master._local_histories["u2"] = history
+        summarized = LocalChatMessageHistory()
+        summarized.summary = {"summary": "用户属马", "facts": []}
+        master._local_histories["u3"] = summarized
+
+        for uid in ("u2", "u3"):
+            calls = len(fake_model.calls)
+            client.post("/chat", json={"query": "八字是什么", "uid": uid})
+            assert len(fake_model.calls) == calls + 1
+        assert master.answer_cache.stats()["exact_hits"] == 0
+
+
+class RecordingScheduler:
+    """记录提交的语音任务（文本、语气风格、audio_uid）"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, text, voicestyle, audio_uid, owner=None):
+        self.jobs.append((text, voicestyle, audio_uid))
+
+
+class TestVoiceStyle:
+    """测试语音语气取自本次请求识别的情绪，而不是共享 Master 单例上的状态"""
+
+    @pytest.fixture
+    def scheduler(self, monkeypatch):
+        scheduler = RecordingScheduler()
+        monkeypatch.setattr(main, "get_tts_scheduler", lambda: scheduler)
+        return scheduler
+
+    def test_interleaved_request_does_not_change_style(self, client, master, scheduler, monkeypatch):
+        """测试本次回答生成后、提交语音前另一个请求切换了情绪，语音仍用本次请求的语气"""
+        arun = main.Master.arun
+
+        async def arun_then_other_request(self, query):
+            result = await arun(self, query)
+            await arun(self, "今天太开心了哈哈")  # 其他用户的请求在此期间完成
+            return result
+
+        monkeypatch.setattr(main.Master, "arun", arun_then_other_request)
+        client.post("/chat", json={"query": "我好难过，心情很差", "uid": "u1"})
+        assert master.qingxu == "happy"
+        assert scheduler.jobs[-1][1] == "friendly"
+
+    def test_stream_uses_request_mood(self, client, scheduler):
+        """测试流式接口按最终事件带回的情绪提交语音"""
+        client.post("/chat/stream", json={"query": "今天太开心了哈哈", "uid": "u1"})
+        assert scheduler.jobs[-1][1] == "happy"
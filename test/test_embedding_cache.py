@@ -0,0 +1,84 @@
+import pytest
+import asyncio
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from langchain_core.embeddings import Embeddings
+from app.embedding_cache import CachedEmbeddings, EmbeddingStore
+
+
+class CountingEmbeddings(Embeddings):
+    """按文本长度生成向量，并记录实际被计算的文本"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[float(len(t)), 0.5, -1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "emb.sqlite3"), max_rows=100)
+    yield store
+    store.close()
+
+
+class TestEmbeddingCache:
+    """测试向量缓存"""
+
+    def test_repeat_documents_not_reembedded(self, store):
+        """测试重复文本（包括同一批次内的重复）只计算一次"""
+        inner = CountingEmbeddings()
+        cached = CachedEmbeddings(inner, store, model="m")
+        first = cached.embed_documents(["风水", "八字命理", "风水"])
+        second = cached.embed_documents(["八字命理", "2025年运势"])
+        assert inner.calls == ["风水", "八字命理", "2025年运势"]
+        assert first[0] == first[2] == [2.0, 0.5, -1.0]
+        assert second[0] == first[1]
+
+    def test_disk_cache_survives_restart(self, store):
+        """测试内存缓存清空后从磁盘命中"""
+        cached = CachedEmbeddings(CountingEmbeddings(), store, model="m")
+        vector = cached.embed_query("2025年运势")
+        inner = CountingEmbeddings()
+        reopened = CachedEmbeddings(inner, store, model="m")
+        assert reopened.embed_query("2025年运势") == vector
+        assert inner.calls == []
+        assert reopened.stats()["disk_hits"] == 1
+
+    def test_model_in_key(self, store):
+        """测试不同模型的向量互不复用"""
+        CachedEmbeddings(CountingEmbeddings(), store, model="a").embed_query("风水")
+        inner = CountingEmbeddings()
+        CachedEmbeddings(inner, store, model="b").embed_query("风水")
+        assert inner.calls == ["风水"]
+
+    def test_size_bounded(self, tmp_path):
+        """测试超过行数上限时淘汰"""
+        store = EmbeddingStore(str(tmp_path / "small.sqlite3"), max_rows=3)
+        cached = CachedEmbeddings(CountingEmbeddings(), store, model="m", memory_size=1)
+        cached.embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+        assert len(store) == 3
+        store.close()
+
+    def test_async_query(self, store):
+        """测试异步查询命中缓存"""
+        inner = CountingEmbeddings()
+        cached = CachedEmbeddings(inner, store, model="m")
+
+        async def run():
+            first = await cached.aembed_query("解梦")
+            second = await cached.aembed_query("解梦")
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first == second
+        assert inner.calls == ["解梦"]
+        assert cached.stats()["memory_hits"] == 1
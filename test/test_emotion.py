@@ -0,0 +1,45 @@
+import pytest
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.emotion import classify_emotion, normalize_query
+
+class TestEmotion:
+    """测试本地情绪识别"""
+
+    @pytest.mark.parametrize("query, expected", [
+        ("最近失恋了，好难过", "depressed"),
+        ("我今天升职加薪了，太开心啦", "happy"),
+        ("帮我排一下八字", "neutral"),
+        ("你这个骗子", "abusive"),
+        ("我一点也不开心", "depressed"),
+    ])
+    def test_classify_labels(self, query, expected):
+        """测试常见输入的情绪标签"""
+        label, confidence = classify_emotion(query)
+        assert label == expected
+        assert 0 <= confidence <= 1
+
+    @pytest.mark.parametrize("query", ["梦见杀人", "我在政府上班", "被骗子骗了", "我觉得自己是个废物"])
+    def test_ambiguous_keywords_not_priority(self, query):
+        """测试梦境、日常叙述中的歧义词不直接判为高风险类别，置信度低于兜底阈值"""
+        label, confidence = classify_emotion(query)
+        assert label not in ("abusive", "inappropriate", "sensitive")
+        assert confidence < 0.6
+
+    @pytest.mark.parametrize("query", ["你就是个骗子", "你们都是废物", "傻逼算命的"])
+    def test_targeted_abuse(self, query):
+        """测试冲着对方说的辱骂与明确脏话仍直接判为辱骂"""
+        assert classify_emotion(query) == ("abusive", 0.95)
+
+    def test_mixed_emotion_low_confidence(self):
+        """测试正负情绪混合时置信度降低"""
+        label, confidence = classify_emotion("结婚了很开心，但是压力大好焦虑")
+        assert confidence < 0.6
+
+    def test_normalize_query(self):
+        """测试输入归一化（用于缓存键）"""
+        assert normalize_query("  ＨＥＬＬＯ 你好 ") == "hello你好"
+        assert classify_emotion("帮我 排八字") == classify_emotion("帮我排八字")
@@ -0,0 +1,210 @@
+import pytest
+import asyncio
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app import ingestion
+from app.config import config
+from app.ingestion import (
+    FingerprintStore, chunk_point_id, ingest_url, ingest_urls, shutdown_split_pool, split_page, summarize
+)
+
+
+PAGES = {
+    "/fengshui": '<html lang="zh"><head><title>风水</title></head><body>'
+                 + "东南方位宜摆放绿植。" * 150 + "</body></html>",
+}
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """返回 PAGES 中的页面，支持 ETag 条件请求"""
+    requests_seen = []
+
+    def do_GET(self):
+        body = PAGES[self.path].encode("utf-8")
+        etag = f'"{hash(body)}"'
+        PageHandler.requests_seen.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietStaticHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class MemoryKnowledgeBase:
+    """只记录点ID与文档的知识库（不做嵌入）"""
+
+    def __init__(self):
+        self.points = {}
+        self.embedded = 0
+
+    def source_point_ids(self, source):
+        return {pid for pid, doc in self.points.items() if doc.metadata["source"] == source}
+
+    def add_documents(self, documents, ids=None, on_progress=None):
+        self.embedded += len(documents)
+        self.points.update(zip(ids, documents))
+        if on_progress:
+            on_progress("embedded", len(documents))
+            on_progress("stored", len(documents))
+        return len(documents)
+
+    def delete_points(self, ids):
+        for pid in ids:
+            del self.points[pid]
+        return len(ids)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def static_site(tmp_path):
+    """本地静态站点：若干文章页 + sitemap.xml"""
+    site = tmp_path / "site"
+    site.mkdir()
+    topics = ["生肖属相", "家居风水", "周公解梦", "流年运势"]
+    for i, topic in enumerate(topics):
+        body = "\n\n".join(f"{topic}第{j}段：" + "吉凶宜忌。" * 80 for j in range(3))
+        (site / f"article{i}.html").write_text(
+            f"<html><head><title>{topic}</title></head><body>{body}</body></html>", encoding="utf-8")
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0),
+                                functools.partial(QuietStaticHandler, directory=str(site)))
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    locs = "".join(f"<url><loc>{base}/article{i}.html</loc></url>" for i in range(len(topics)))
+    (site / "sitemap.xml").write_text(
+        f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>',
+        encoding="utf-8")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield base
+    httpd.shutdown()
+
+
+class TestIngestion:
+    """测试增量入库"""
+
+    def test_point_id_stable(self):
+        """测试点ID只由来源和内容决定"""
+        assert chunk_point_id("http://a", "风水") == chunk_point_id("http://a", "风水")
+        assert chunk_point_id("http://a", "风水") != chunk_point_id("http://b", "风水")
+
+    def test_split_dedup(self):
+        """测试同一页面内重复片段只保留一份"""
+        paragraph = "东南方位宜摆放绿植。" * 60
+        chunks = split_page("\n\n".join([paragraph] * 3), {"source": "http://a"})
+        assert len(chunks) == 1
+
+    def test_reingest_unchanged_is_noop(self, server, tmp_path):
+        """测试重复入库未变化的页面不再写入，且使用条件请求"""
+        store = FingerprintStore(str(tmp_path / "ingest.sqlite3"))
+        kb = MemoryKnowledgeBase()
+        url = server + "/fengshui"
+
+        first = ingest_url(url, store=store, knowledge_base=kb)
+        assert first.status == "indexed"
+        assert first.added == len(kb.points) > 0
+
+        second = ingest_url(url, store=store, knowledge_base=kb)
+        assert second.status == "unchanged"
+        assert kb.embedded == first.added
+        assert PageHandler.requests_seen[-1] is not None
+        store.close()
+
+    def test_changed_page_replaces_stale_chunks(self, server, tmp_path):
+        """测试页面变化时只新增变化的片段并删除旧片段"""
+        store = FingerprintStore(str(tmp_path / "ingest.sqlite3"))
+        kb = MemoryKnowledgeBase()
+        url = server + "/fengshui"
+        ingest_url(url, store=store, knowledge_base=kb)
+        before = set(kb.points)
+
+        original = PAGES["/fengshui"]
+        PAGES["/fengshui"] = original.replace("</body>", "西北方位忌堆放杂物。</body>")
+        try:
+            result = ingest_url(url, store=store, knowledge_base=kb)
+        finally:
+            PAGES["/fengshui"] = original
+        assert result.status == "indexed"
+        assert result.added == result.deleted == 1
+        assert len(set(kb.points) & before) == len(before) - 1
+        store.close()
+
+
+class TestBatchIngestion:
+    """测试批量入库"""
+
+    def test_sitemap_batch_reports_per_url(self, static_site, tmp_path, monkeypatch):
+        """测试sitemap展开、进程池分割、失败URL单独报告"""
+        monkeypatch.setattr(config, "INGEST_SPLIT_POOL_MIN_PAGES", 2)
+        store = FingerprintStore(str(tmp_path / "ingest.sqlite3"))
+        kb = MemoryKnowledgeBase()
+        missing = static_site + "/missing.html"
+        try:
+            results = asyncio.run(ingest_urls([missing], sitemap=static_site + "/sitemap.xml",
+                                              store=store, knowledge_base=kb, concurrency=2, split_workers=2))
+        finally:
+            shutdown_split_pool()
+        by_url = {r.url: r for r in results}
+        assert by_url[missing].status == "failed"
+        assert summarize(results)["indexed"] == 4
+        assert summarize(results)["added"] == len(kb.points) == sum(r.chunks for r in results) > 4
+        store.close()
+
+    def test_batch_reingest_unchanged(self, static_site, tmp_path):
+        """测试再次批量入库时未变化的页面不再写入"""
+        store = FingerprintStore(str(tmp_path / "ingest.sqlite3"))
+        kb = MemoryKnowledgeBase()
+        urls = [f"{static_site}/article{i}.html" for i in range(4)]
+        asyncio.run(ingest_urls(urls, store=store, knowledge_base=kb, split_workers=0))
+        embedded = kb.embedded
+        results = asyncio.run(ingest_urls(urls, store=store, knowledge_base=kb, split_workers=0))
+        assert [r.status for r in results] == ["unchanged"] * 4
+        assert kb.embedded == embedded
+        store.close()
+
+    def test_sitemap_and_split_failures_are_per_url(self, static_site, tmp_path, monkeypatch):
+        """测试sitemap读取失败、单个页面分割失败只记在对应URL上"""
+        original = ingestion.split_page
+
+        def flaky_split(text, metadata):
+            if metadata["source"].endswith("article1.html"):
+                raise ValueError("分割出错")
+            return original(text, metadata)
+
+        monkeypatch.setattr(ingestion, "split_page", flaky_split)
+        store = FingerprintStore(str(tmp_path / "ingest.sqlite3"))
+        kb = MemoryKnowledgeBase()
+        urls = [f"{static_site}/article{i}.html" for i in range(3)]
+        bad_sitemap = static_site + "/no-sitemap.xml"
+        results = asyncio.run(ingest_urls(urls, sitemap=bad_sitemap, store=store, knowledge_base=kb,
+                                          split_workers=0))
+        by_url = {r.url: r for r in results}
+        assert by_url[bad_sitemap].status == "failed" and "sitemap" in by_url[bad_sitemap].error
+        assert by_url[urls[1]].status == "failed" and "分割出错" in by_url[urls[1]].error
+        assert by_url[urls[0]].status == by_url[urls[2]].status == "indexed"
+        store.close()
@@ -0,0 +1,100 @@
+import pytest
+import asyncio
+import threading
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.ingestion import FingerprintStore
+from app.jobs import IngestJobQueue, JobStore, QUEUED, RUNNING, SUCCEEDED, FAILED
+from test_ingestion import MemoryKnowledgeBase, static_site  # noqa: F401  复用静态站点夹具
+from fastapi.testclient import TestClient
+import app.main as main
+
+
+class TestIngestJobs:
+    """测试后台入库任务队列"""
+
+    def test_job_progress_and_result(self, static_site, tmp_path):
+        """测试提交后立即返回ID，完成后记录进度与每个URL的结果"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        kb = MemoryKnowledgeBase()
+        queue = IngestJobQueue(store, workers=2, ingest_options={
+            "knowledge_base": kb, "split_workers": 0,
+            "store": FingerprintStore(str(tmp_path / "ingest.sqlite3"))})
+
+        async def run():
+            await queue.start()
+            job_ids = [queue.submit([f"{static_site}/article{i}.html"]) for i in range(2)]
+            job_ids.append(queue.submit([f"{static_site}/missing.html"]))
+            assert store.get(job_ids[0])["status"] == QUEUED
+            await queue.join()
+            await queue.stop()
+            return job_ids
+
+        job_ids = asyncio.run(run())
+        first = store.get(job_ids[0])
+        assert first["status"] == SUCCEEDED
+        assert first["progress"]["fetched"] == 1
+        assert first["progress"]["chunks"] == first["progress"]["stored"] > 0
+        assert first["result"]["results"][0]["status"] == "indexed"
+        assert store.get(job_ids[2])["status"] == FAILED
+        store.close()
+
+    def test_unfinished_jobs_requeued(self, static_site, tmp_path):
+        """测试重启后排队中/执行中的任务重新执行"""
+        path = str(tmp_path / "jobs.sqlite3")
+        store = JobStore(path)
+        interrupted = store.create([f"{static_site}/article0.html"])
+        store.update(interrupted, status=RUNNING)
+        store.close()
+
+        store = JobStore(path)
+        queue = IngestJobQueue(store, workers=1, ingest_options={
+            "knowledge_base": MemoryKnowledgeBase(), "split_workers": 0,
+            "store": FingerprintStore(str(tmp_path / "ingest.sqlite3"))})
+
+        async def run():
+            await queue.start()
+            await queue.join()
+            await queue.stop()
+
+        asyncio.run(run())
+        assert store.get(interrupted)["status"] == SUCCEEDED
+        store.close()
+
+    def test_submit_from_thread_wakes_worker(self, static_site, tmp_path):
+        """测试在其他线程中提交（同步接口运行在线程池）时空闲的 worker 立即被唤醒"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        queue = IngestJobQueue(store, workers=1, ingest_options={
+            "knowledge_base": MemoryKnowledgeBase(), "split_workers": 0,
+            "store": FingerprintStore(str(tmp_path / "ingest.sqlite3"))})
+
+        async def run():
+            await queue.start()
+            done = asyncio.Event()
+            run_job = queue.run_job
+
+            async def run_and_notify(job_id):
+                await run_job(job_id)
+                done.set()
+
+            queue.run_job = run_and_notify
+            job_ids = []
+            submitter = threading.Timer(0.05, lambda: job_ids.append(
+                queue.submit([f"{static_site}/article0.html"])))
+            submitter.start()
+            # 事件循环此时空闲，只有线程安全的入队才能及时唤醒它
+            await asyncio.wait_for(done.wait(), timeout=1)
+            await queue.stop()
+            return job_ids[0]
+
+        assert store.get(asyncio.run(run()))["status"] == SUCCEEDED
+        store.close()
+
+    def test_missing_job_returns_404(self, tmp_path, monkeypatch):
+        """测试查询不存在的任务返回404"""
+        monkeypatch.setattr(main, "get_job_queue", lambda: IngestJobQueue(JobStore(str(tmp_path / "jobs.sqlite3"))))
+        response = TestClient(main.app).get("/jobs/not-a-job")
+        assert response.status_code == 404 and response.json()["status"] == "error"
@@ -0,0 +1,40 @@
+import pytest
+import numpy as np
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.knowledge_base import mmr_rerank
+
+
+class TestMMR:
+    """测试向量化MMR重排"""
+
+    def test_pure_relevance(self):
+        """测试 lambda=1 时按相似度排序"""
+        candidates = [[0.0, 1.0], [1.0, 0.1], [1.0, 0.5]]
+        assert mmr_rerank([1.0, 0.0], candidates, k=3, lambda_mult=1.0) == [1, 2, 0]
+
+    def test_diversity(self):
+        """测试重复候选被多样性惩罚"""
+        candidates = [[1.0, 0.0], [0.99, 0.01], [0.6, 0.8]]
+        assert mmr_rerank([1.0, 0.0], candidates, k=2, lambda_mult=0.3) == [0, 2]
+
+    def test_matches_reference(self):
+        """测试与逐个计算的参考实现一致"""
+        rng = np.random.default_rng(0)
+        query, candidates = rng.normal(size=8), rng.normal(size=(20, 8))
+
+        def cos(a, b):
+            return float(a @ b / np.linalg.norm(a) / np.linalg.norm(b))
+
+        expected = []
+        while len(expected) < 5:
+            best = max((i for i in range(20) if i not in expected), key=lambda i: 0.3 * cos(query, candidates[i])
+                       - 0.7 * max([cos(candidates[i], candidates[j]) for j in expected], default=0.0))
+            expected.append(best)
+        assert mmr_rerank(query, candidates, k=5, lambda_mult=0.3) == expected
+
+    def test_empty(self):
+        assert mmr_rerank([1.0, 0.0], [], k=3) == []
@@ -0,0 +1,95 @@
+import pytest
+import asyncio
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.knowledge_base import KnowledgeBase
+from app.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+DOCS = {
+    "a": "属鼠的人2025年运势平稳，财运在下半年有起色。",
+    "b": "家居风水讲究东南方位摆放绿植，可以旺财。",
+    "c": "梦见飞翔通常象征摆脱束缚，心情舒畅。",
+}
+
+
+class ConstantEmbeddings(Embeddings):
+    """所有文本返回相同向量；broken 为 True 时模拟 embeddings 服务不可用"""
+
+    def __init__(self):
+        self.broken = False
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        if self.broken:
+            raise ConnectionError("embeddings down")
+        return [1.0, 0.0, 0.0]
+
+
+class TestLexicalIndex:
+    """测试BM25关键词索引"""
+
+    def test_tokenize(self):
+        """测试中文二元组与英文整词"""
+        assert tokenize("东南方位") == ["东南", "南方", "方位"]
+        assert tokenize("鼠 2025年") == ["鼠", "年", "2025"]
+
+    def test_bm25_ranking_and_remove(self):
+        """测试精确词命中排在前面，删除后不再返回"""
+        index = BM25Index()
+        for doc_id, text in DOCS.items():
+            index.add(doc_id, text)
+        assert index.search("东南方位")[0][0] == "b"
+        assert index.search("属鼠运势")[0][0] == "a"
+        index.remove("b")
+        assert all(doc_id != "b" for doc_id, _ in index.search("东南方位"))
+        assert len(index) == 2
+
+    def test_rrf(self):
+        """测试两路都靠前的结果融合后排第一"""
+        assert reciprocal_rank_fusion([["x", "y"], ["y", "z"]])[0] == "y"
+
+
+class TestHybridKnowledgeBase:
+    """测试知识库混合检索"""
+
+    @pytest.fixture
+    def knowledge_base(self, tmp_path):
+        kb = KnowledgeBase(path=str(tmp_path / "qdrant"), embeddings=ConstantEmbeddings())
+        yield kb
+        kb.close()
+
+    def test_index_follows_upsert_and_reopen(self, knowledge_base):
+        """测试写入/删除同步到BM25索引，重新打开后由Qdrant重建"""
+        docs = [Document(page_content=text, metadata={"source": doc_id}) for doc_id, text in DOCS.items()]
+        knowledge_base.add_documents(docs)
+        assert len(knowledge_base.lexical) == 3
+        stale = knowledge_base.source_point_ids("c")
+        knowledge_base.delete_points(stale)
+        knowledge_base.reopen()
+        assert len(knowledge_base.lexical) == 2
+
+    def test_lexical_fallback(self, knowledge_base):
+        """测试embeddings服务不可用时仍能按关键词检索"""
+        docs = [Document(page_content=text, metadata={"source": doc_id}) for doc_id, text in DOCS.items()]
+        knowledge_base.add_documents(docs)
+        knowledge_base.embeddings.broken = True
+        result = knowledge_base.search("东南方位风水", k=1)
+        assert result[0].metadata["source"] == "b"
+        result = asyncio.run(knowledge_base.asearch("梦见飞翔", k=1))
+        assert result[0].metadata["source"] == "c"
+
+    def test_hybrid_includes_exact_terms(self, knowledge_base):
+        """测试向量无法区分时，关键词命中的片段进入融合结果"""
+        docs = [Document(page_content=text, metadata={"source": doc_id}) for doc_id, text in DOCS.items()]
+        knowledge_base.add_documents(docs)
+        result = knowledge_base.search("属鼠 2025年运势", k=2)
+        assert len(result) == 2
+        assert "a" in [doc.metadata["source"] for doc in result]
@@ -0,0 +1,86 @@
+import pytest
+import asyncio
+import json
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+fakeredis = pytest.importorskip("fakeredis")
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+from app.session_store import RedisSessionHistory, SessionStore, decode_message, encode_message
+from app.token_memory import TOKEN_COUNT_KEY, TokenBufferMemory
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """统计往返次数（pipeline 整体算一次）"""
+
+    round_trips = 0
+
+    def execute_command(self, *args, **options):
+        CountingRedis.round_trips += 1
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        CountingRedis.round_trips += 1
+        return super().pipeline(transaction, shard_hint)
+
+
+@pytest.fixture
+def store():
+    server = fakeredis.FakeServer()
+    CountingRedis.round_trips = 0
+    return SessionStore(ttl=60, client=CountingRedis(server=server),
+                        async_client=fakeredis.aioredis.FakeRedis(server=server))
+
+
+class TestSessionStore:
+    """测试Redis会话存储"""
+
+    def test_encoding_roundtrip_and_size(self):
+        """测试紧凑编码可还原，长消息压缩后比原JSON小"""
+        message = AIMessage(content="我命由我不由天。" * 40, additional_kwargs={TOKEN_COUNT_KEY: 12})
+        blob = encode_message(message)
+        assert blob[:1] == b"z"
+        assert len(blob) < len(json.dumps(message_to_dict(message)))
+        restored = decode_message(blob)
+        assert restored == message
+        assert decode_message(encode_message(HumanMessage(content="你好"))).content == "你好"
+
+    def test_append_load_single_round_trip(self, store):
+        """测试追加与读取（消息 + 摘要）各一次往返"""
+        store.append("u1", [HumanMessage(content="问"), AIMessage(content="答")])
+        assert CountingRedis.round_trips == 1
+        summary, messages = store.load("u1")
+        assert CountingRedis.round_trips == 2
+        assert summary is None and [m.content for m in messages] == ["问", "答"]
+
+    def test_ttl_renewed(self, store):
+        """测试会话键带过期时间"""
+        store.append("u1", [HumanMessage(content="问")])
+        assert 0 < store.client.ttl(store.messages_key("u1")) <= 60
+
+    def test_async_history_and_compact(self, store):
+        """测试异步读写、摘要与裁剪"""
+        history = RedisSessionHistory(store, "u2")
+
+        async def run():
+            for i in range(5):
+                await history.aadd_messages([HumanMessage(content=f"问{i}"), AIMessage(content=f"答{i}")])
+            await history.acompact({"summary": "聊过财运", "facts": {"姓名": "张三"}}, keep=2, seen=8)
+            return await history.acontext_messages()
+
+        context = asyncio.run(run())
+        assert "张三" in context[0].content
+        # 读到8条之后新追加的2条与最近2条一起保留
+        assert [m.content for m in context[1:]] == ["问3", "答3", "问4", "答4"]
+        assert store.client.ttl(store.summary_key("u2")) > 0
+
+    def test_token_memory_on_store(self, store):
+        """测试token数随消息保存，读取时不需要重新计算"""
+        history = RedisSessionHistory(store, "u3")
+        memory = TokenBufferMemory(memory_key="chat_history", return_messages=True, output_key="output",
+                                   counter=len, chat_memory=history)
+        memory.save_context({"input": "问题"}, {"output": "回答"})
+        messages = memory.load_memory_variables({})["chat_history"]
+        assert [m.additional_kwargs[TOKEN_COUNT_KEY] for m in messages] == [6, 6]
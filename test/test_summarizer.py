@@ -0,0 +1,82 @@
+import pytest
+import asyncio
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from app.chat_history import LocalChatMessageHistory
+from app.summarizer import ConversationSummarizer, extract_facts, parse_summary
+
+
+def make_history(turns: int):
+    history = LocalChatMessageHistory()
+    history.add_user_message("我叫张三，男，1990年5月20日早上8点出生")
+    history.add_ai_message("好的，张三先生")
+    for i in range(turns - 1):
+        history.add_user_message(f"问题{i}")
+        history.add_ai_message(f"回答{i}")
+    return history
+
+
+class TestSummarizer:
+    """测试会话历史滚动总结"""
+
+    @pytest.fixture
+    def summarizer(self):
+        reply = '{"summary": "用户张三咨询了运势", "facts": {"姓名": "张3", "出生地": "成都"}}'
+        return ConversationSummarizer(chat_model=FakeListChatModel(responses=[reply] * 3), trigger=8, keep=4)
+
+    def test_extract_facts(self):
+        """测试规则提取姓名、性别、生日、出生时间"""
+        facts = extract_facts([HumanMessage(content="我叫张三，男，1990年5月20日早上8点出生"),
+                               AIMessage(content="我叫黄半仙")])
+        assert facts == {"姓名": "张三", "性别": "男", "生日": "公历1990-05-20", "出生时间": "08:00"}
+
+    def test_parse_summary_fallback(self):
+        """测试模型未返回JSON时整段作为摘要"""
+        assert parse_summary("用户问了财运", {}) == ("用户问了财运", {})
+
+    def test_below_trigger_untouched(self, summarizer):
+        """测试消息数未超过阈值时不总结"""
+        history = make_history(4)
+        assert not asyncio.run(summarizer.summarize("u1", history))
+        assert len(history.messages) == 8 and history.summary is None
+
+    def test_compact_keeps_summary_facts_and_tail(self, summarizer):
+        """测试总结后保留 摘要+关键信息+最近消息，规则提取的信息优先"""
+        history = make_history(6)
+        assert asyncio.run(summarizer.summarize("u1", history))
+        assert [m.content for m in history.messages] == ["问题3", "回答3", "问题4", "回答4"]
+        assert history.summary["summary"] == "用户张三咨询了运势"
+        assert history.summary["facts"]["姓名"] == "张三"
+        assert history.summary["facts"]["出生地"] == "成都"
+        context = history.context_messages()
+        assert context[0].type == "system" and "生日：公历1990-05-20" in context[0].content
+        assert len(context) == 5
+
+    def test_history_stays_bounded(self, summarizer):
+        """测试持续对话时历史长度不随轮数增长"""
+        history = make_history(1)
+        for i in range(30):
+            history.add_user_message(f"追问{i}")
+            history.add_ai_message(f"答复{i}")
+            asyncio.run(summarizer.summarize("u1", history))
+            assert len(history.messages) <= 8
+        assert history.summary["facts"]["生日"] == "公历1990-05-20"
+
+    def test_messages_added_during_summary_kept(self, summarizer):
+        """测试总结期间新追加的消息不会被裁掉"""
+        history = make_history(6)
+
+        async def run():
+            task = summarizer.schedule("u1", history)
+            await asyncio.sleep(0)
+            await history.aadd_messages([HumanMessage(content="新问题"), AIMessage(content="新回答")])
+            return await task
+
+        assert asyncio.run(run())
+        assert [m.content for m in history.messages][-2:] == ["新问题", "新回答"]
+        assert len(history.messages) == 6
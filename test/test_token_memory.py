@@ -0,0 +1,69 @@
+import pytest
+import asyncio
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from langchain_core.messages import HumanMessage, message_to_dict, messages_from_dict
+from app.chat_history import LocalChatMessageHistory
+from app.token_memory import TOKEN_COUNT_KEY, TOKENS_PER_MESSAGE, TokenBufferMemory, message_tokens, token_window
+
+
+class CountingCounter:
+    """按字符数计数，并记录被调用的次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return len(text)
+
+
+@pytest.fixture
+def counter():
+    return CountingCounter()
+
+
+def make_memory(counter, limit=40):
+    return TokenBufferMemory(memory_key="chat_history", return_messages=True, output_key="output",
+                             max_token_limit=limit, counter=counter, chat_memory=LocalChatMessageHistory())
+
+
+class TestTokenMemory:
+    """测试按缓存token数截取的对话记忆"""
+
+    def test_count_stored_with_message(self, counter):
+        """测试token数只计算一次，并随消息序列化保存"""
+        message = HumanMessage(content="我叫张三")
+        assert message_tokens(message, counter) == 4 + TOKENS_PER_MESSAGE
+        assert message_tokens(message, counter) == 8 and counter.calls == 1
+        restored = messages_from_dict([message_to_dict(message)])[0]
+        assert restored.additional_kwargs[TOKEN_COUNT_KEY] == 8
+
+    def test_window_keeps_latest_within_limit(self, counter):
+        """测试从最新消息往前截取，超出上限的较早消息被丢弃，至少保留最后一条"""
+        messages = [HumanMessage(content="x" * 6) for _ in range(5)]  # 每条10
+        assert len(token_window(messages, 35, counter)) == 3
+        assert len(token_window(messages, 5, counter)) == 1
+
+    def test_history_not_reencoded(self, counter):
+        """测试多轮读写时每条消息只编码一次"""
+        memory = make_memory(counter, limit=1000)
+        for i in range(10):
+            memory.load_memory_variables({})
+            memory.save_context({"input": f"问题{i}"}, {"output": f"回答{i}"})
+        assert len(memory.load_memory_variables({})["chat_history"]) == 20
+        assert counter.calls == 20
+
+    def test_summary_uses_budget(self, counter):
+        """测试会话摘要放在最前面并占用token预算"""
+        memory = make_memory(counter, limit=40)
+        memory.chat_memory.summary = {"summary": "问过财运", "facts": {}}
+        for i in range(5):
+            memory.save_context({"input": f"问题{i}"}, {"output": f"回答{i}"})
+        window = asyncio.run(memory.aload_memory_variables({}))["chat_history"]
+        assert window[0].type == "system"
+        assert sum(message_tokens(m, counter) for m in window) <= 40
+        assert window[-1].content == "回答4"
@@ -0,0 +1,45 @@
+import pytest
+import time
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tools.cache import LRUTTLCache, ToolCache, make_cache_key
+
+class TestToolCache:
+    """测试工具结果缓存"""
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = LRUTTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_ttl_expire(self):
+        """测试条目过期"""
+        cache = LRUTTLCache()
+        cache.set("a", 1, ttl=0.05)
+        assert cache.get("a") == 1
+        time.sleep(0.1)
+        assert cache.get("a") is None
+
+    def test_normalized_keys(self):
+        """测试缓存键归一化（空白、全角、大小写）"""
+        assert make_cache_key("bazi", ["张三", 1, "1995"]) == make_cache_key("bazi", [" 张三 ", "1", "１９９５"])
+        assert make_cache_key("bazi", ["张三"]) != make_cache_key("jie_meng", ["张三"])
+
+    def test_hit_miss_counters(self):
+        """测试命中/未命中计数"""
+        cache = ToolCache(LRUTTLCache())
+        assert cache.get("jie_meng", ["飞"]) is None
+        cache.set("jie_meng", ["飞"], {"errcode": 0})
+        assert cache.get("jie_meng", ["飞"]) == {"errcode": 0}
+        stats = cache.stats()["jie_meng"]
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
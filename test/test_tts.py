@@ -0,0 +1,91 @@
+import pytest
+import asyncio
+import json
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tts import build_ssml, split_sentences
+
+
+class TestTTSService:
+    """测试常驻长连接的语音合成服务"""
+
+    def test_ssml_escaped(self):
+        """测试正文XML转义并带上风格"""
+        ssml = build_ssml("财运<好>&顺", "happy")
+        assert "财运&lt;好&gt;&amp;顺" in ssml and 'style="happy"' in ssml
+
+    def test_requests_reuse_one_connection(self, make_service, tts_handler, tmp_path):
+        """测试健康检查与多次合成复用同一条长连接，不再额外探测"""
+        service = make_service()
+
+        async def run():
+            assert await service.check_health()
+            for i in range(3):
+                await service.speak(f"第{i}句。", "chat", f"u_{i}")
+            await service.close()
+
+        asyncio.run(run())
+        assert len(tts_handler.posts) == 3
+        assert len(tts_handler.connections) == 1
+        assert all(key == "test-key" for _, key in tts_handler.posts)
+        assert (tmp_path / "u_2.mp3").read_bytes().startswith(b"ID3")
+
+    def test_health_check_failure(self, make_service):
+        """测试健康检查失败时记录状态而不抛出"""
+        service = make_service()
+        service.health_url = "http://127.0.0.1:9/unreachable"
+
+        async def run():
+            healthy = await service.check_health()
+            await service.close()
+            return healthy
+
+        assert asyncio.run(run()) is False
+        assert service.status()["last_error"]
+
+    def test_periodic_health_check(self, make_service):
+        """测试启动后在后台定期检查"""
+        service = make_service(health_interval=0.05)
+
+        async def run():
+            await service.start()
+            await asyncio.sleep(0.2)
+            await service.close()
+
+        asyncio.run(run())
+        assert service.healthy is True
+
+
+class TestChunkedTTS:
+    """测试分句并发合成"""
+
+    def test_split_sentences(self):
+        """测试按中文句末标点切分，过短的句子并入下一句"""
+        assert split_sentences("您好！今年财运亨通，事业顺利；但需注意健康？", min_chars=4) == \
+            ["您好！今年财运亨通，事业顺利；", "但需注意健康？"]
+        assert split_sentences("没有标点的一句话", min_chars=4) == ["没有标点的一句话"]
+
+    def test_first_segment_ready_before_whole(self, slow_service, tmp_path):
+        """测试首句完成时即可播放，全部完成后拼接为完整音频"""
+        service = slow_service
+        text = "您好，我是黄半仙。您的八字五行偏旺于木。流年宜向东南方发展，多结善缘。来年财运更佳，切记天道酬勤。"
+
+        async def run():
+            task = asyncio.create_task(service.speak_chunked(text, "chat", "a1", concurrency=2))
+            manifest = None
+            while not (tmp_path / "a1_0.mp3").exists():
+                await asyncio.sleep(0.005)
+            manifest = json.loads((tmp_path / "a1.json").read_text(encoding="utf-8"))
+            await task
+            return manifest
+
+        early = asyncio.run(run())
+        assert early["ready"][0] and not early["complete"] and not all(early["ready"])
+        final = json.loads((tmp_path / "a1.json").read_text(encoding="utf-8"))
+        assert final["complete"] and final["total"] == 4
+        assert (tmp_path / "a1.mp3").read_bytes().decode("utf-8") == "".join(
+            f"[{chunk}]" for chunk in split_sentences(text))
+        assert service.max_active == 2
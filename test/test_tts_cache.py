@@ -0,0 +1,121 @@
+import pytest
+import asyncio
+import os
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tts_cache import TTSCache, tts_cache_key
+
+
+class FakeSynthesizer:
+    """模拟上游合成：记录调用次数，可设置耗时与失败"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("tts down")
+        return b"ID3fake-mp3"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path))
+
+
+class TestTTSCache:
+    """测试按内容寻址的语音缓存"""
+
+    def test_key_depends_on_voice_and_style(self):
+        """测试文本、发音人、风格、格式任一不同则键不同"""
+        base = tts_cache_key("你好", "xiaoxiao", "chat", "mp3")
+        assert base == tts_cache_key("你好", "xiaoxiao", "chat", "mp3")
+        assert base != tts_cache_key("你好", "xiaoxiao", "happy", "mp3")
+        assert base != tts_cache_key("你好", "yunxi", "chat", "mp3")
+
+    def test_synthesize_once_and_link(self, cache, tmp_path):
+        """测试相同内容只合成一次，每个audio_uid都有对应文件且共享存储"""
+        synth = FakeSynthesizer()
+        key = tts_cache_key("很抱歉，请稍后再试~", "xiaoxiao", "chat", "mp3")
+        for uid in ("u1_1", "u2_2"):
+            path = asyncio.run(cache.get_or_create(key, "很抱歉，请稍后再试~", synth))
+            cache.link(path, uid)
+        assert synth.calls == 1
+        first, second = tmp_path / "u1_1.mp3", tmp_path / "u2_2.mp3"
+        assert first.read_bytes() == second.read_bytes() == b"ID3fake-mp3"
+        assert os.stat(first).st_ino == os.stat(second).st_ino
+        assert cache.stats()["hits"] == 1
+
+    def test_concurrent_requests_share_synthesis(self, cache):
+        """测试同时到达的相同请求只调用一次上游"""
+        synth = FakeSynthesizer(delay=0.05)
+        key = tts_cache_key("天道酬勤", "xiaoxiao", "chat", "mp3")
+
+        async def run():
+            return await asyncio.gather(*[cache.get_or_create(key, "天道酬勤", synth) for _ in range(5)])
+
+        paths = asyncio.run(run())
+        assert synth.calls == 1 and len(set(paths)) == 1
+        assert cache.stats()["shared"] == 4
+
+    def test_failure_not_cached(self, cache):
+        """测试合成失败时等待者收到异常，之后可以重试"""
+        key = tts_cache_key("失败", "xiaoxiao", "chat", "mp3")
+
+        async def run():
+            return await asyncio.gather(*[cache.get_or_create(key, "失败", FakeSynthesizer(0.05, fail=True))
+                                          for _ in range(2)], return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ConnectionError) for r in results)
+        synth = FakeSynthesizer()
+        asyncio.run(cache.get_or_create(key, "失败", synth))
+        assert synth.calls == 1
+
+    def test_lru_eviction(self, tmp_path):
+        """测试超出容量时淘汰最久未使用的文件，已链接出去的语音不受影响"""
+        cache = TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path), max_bytes=25)
+        keys = [tts_cache_key(f"第{i}句", "xiaoxiao", "chat", "mp3") for i in range(3)]
+        first = asyncio.run(cache.get_or_create(keys[0], "第0句", FakeSynthesizer()))
+        cache.link(first, "u1_1")
+        asyncio.run(cache.get_or_create(keys[1], "第1句", FakeSynthesizer()))
+        asyncio.run(cache.get_or_create(keys[0], "第0句", FakeSynthesizer()))  # 命中，刷新使用时间
+        asyncio.run(cache.get_or_create(keys[2], "第2句", FakeSynthesizer()))
+
+        assert os.path.exists(cache.path(keys[0])) and os.path.exists(cache.path(keys[2]))
+        assert not os.path.exists(cache.path(keys[1]))
+        assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 22
+        assert (tmp_path / "u1_1.mp3").read_bytes() == b"ID3fake-mp3"
+        # 重启后按磁盘上的文件恢复占用
+        assert TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path)).stats()["files"] == 2
+
+    def test_eviction_removes_voice_links(self, tmp_path):
+        """测试淘汰缓存文件时删除链接到它的 voices 文件与清单（重启后按 inode 找回链接）"""
+        cache = TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path), max_bytes=25)
+        keys = [tts_cache_key(f"第{i}句", "xiaoxiao", "chat", "mp3") for i in range(3)]
+        cache.link(asyncio.run(cache.get_or_create(keys[0], "第0句", FakeSynthesizer())), "u1_1")
+        (tmp_path / "u1_1.json").write_text("{}", encoding="utf-8")
+        cache.link(asyncio.run(cache.get_or_create(keys[1], "第1句", FakeSynthesizer())), "u2_1")
+        asyncio.run(cache.get_or_create(keys[2], "第2句", FakeSynthesizer()))
+        assert not (tmp_path / "u1_1.mp3").exists() and not (tmp_path / "u1_1.json").exists()
+        assert (tmp_path / "u2_1.mp3").exists()
+
+        os.utime(cache.path(keys[1]), (1, 1))  # 确保重启后它是最久未使用的
+        restarted = TTSCache(directory=str(tmp_path / "cache"), voices_dir=str(tmp_path), max_bytes=25)
+        restarted.put(tts_cache_key("第3句", "xiaoxiao", "chat", "mp3"), b"ID3fake-mp3")
+        assert not (tmp_path / "u2_1.mp3").exists()
+
+    def test_relinked_voice_kept(self, cache, tmp_path):
+        """测试 voices 文件已被其他内容覆盖时，淘汰旧内容不删除它"""
+        first = cache.put("a" * 64, b"old")
+        cache.link(first, "u1_1")
+        cache.link(cache.put("b" * 64, b"new"), "u1_1")
+        cache._remove("a" * 64)
+        assert (tmp_path / "u1_1.mp3").read_bytes() == b"new"
@@ -0,0 +1,103 @@
+import pytest
+import asyncio
+import time
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tts import TokenBucket
+from app.tts_scheduler import TTSScheduler
+
+
+def posted_texts(handler):
+    """按到达顺序返回桩服务收到的合成文本"""
+    return [next(line.strip() for line in body.splitlines() if "第" in line or "句" in line)
+            for body, _ in handler.posts]
+
+
+class TestTokenBucket:
+    """测试令牌桶限流"""
+
+    def test_rate_limited_after_burst(self):
+        """测试突发额度用完后按速率放行"""
+        bucket = TokenBucket(rate=50, capacity=2)
+
+        async def run():
+            start = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) >= 4 / 50 * 0.9
+
+
+class TestTTSScheduler:
+    """测试语音任务调度（本地TTS桩服务）"""
+
+    def run_jobs(self, scheduler, jobs):
+        async def run():
+            await scheduler.start()
+            submitted = [scheduler.submit(*job) for job in jobs]
+            await scheduler.join()
+            await scheduler.stop()
+            return submitted
+        return asyncio.run(run())
+
+    def test_bounded_workers(self, make_service, tts_handler):
+        """测试同时发往上游的请求数不超过 worker 数"""
+        tts_handler.delay = 0.05
+        scheduler = TTSScheduler(make_service(), workers=2, max_queue=0, job_ttl=0, chunked=False)
+        self.run_jobs(scheduler, [(f"第{i}句回答。", "chat", f"a{i}") for i in range(6)])
+        assert len(tts_handler.posts) == 6
+        assert tts_handler.max_active == 2
+        stats = scheduler.stats()
+        assert stats["completed"] == 6 and stats["queue_depth"] == 0 and stats["max_wait"] > 0
+
+    def test_short_texts_first(self, make_service, tts_handler):
+        """测试排队中的任务按文本长度从短到长执行"""
+        scheduler = TTSScheduler(make_service(), workers=1, max_queue=0, job_ttl=0, chunked=False)
+        self.run_jobs(scheduler, [("第一句，很长很长很长很长的解读。", "chat", "a1"),
+                                  ("第二句。", "chat", "a2"),
+                                  ("第三句，稍长一点。", "chat", "a3")])
+        assert posted_texts(tts_handler) == ["第二句。", "第三句，稍长一点。", "第一句，很长很长很长很长的解读。"]
+
+    def test_backpressure(self, make_service, tts_handler):
+        """测试队列已满时拒绝新任务"""
+        scheduler = TTSScheduler(make_service(), workers=1, max_queue=2, job_ttl=0, chunked=False)
+        submitted = self.run_jobs(scheduler, [(f"第{i}句。", "chat", f"a{i}") for i in range(3)])
+        assert submitted[2] is None
+        assert scheduler.stats()["rejected"] == 1 and len(tts_handler.posts) == 2
+
+    def test_superseded_and_cancelled_jobs_expire(self, make_service, tts_handler):
+        """测试同一用户的新任务取代旧任务，用户断开后其任务被丢弃"""
+        scheduler = TTSScheduler(make_service(), workers=1, max_queue=0, job_ttl=0, chunked=False)
+
+        async def run():
+            await scheduler.start()
+            scheduler.submit("第一句。", "chat", "u1_1", owner="u1")
+            scheduler.submit("第二句。", "chat", "u1_2", owner="u1")
+            scheduler.submit("第三句。", "chat", "u2_1", owner="u2")
+            scheduler.cancel("u2")
+            await scheduler.join()
+            await scheduler.stop()
+
+        asyncio.run(run())
+        assert posted_texts(tts_handler) == ["第二句。"]
+        assert scheduler.stats()["expired"] == 2
+
+    def test_job_ttl(self, make_service, tts_handler):
+        """测试排队超过有效期的任务不再合成"""
+        tts_handler.delay = 0.1
+        scheduler = TTSScheduler(make_service(), workers=1, max_queue=0, job_ttl=0.05, chunked=False)
+        self.run_jobs(scheduler, [("第一句。", "chat", "a1"), ("第二句稍长。", "chat", "a2")])
+        assert posted_texts(tts_handler) == ["第一句。"]
+        assert scheduler.stats()["expired"] == 1
+
+    def test_rate_limit_applies_to_upstream(self, make_service):
+        """测试上游请求受令牌桶限速"""
+        scheduler = TTSScheduler(make_service(rate_limit=20, rate_burst=1), workers=4, max_queue=0,
+                                 job_ttl=0, chunked=False)
+        start = time.monotonic()
+        self.run_jobs(scheduler, [(f"第{i}句。", "chat", f"a{i}") for i in range(4)])
+        assert time.monotonic() - start >= 3 / 20 * 0.9
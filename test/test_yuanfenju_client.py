@@ -0,0 +1,101 @@
+import pytest
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+from app.tools.yuanfenju_client import YuanfenjuClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地缘份居桩服务：/ok 正常返回，/flaky 前两次返回503，/slow 超时"""
+    flaky_calls = 0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        if self.path.endswith("/flaky"):
+            StubHandler.flaky_calls += 1
+            if StubHandler.flaky_calls <= 2:
+                self.send_response(503)
+                self.end_headers()
+                return
+        if self.path.endswith("/slow"):
+            time.sleep(0.5)
+        payload = json.dumps({"errcode": 0, "data": body}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_client():
+    StubHandler.flaky_calls = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = YuanfenjuClient(
+        base_url=f"http://127.0.0.1:{server.server_port}/v1",
+        max_retries=2,
+        backoff=0.01,
+        timeouts={"slow": 0.1},
+        proxies={}
+    )
+    yield client
+    client.close()
+    server.shutdown()
+
+
+class TestYuanfenjuClient:
+    """测试缘份居共享客户端（本地桩服务）"""
+
+    def test_post_ok(self, stub_client):
+        """测试同步请求与表单参数传递"""
+        result = stub_client.post("ok", {"api_key": "test"})
+        assert result.status_code == 200
+        assert result.json()["data"] == "api_key=test"
+
+    def test_post_retries_on_503(self, stub_client):
+        """测试上游503时自动重试"""
+        result = stub_client.post("flaky", {"api_key": "test"})
+        assert result.status_code == 200
+        assert StubHandler.flaky_calls == 3
+
+    def test_post_timeout_raises(self, stub_client):
+        """测试超时重试耗尽后抛出异常"""
+        with pytest.raises(Exception):
+            stub_client.post("slow", {"api_key": "test"})
+
+    def test_apost_reuses_connection_pool(self, stub_client):
+        """测试异步请求（重试 + 复用同一个连接池）"""
+        async def run():
+            first = await stub_client.apost("flaky", {"api_key": "test"})
+            client = stub_client._async_client
+            second = await stub_client.apost("ok", {"api_key": "test"})
+            assert stub_client._async_client is client
+            await stub_client.aclose()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first.status_code == 200
+        assert second.json()["errcode"] == 0
+
+    def test_stale_async_client_closed_on_new_loop(self, stub_client):
+        """测试事件循环变化时关闭旧的异步连接池，不泄漏连接"""
+        async def request():
+            await stub_client.apost("ok", {"api_key": "test"})
+            return stub_client._async_client
+
+        first = asyncio.run(request())
+        second = asyncio.run(request())
+        assert second is not first and first.is_closed and not second.is_closed
+        asyncio.run(stub_client.aclose())